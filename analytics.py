@@ -0,0 +1,279 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Column block size of the blocked correlation routine
+CORRELATION_BLOCK_SIZE = 1024
+# Above this many municipalities the leaf order comes from a spectral
+# ordering instead of the O(n^3) agglomerative clustering
+HIERARCHICAL_MAX_SIZE = 800
+# Largest heatmap side sent to the browser before cells are averaged
+MAX_HEATMAP_SIZE = 150
+# Points of the kernel density curve drawn for violin plots
+KDE_POINTS = 40
+
+
+@dataclass(frozen=True)
+class CorrelationResult:
+    """Correlation matrix of a municipality selection, in display order"""
+    names: tuple
+    matrix: np.ndarray
+    method: str
+    ordered: bool
+
+    @property
+    def size(self):
+        return len(self.names)
+
+    def frame(self):
+        """The matrix as a labelled DataFrame"""
+        return pd.DataFrame(self.matrix, index=list(self.names), columns=list(self.names))
+
+
+def _rank_columns(values):
+    """Average ranks per column, keeping missing values missing"""
+    return pd.DataFrame(values).rank(axis=0).to_numpy(dtype=np.float64)
+
+
+def _prepare(values, method):
+    # Spearman ranks each column once over all of its values; with missing
+    # values this differs slightly from pandas, which re-ranks every pair
+    values = np.asarray(values, dtype=np.float64)
+    if method == 'spearman':
+        values = _rank_columns(values)
+    elif method != 'pearson':
+        raise ValueError(f"Unsupported correlation method: {method}")
+    return values
+
+
+def _pairwise_block(x, y):
+    """Pairwise-complete Pearson correlation between the columns of x and y
+
+    Every sum is restricted to the rows where both columns have a value, as
+    pandas does, but computed with matrix products instead of column pairs.
+    """
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+    mx, my = mx.astype(np.float64), my.astype(np.float64)
+
+    n = mx.T @ my
+    sx = x0.T @ my
+    sy = mx.T @ y0
+    sxx = (x0 * x0).T @ my
+    syy = mx.T @ (y0 * y0)
+    sxy = x0.T @ y0
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    r[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def correlation_matrix(values, method='pearson', block_size=CORRELATION_BLOCK_SIZE):
+    """Correlation between the columns of an (n_ods, n) matrix, computed in column blocks"""
+    values = _prepare(values, method)
+    n = values.shape[1]
+    result = np.empty((n, n), dtype=np.float64)
+
+    if not np.isnan(values).any():
+        # Complete data: standardize once and use plain matrix products
+        centered = values - values.mean(axis=0)
+        norms = np.sqrt((centered * centered).sum(axis=0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = centered / norms
+        for start in range(0, n, block_size):
+            result[start:start + block_size] = z[:, start:start + block_size].T @ z
+        result[:, norms == 0] = np.nan
+        result[norms == 0, :] = np.nan
+        np.clip(result, -1.0, 1.0, out=result)
+    else:
+        for start in range(0, n, block_size):
+            result[start:start + block_size] = _pairwise_block(values[:, start:start + block_size], values)
+
+    defined = ~np.isnan(np.diag(result))
+    result[np.diag_indices(n)] = np.where(defined, 1.0, np.nan)
+    return result
+
+
+def correlation_with(values, target, method='pearson'):
+    """Correlation of one column vector with every column of a matrix"""
+    values = np.asarray(values, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64).reshape(-1, 1)
+    if method == 'spearman':
+        values, target = _rank_columns(values), _rank_columns(target)
+    elif method != 'pearson':
+        raise ValueError(f"Unsupported correlation method: {method}")
+    return _pairwise_block(target, values)[0]
+
+
+def _average_linkage_order(distance):
+    """Leaf order of an average-linkage agglomerative clustering"""
+    n = len(distance)
+    d = np.array(distance, dtype=np.float64)
+    np.fill_diagonal(d, np.inf)
+    size = np.ones(n)
+    leaves = [[i] for i in range(n)]
+
+    for _ in range(n - 1):
+        i, j = np.unravel_index(np.argmin(d), d.shape)
+        if i > j:
+            i, j = j, i
+        # Lance-Williams update for average linkage
+        merged = (size[i] * d[i] + size[j] * d[j]) / (size[i] + size[j])
+        d[i, :] = merged
+        d[:, i] = merged
+        d[i, i] = np.inf
+        d[j, :] = np.inf
+        d[:, j] = np.inf
+        size[i] += size[j]
+        leaves[i] = leaves[i] + leaves[j]
+        leaves[j] = []
+
+    return np.array(next(leaf for leaf in leaves if leaf), dtype=np.intp)
+
+
+def _spectral_order(values):
+    """Order columns by the leading eigenvector of their correlation matrix
+
+    For standardized data that eigenvector is the first right singular
+    vector, so the n x n matrix never has to be decomposed.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    z = np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+    _, _, vt = np.linalg.svd(z, full_matrices=False)
+    return np.argsort(vt[0], kind='stable')
+
+
+def cluster_order(corr, values):
+    """Display order that puts similar municipalities next to each other"""
+    n = len(corr)
+    if n < 3:
+        return np.arange(n)
+    if n > HIERARCHICAL_MAX_SIZE:
+        return _spectral_order(values)
+    return _average_linkage_order(1.0 - np.nan_to_num(corr, nan=0.0))
+
+
+def compute_correlation(model, municipalities, method='pearson', ordered=True):
+    """Correlation of a selection on the cached ODS matrix, optionally cluster-ordered"""
+    names, values = model.selection(municipalities)
+    corr = correlation_matrix(values, method)
+    if ordered:
+        order = cluster_order(corr, values)
+        corr = corr[np.ix_(order, order)]
+        names = [names[i] for i in order]
+    corr = corr.astype(np.float32)
+    corr.setflags(write=False)
+    return CorrelationResult(names=tuple(names), matrix=corr, method=method, ordered=ordered)
+
+
+def most_correlated(model, municipality, k=10, method='pearson'):
+    """The k municipalities most correlated with one municipality, across the whole model"""
+    corr = correlation_with(model.matrix, model.values(municipality), method)
+    corr[model.column_index[municipality]] = np.nan
+    valid = np.flatnonzero(~np.isnan(corr))
+    k = min(k, len(valid))
+    if k == 0:
+        return pd.DataFrame(columns=['Município', 'Correlação'])
+    top = valid[np.argpartition(-corr[valid], k - 1)[:k]]
+    top = top[np.argsort(-corr[top], kind='stable')]
+    return pd.DataFrame({
+        'Município': [model.municipalities[i] for i in top],
+        'Correlação': corr[top],
+    })
+
+
+def downsample_matrix(matrix, names, max_size=MAX_HEATMAP_SIZE):
+    """Average a square matrix into at most max_size x max_size blocks
+
+    Returns the reduced matrix and one label per block.
+    """
+    n = len(names)
+    if n <= max_size:
+        return matrix, list(names)
+
+    edges = np.linspace(0, n, max_size + 1).round().astype(np.intp)
+    counts = np.diff(edges)
+
+    valid = ~np.isnan(matrix)
+    filled = np.where(valid, matrix, 0.0)
+    # Sum rows and then columns inside each block
+    sums = np.add.reduceat(np.add.reduceat(filled, edges[:-1], axis=0), edges[:-1], axis=1)
+    hits = np.add.reduceat(np.add.reduceat(valid.astype(np.float64), edges[:-1], axis=0), edges[:-1], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        reduced = sums / hits
+
+    labels = [
+        names[start] if end - start == 1 else f"{names[start]} … {names[end - 1]} ({int(count)})"
+        for start, end, count in zip(edges[:-1], edges[1:], counts)
+    ]
+    return reduced, labels
+
+
+@dataclass(frozen=True)
+class DistributionSummary:
+    """Quartiles, whiskers, histogram and density curve of one value vector"""
+    count: int
+    mean: float
+    std: float
+    minimum: float
+    q1: float
+    median: float
+    q3: float
+    maximum: float
+    lower_fence: float
+    upper_fence: float
+    outliers: np.ndarray
+    hist_edges: np.ndarray
+    hist_counts: np.ndarray
+    kde_x: np.ndarray
+    kde_y: np.ndarray
+
+
+def summarize_distribution(values, bins=10, kde_points=KDE_POINTS):
+    """Summarize a value vector so charts can plot O(bins) points instead of every sample"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    # Whiskers end at the most extreme samples within 1.5 IQR, as in Plotly
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    lower_fence, upper_fence = inside.min(), inside.max()
+    outliers = values[(values < lower_fence) | (values > upper_fence)]
+
+    hist_counts, hist_edges = np.histogram(values, bins=bins)
+
+    # Gaussian KDE with Scott's bandwidth, evaluated on a fixed grid
+    std = values.std(ddof=1) if values.size > 1 else 0.0
+    bandwidth = std * values.size ** (-1 / 5) if std > 0 else max(abs(median) * 0.05, 1e-3)
+    kde_x = np.linspace(values.min() - 2 * bandwidth, values.max() + 2 * bandwidth, kde_points)
+    scaled = (kde_x[:, None] - values[None, :]) / bandwidth
+    kde_y = np.exp(-0.5 * scaled ** 2).sum(axis=1) / (values.size * bandwidth * np.sqrt(2 * np.pi))
+
+    return DistributionSummary(
+        count=int(values.size),
+        mean=float(values.mean()),
+        std=float(std),
+        minimum=float(values.min()),
+        q1=float(q1),
+        median=float(median),
+        q3=float(q3),
+        maximum=float(values.max()),
+        lower_fence=float(lower_fence),
+        upper_fence=float(upper_fence),
+        outliers=outliers,
+        hist_edges=hist_edges,
+        hist_counts=hist_counts,
+        # float32 curves halve what the browser receives and are plenty for a plot
+        kde_x=kde_x.astype(np.float32),
+        kde_y=kde_y.astype(np.float32),
+    )
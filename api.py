@@ -0,0 +1,394 @@
+"""Headless JSON API over the dashboard data.
+
+Serves the model and statistics the dashboard reads (DataVersionService and
+SharedStore, the same loading and cleaning path) to other systems:
+
+    GET /api/version                                  data version, ODS and municipality counts
+    GET /api/municipalities                           every municipality with its summary statistics
+    GET /api/municipalities/<name>                    ODS vector and statistics of one municipality
+    GET /api/stats?municipalities=A,B                 executive summary of a selection
+    GET /api/ranking?ods=3&k=10                       state ranking by one ODS, or by the mean without ods
+    GET /api/ranking?ods=3&municipalities=A,B         state rank and percentile of a selection
+    GET /api/correlation?municipalities=A,B,C         correlation matrix of a selection
+    GET /api/correlation?municipality=A&k=10          municipalities most correlated with one
+
+Every response carries an ETag derived from the data version and the
+request, so a poll with a matching If-None-Match is answered with 304 before
+any data is touched. Bodies are built once per data version, kept in an
+in-memory LRU and served gzip-compressed to clients that accept it.
+
+Usage:
+    python api.py                                     # port 8502, the default workbook
+    python api.py --workbook dados.xlsx --port 8080
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import tornado.ioloop
+import tornado.web
+
+from analytics import compute_correlation, most_correlated
+from data_loader import SNAPSHOT_DIR, WORKBOOK_PATH
+from data_version import DataVersionService
+from report_export import executive_summary
+from shared_store import SharedStore
+
+DEFAULT_PORT = 8502
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 1024
+# Largest correlation matrix served in one response
+MAX_CORRELATION_SIZE = 500
+CORRELATION_METHODS = ('pearson', 'spearman')
+# Decimal places of the floats in the responses
+FLOAT_DIGITS = 6
+GZIP_LEVEL = 6
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_LENGTH = 512
+
+
+def jsonable(value):
+    """Plain JSON value of numpy/pandas scalars and containers; NaN becomes null
+
+    Floats are rounded to FLOAT_DIGITS places, like the report exports, so
+    float32 scores do not carry their widening noise (0.5241000056...).
+    """
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else round(float(value), FLOAT_DIGITS)
+    if value is None or isinstance(value, (str, int, bool)):
+        return value
+    # pandas.NA and other missing markers
+    return None
+
+
+class ResponseCache:
+    """Bounded LRU of encoded responses, keyed by data version and request
+
+    Each entry holds the JSON body and, once a client asked for it, its gzip
+    encoding, so a repeated request is a dictionary lookup.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached entry for a key, or None when it is not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body):
+        """Store a JSON body; returns the entry"""
+        entry = {'body': body, 'gzip': None}
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._size(self._entries.pop(key))
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self._evict()
+        return entry
+
+    def compressed(self, key, entry):
+        """gzip encoding of an entry, compressed on first use"""
+        if entry['gzip'] is None:
+            encoded = gzip.compress(entry['body'], GZIP_LEVEL, mtime=0)
+            with self._lock:
+                if entry['gzip'] is None:
+                    entry['gzip'] = encoded
+                    if self._entries.get(key) is entry:
+                        self._bytes += len(encoded)
+                        self._evict()
+        return entry['gzip']
+
+    def _evict(self):
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    @staticmethod
+    def _size(entry):
+        return len(entry['body']) + (len(entry['gzip']) if entry['gzip'] is not None else 0)
+
+
+class DataAPI:
+    """Data source of the API: the workbook service, the shared model and the response cache"""
+
+    def __init__(self, path=WORKBOOK_PATH, snapshot_dir=SNAPSHOT_DIR, watch=True, cache=None):
+        self.service = DataVersionService(path, snapshot_dir)
+        self.store = SharedStore()
+        self.cache = cache or ResponseCache()
+        self.service.refresh()
+        if watch:
+            self.service.start()
+
+    def data(self):
+        """SharedData of the current data version"""
+        return self.store.get(self.service.workbook)
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip, honouring q-values ('gzip;q=0' refuses it)"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    # An explicit gzip entry overrides the '*' wildcard
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def _split(values):
+    """Names of repeated and/or comma separated query arguments"""
+    return [name.strip() for value in values for name in value.split(',') if name.strip()]
+
+
+class APIHandler(tornado.web.RequestHandler):
+    """JSON GET endpoint with version ETags, a response cache and gzip"""
+
+    def initialize(self, api):
+        self.api = api
+
+    def payload(self, data, *args):
+        """JSON-ready body of the request; raise tornado.web.HTTPError for bad requests
+
+        Every endpoint overrides this; a route left on the base class has no
+        resource to serve and answers 404.
+        """
+        raise tornado.web.HTTPError(404)
+
+    async def get(self, *args):
+        loop = tornado.ioloop.IOLoop.current()
+        # The first request of a new version re-reads the sheet and rebuilds the model, stats and
+        # ranks; that and every payload below run in the executor so the loop keeps serving 304s
+        data = await loop.run_in_executor(None, self.api.data)
+        query = tuple(sorted((name, tuple(values)) for name, values in self.request.query_arguments.items()))
+        key = (data.version, self.request.path, query)
+        self.set_header('Etag', f'"{hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24]}"')
+        self.set_header('Cache-Control', 'no-cache')
+        self.set_header('Vary', 'Accept-Encoding')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+
+        entry = self.api.cache.get(key)
+        if entry is None:
+            body = await loop.run_in_executor(None, lambda: self._encode(self.payload(data, *args)))
+            entry = self.api.cache.put(key, body)
+
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        body = entry['body']
+        if len(body) >= GZIP_MIN_LENGTH and accepts_gzip(self.request.headers.get('Accept-Encoding', '')):
+            self.set_header('Content-Encoding', 'gzip')
+            body = self.api.cache.compressed(key, entry)
+        self.write(body)
+
+    @staticmethod
+    def _encode(payload):
+        return json.dumps(jsonable(payload), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(json.dumps({'error': self._reason, 'status': status_code}, ensure_ascii=False))
+
+    def selection(self, model, required=True):
+        """Known municipalities of the 'municipalities' argument; 404 on unknown names"""
+        names = _split(self.get_arguments('municipalities'))
+        if not names:
+            if required:
+                raise tornado.web.HTTPError(400, reason="Informe 'municipalities'")
+            return list(model.municipalities)
+        unknown = [name for name in names if name not in model.column_index]
+        if unknown:
+            raise tornado.web.HTTPError(404, reason=f"Municípios desconhecidos: {', '.join(unknown)}")
+        return names
+
+    def int_argument(self, name, default=None, minimum=1):
+        value = self.get_argument(name, None)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' deve ser um inteiro")
+        if value < minimum:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' deve ser no mínimo {minimum}")
+        return value
+
+
+def _stats_row(stats, municipality):
+    return stats.row(municipality).to_dict()
+
+
+class VersionHandler(APIHandler):
+    def payload(self, data):
+        return {
+            'version': data.version,
+            'ods': data.model.sorted_ods,
+            'municipalities': data.model.n_municipalities,
+        }
+
+
+class MunicipalitiesHandler(APIHandler):
+    def payload(self, data):
+        table = data.stats.table
+        return [{'name': name, **row} for name, row in zip(table.index, table.to_dict(orient='records'))]
+
+
+class MunicipalityHandler(APIHandler):
+    def payload(self, data, name):
+        model = data.model
+        if name not in model.column_index:
+            raise tornado.web.HTTPError(404, reason=f"Município desconhecido: {name}")
+        values = model.values(name)[model.ods_order]
+        return {
+            'name': name,
+            'scores': {int(ods): value for ods, value in zip(model.sorted_ods, values)},
+            'stats': _stats_row(data.stats, name),
+        }
+
+
+class StatsHandler(APIHandler):
+    def payload(self, data):
+        names = self.selection(data.model)
+        summary = executive_summary(data.stats, names)
+        return {name: row for name, row in zip(summary.index, summary.to_dict(orient='records'))}
+
+
+class RankingHandler(APIHandler):
+    def payload(self, data):
+        ranks = data.ranks
+        ods = self.int_argument('ods')
+        if ods is not None and ods not in ranks.row_index:
+            raise tornado.web.HTTPError(404, reason=f"ODS desconhecido: {ods}")
+        row = ranks.row(ods)
+        k = self.int_argument('k')
+        if self.get_arguments('municipalities'):
+            columns = ranks.among(self.selection(data.model), ods, k)
+        else:
+            columns = ranks.order[row, :ranks.count[row]][:k]
+        # Positions are in the whole state, also for a selection
+        return {
+            'ods': ods,
+            'count': ranks.count[row],
+            'ranking': [{'rank': ranks.rank_of(ranks.municipalities[c], ods), 'name': ranks.municipalities[c],
+                         'value': ranks.values[row, c], 'percentile': ranks.percentile[row, c]} for c in columns],
+        }
+
+
+class CorrelationHandler(APIHandler):
+    def payload(self, data):
+        model = data.model
+        method = self.get_argument('method', 'pearson')
+        if method not in CORRELATION_METHODS:
+            raise tornado.web.HTTPError(400, reason=f"'method' deve ser um de: {', '.join(CORRELATION_METHODS)}")
+
+        target = self.get_argument('municipality', None)
+        if target is not None:
+            if target not in model.column_index:
+                raise tornado.web.HTTPError(404, reason=f"Município desconhecido: {target}")
+            top = most_correlated(model, target, self.int_argument('k', default=10), method)
+            return {'municipality': target, 'method': method,
+                    'correlated': [{'name': name, 'correlation': value}
+                                   for name, value in zip(top['Município'], top['Correlação'])]}
+
+        names = self.selection(model)
+        if len(names) > MAX_CORRELATION_SIZE:
+            raise tornado.web.HTTPError(400, reason=f"No máximo {MAX_CORRELATION_SIZE} municípios por matriz")
+        ordered = self.get_argument('ordered', 'false').lower() in ('1', 'true', 'yes')
+        result = compute_correlation(model, names, method, ordered)
+        return {'method': method, 'names': result.names, 'matrix': result.matrix}
+
+
+def make_app(api):
+    """Tornado application serving the API of a DataAPI"""
+    options = dict(api=api)
+    return tornado.web.Application([
+        (r'/api/version', VersionHandler, options),
+        (r'/api/municipalities', MunicipalitiesHandler, options),
+        (r'/api/municipalities/([^/]+)', MunicipalityHandler, options),
+        (r'/api/stats', StatsHandler, options),
+        (r'/api/ranking', RankingHandler, options),
+        (r'/api/correlation', CorrelationHandler, options),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    parser.add_argument('--address', default='', help="address to bind (default: every interface)")
+    parser.add_argument('--workbook', default=WORKBOOK_PATH, help="workbook to serve (default: %(default)s)")
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR,
+                        help="where sheet snapshots live (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    api = DataAPI(args.workbook, args.snapshot_dir)
+    make_app(api).listen(args.port, args.address)
+    print(f"API em http://{args.address or 'localhost'}:{args.port}/api/version", flush=True)
+    try:
+        tornado.ioloop.IOLoop.current().start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.service.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
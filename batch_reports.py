@@ -0,0 +1,225 @@
+"""Render the executive report of every municipality, headless and in parallel.
+
+Usage:
+    python batch_reports.py                                  # all municipalities, html + xlsx
+    python batch_reports.py --formats html --workers 8
+    python batch_reports.py --municipalities "Goiana 1" "Goiana 2" --force
+
+The data is loaded once in the parent process, through the same
+DataVersionService and SharedStore as the dashboard, so reports and UI read
+the same data; workers are forked from it and share that model. A manifest
+in the output directory records the input hash of every report, so
+municipalities whose data did not change since the last run are skipped.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from charts import create_advanced_radar_chart, create_ods_treemap, create_performance_gauge
+from data_loader import SNAPSHOT_DIR, WORKBOOK_PATH
+from data_version import DataVersionService
+from report_export import EXPORT_FORMATS, export_report, file_slug
+from shared_store import SharedStore
+
+DEFAULT_OUTPUT_DIR = 'relatorios'
+DEFAULT_FORMATS = 'html,xlsx'
+MANIFEST_NAME = 'manifest.json'
+PLOTLY_JS_NAME = 'plotly.min.js'
+# Bump when the report layout changes so every report is rendered again
+REPORT_VERSION = 1
+
+# Loaded once in the parent and inherited by the forked workers
+_MODEL = None
+_STATS = None
+
+
+def load_model(workbook=WORKBOOK_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """ODS model and statistics of the current data version, loaded as the dashboard loads them
+
+    CSV exports fresher than the workbook are read instead of it, and the
+    model version is the content hash of the 'ODS Municipios' sheet.
+    """
+    data = SharedStore(max_versions=1).get(DataVersionService(workbook, snapshot_dir).workbook)
+    return data.model, data.stats
+
+
+def _init_worker(source):
+    """Worker initializer; only loads the model when it was not inherited (spawn)"""
+    global _MODEL, _STATS
+    if _MODEL is None:
+        _MODEL, _STATS = load_model(*source)
+
+
+def input_hash(model, municipality):
+    """Hash of everything a municipality report depends on"""
+    digest = hashlib.sha256()
+    digest.update(f"{REPORT_VERSION}|{municipality}".encode('utf-8'))
+    digest.update(model.sorted_ods.tobytes())
+    digest.update(model.values(municipality)[model.ods_order].tobytes())
+    return digest.hexdigest()
+
+
+def report_figures(model, stats, municipality):
+    """Figures of one municipality report, drawn with the dashboard builders"""
+    mean = stats.row(municipality)['mean']
+    return (
+        create_advanced_radar_chart(model, [municipality], f"Perfil ODS - {municipality}"),
+        create_performance_gauge(mean, municipality) if mean == mean else None,
+        create_ods_treemap(model, municipality),
+    )
+
+
+def render_municipality(municipality, formats, output_dir):
+    """Write the reports of one municipality and return {format: file name}"""
+    files = {}
+    for fmt in formats:
+        figures = report_figures(_MODEL, _STATS, municipality) if fmt == 'html' else ()
+        data = export_report(fmt, _MODEL, _STATS, [municipality], figures,
+                             **({'plotlyjs': 'directory'} if fmt == 'html' else {}))
+        name = f"{file_slug(municipality)}.{EXPORT_FORMATS[fmt][1]}"
+        path = os.path.join(output_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        files[fmt] = name
+    return files
+
+
+def _render_task(municipality, formats, output_dir):
+    try:
+        return municipality, render_municipality(municipality, formats, output_dir), None
+    except Exception as e:
+        return municipality, {}, f"{type(e).__name__}: {e}"
+
+
+def read_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def stale_formats(entry, digest, formats, output_dir):
+    """Formats of a municipality whose report is missing or older than its inputs
+
+    Manifest entries look like {'input': hash, 'files': {format: file name}}.
+    """
+    if not entry or entry.get('input') != digest:
+        return list(formats)
+    files = entry.get('files', {})
+    return [fmt for fmt in formats
+            if fmt not in files or not os.path.exists(os.path.join(output_dir, files[fmt]))]
+
+
+def _write_plotly_js(output_dir):
+    """Write plotly.js once next to the HTML reports, which reference it"""
+    path = os.path.join(output_dir, PLOTLY_JS_NAME)
+    if not os.path.exists(path):
+        from plotly.offline import get_plotlyjs
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+
+def _pool_context():
+    # Forked workers share the parent's model pages instead of reloading it
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+
+def main(argv=None):
+    global _MODEL, _STATS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workbook', default=WORKBOOK_PATH, help="input workbook (default: %(default)s)")
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR, help="Parquet snapshot directory (default: %(default)s)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="where reports go (default: %(default)s)")
+    parser.add_argument('--formats', default=DEFAULT_FORMATS,
+                        help=f"comma separated, any of {', '.join(EXPORT_FORMATS)} (default: %(default)s)")
+    parser.add_argument('--municipalities', nargs='+', help="only these municipalities (default: all)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: number of cores, %(default)s)")
+    parser.add_argument('--force', action='store_true', help="render every report, even when unchanged")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    _MODEL, _STATS = load_model(args.workbook, args.snapshot_dir)
+
+    municipalities = args.municipalities or list(_MODEL.municipalities)
+    missing = [m for m in municipalities if m not in _MODEL.column_index]
+    for municipality in missing:
+        print(f"warning: unknown municipality {municipality!r}", file=sys.stderr)
+    municipalities = [m for m in municipalities if m in _MODEL.column_index]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if 'html' in formats:
+        _write_plotly_js(args.output_dir)
+
+    manifest = read_manifest(args.output_dir)
+    digests = {m: input_hash(_MODEL, m) for m in municipalities}
+    pending = {}
+    for municipality in municipalities:
+        stale = formats if args.force else stale_formats(manifest.get(municipality), digests[municipality],
+                                                          formats, args.output_dir)
+        if stale:
+            pending[municipality] = stale
+    skipped = len(municipalities) - len(pending)
+    print(f"{len(pending)} relatórios a gerar, {skipped} sem alterações ({args.workers} processos)",
+          file=sys.stderr)
+
+    failures = {}
+    done = 0
+    try:
+        if pending:
+            with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(pending))),
+                                     mp_context=_pool_context(), initializer=_init_worker,
+                                     initargs=((args.workbook, args.snapshot_dir),)) as pool:
+                futures = [pool.submit(_render_task, m, stale, args.output_dir) for m, stale in pending.items()]
+                for future in as_completed(futures):
+                    municipality, files, error = future.result()
+                    done += 1
+                    if error:
+                        failures[municipality] = error
+                        manifest.pop(municipality, None)
+                        continue
+                    entry = manifest.get(municipality)
+                    if not entry or entry.get('input') != digests[municipality]:
+                        # Files of other formats were rendered from older data
+                        entry = manifest[municipality] = {'input': digests[municipality], 'files': {}}
+                    entry['files'].update(files)
+                    if done % 100 == 0 or done == len(pending):
+                        print(f"  {done}/{len(pending)}", file=sys.stderr)
+    finally:
+        write_manifest(args.output_dir, manifest)
+
+    for municipality, error in failures.items():
+        print(f"ERRO {municipality}: {error}", file=sys.stderr)
+    print(f"{done - len(failures)} gerados, {skipped} ignorados, {len(failures)} com erro "
+          f"em {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
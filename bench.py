@@ -0,0 +1,365 @@
+"""Headless benchmark of the dashboard stages on synthetic datasets.
+
+Usage:
+    python bench.py                               # default scales
+    python bench.py --scales 16x17,5570x300       # municipalities x ODS rows
+    python bench.py --save-baseline               # store results as the baseline
+
+Each scale runs in its own subprocess so caches and imports start cold.
+Results go to a JSON file and are compared against the stored baseline;
+the exit status is 1 when a stage got slower than the tolerance allows.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SCALES = '16x17,160x17,1000x68,5570x17,5570x300'
+DEFAULT_OUTPUT = 'bench_results.json'
+DEFAULT_BASELINE = 'bench_baseline.json'
+DEFAULT_WORKDIR = '.bench'
+
+VIEWS = ["Visão Geral", "Comparativo Detalhado", "Análise Avançada", "Cenários", "Metas e Ações",
+         "Ranking Estadual", "Relatório Executivo"]
+
+
+def parse_scales(text):
+    """Parse '16x17,5570x300' into [(16, 17), (5570, 300)]"""
+    scales = []
+    for item in text.split(','):
+        municipalities, ods = item.lower().split('x')
+        scales.append((int(municipalities), int(ods)))
+    return scales
+
+
+def synthetic_rows(n_municipalities, n_ods, seed=0):
+    """Rows of a synthetic 'ODS Municipios' sheet with the real two-row header"""
+    rng = np.random.default_rng(seed)
+    names = [f"Município {i + 1}" for i in range(n_municipalities)]
+    # Scores cluster around a per-municipality level, like the real data
+    level = rng.uniform(0.3, 0.7, size=n_municipalities)
+    scores = np.clip(level + rng.normal(0, 0.15, size=(n_ods, n_municipalities)), 0, 1).round(4)
+
+    yield [None, None] + names
+    yield ['ODS', 'IDS'] + names
+    for i in range(n_ods):
+        yield [i + 1, f"Indicador {i + 1}"] + scores[i].tolist()
+
+
+def write_synthetic_workbook(path, n_municipalities, n_ods, seed=0):
+    """Write a synthetic workbook with an 'ODS Municipios' sheet"""
+    from openpyxl import Workbook
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('ODS Municipios')
+    for row in synthetic_rows(n_municipalities, n_ods, seed):
+        sheet.append(row)
+    tmp_path = f"{path}.tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_synthetic_csv(path, n_municipalities, n_ods, seed=0):
+    """Write the same synthetic sheet as a pt-BR CSV export (cp1252, ';', '52,41%')"""
+    import csv
+
+    def cell(value):
+        if isinstance(value, float):
+            return f"{value * 100:.2f}%".replace('.', ',')
+        return '' if value is None else value
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='cp1252', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        for row in synthetic_rows(n_municipalities, n_ods, seed):
+            writer.writerow([cell(value) for value in row])
+    os.replace(tmp_path, path)
+
+
+def time_call(func, repeat):
+    """Run a callable `repeat` times and return min/median wall time in ms"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(samples), 'median_ms': statistics.median(samples), 'runs': repeat}
+
+
+def run_scale(n_municipalities, n_ods, repeat, selection, workdir):
+    """Benchmark every stage for one scale (runs inside the child process)"""
+    workbook = os.path.abspath(os.path.join(workdir, f"synthetic_{n_municipalities}x{n_ods}.xlsx"))
+    if not os.path.exists(workbook):
+        write_synthetic_workbook(workbook, n_municipalities, n_ods)
+
+    snapshot_dir = os.path.join(workdir, 'snapshots')
+    os.environ['ODS_WORKBOOK'] = workbook
+    os.environ['ODS_SNAPSHOT_DIR'] = snapshot_dir
+
+    warnings.filterwarnings('ignore')
+    import logging
+    logging.disable(logging.WARNING)
+
+    import charts
+    import dashboard
+    from analytics import compute_correlation, most_correlated, summarize_distribution
+    from clustering import CLUSTER_METHODS, cluster_municipalities
+    from figure_payload import compact_figure
+    from csv_loader import read_csv_export
+    from data_loader import LazyWorkbook, csv_export_path, file_hash, read_sheet, snapshot_path
+    from ods_model import build_ods_model, compute_stats
+    from ranking import build_rank_index
+    from scenarios import baseline_values, evaluate_scenarios, sweep_deltas
+    from targets import build_gap_index
+    from vintage_store import VintageStore
+
+    results = {}
+
+    # Workbook load, first from the xlsx and then from the Parquet snapshot
+    workbook_hash = file_hash(workbook)
+    snap = snapshot_path(workbook_hash, 'ODS Municipios', snapshot_dir)
+
+    def load_cold():
+        if os.path.exists(snap):
+            os.remove(snap)
+        LazyWorkbook(workbook, snapshot_dir=snapshot_dir).sheet('ODS Municipios')
+
+    results['load_and_process_data[xlsx]'] = time_call(load_cold, max(1, min(repeat, 2)))
+    results['load_and_process_data[snapshot]'] = time_call(
+        lambda: LazyWorkbook(workbook, snapshot_dir=snapshot_dir).sheet('ODS Municipios'), repeat)
+    export = csv_export_path('ODS Municipios', workbook)
+    if not os.path.exists(export):
+        write_synthetic_csv(export, n_municipalities, n_ods)
+    results['read_csv_export'] = time_call(lambda: read_csv_export(export), repeat)
+
+    # Cleaning step
+    sheet = read_sheet('ODS Municipios', workbook, workbook_hash, snapshot_dir)
+    sheet = sheet.dropna(how='all').dropna(axis=1, how='all')
+    results['build_ods_model'] = time_call(lambda: build_ods_model(sheet, 'bench'), repeat)
+    model = build_ods_model(sheet, 'bench')
+    results['compute_stats'] = time_call(lambda: compute_stats(model), repeat)
+    stats = compute_stats(model)
+    results['build_rank_index'] = time_call(lambda: build_rank_index(model, stats), repeat)
+    ranks = build_rank_index(model, stats)
+    results['RankIndex.top'] = time_call(lambda: [ranks.top(10, o) for o in ranks.ods], repeat)
+    results['RankIndex.rank_of'] = time_call(
+        lambda: [ranks.rank_of(m, o) for m in model.municipalities[:100] for o in ranks.ods], repeat)
+
+    # Figure builders, called directly (the figure cache is bypassed)
+    selected = list(model.municipalities[:selection])
+    results['summarize_distribution'] = time_call(
+        lambda: [summarize_distribution(model.values(m)) for m in selected], repeat)
+    distributions = [(m, summarize_distribution(model.values(m))) for m in selected]
+    # Four ODS swept over eight steps each: 4096 scenarios in one batch
+    baseline = baseline_values(model, selected[0])
+    deltas = sweep_deltas(model.n_ods, range(min(4, model.n_ods)), np.linspace(0, 0.2, 8))
+    results['evaluate_scenarios'] = time_call(lambda: evaluate_scenarios(model, baseline, deltas), repeat)
+    sweep = evaluate_scenarios(model, baseline, deltas)
+    projections = evaluate_scenarios(model, baseline, deltas[:4])
+    for method in CLUSTER_METHODS:
+        results[f"cluster_municipalities[{method}]"] = time_call(
+            lambda: cluster_municipalities(model, 4, method), repeat)
+    clusters = cluster_municipalities(model, 4)
+    # Synthetic workbooks have no 'Dados Tabela Din'; one ideal range for every ODS
+    ideals = pd.DataFrame({'ideal_min': 0.8, 'ideal_max': 0.9}, index=pd.Index(model.sorted_ods, name='ODS'))
+    results['build_gap_index'] = time_call(lambda: build_gap_index(model, ideals, 'bench'), repeat)
+    gaps = build_gap_index(model, ideals, 'bench')
+    # Vintages: every timed ingest appends one more (shifted) year to a fresh store
+    vintage_dir = os.path.join(workdir, f"vintages_{n_municipalities}x{n_ods}")
+    shutil.rmtree(vintage_dir, ignore_errors=True)
+    vintages = VintageStore(vintage_dir)
+
+    def ingest_next_year():
+        shift = 0.01 * len(vintages.years)
+        vintages.ingest(2000 + len(vintages.years),
+                        dataclasses.replace(model, matrix=np.clip(model.matrix + shift, 0, 1)))
+
+    results['VintageStore.ingest'] = time_call(ingest_next_year, max(repeat, 3))
+    results['VintageStore.summary'] = time_call(lambda: vintages.summary(selected), repeat)
+    results['VintageStore.scores'] = time_call(lambda: vintages.scores(selected, vintages.years[-2:]), repeat)
+    vintage_summary = vintages.summary(selected[:4])
+    builders = {
+        'create_advanced_radar_chart': lambda: charts.create_advanced_radar_chart(model, selected[:4]),
+        'create_performance_gauge': lambda: charts.create_performance_gauge(0.5, selected[0]),
+        'create_performance_gauges': lambda: charts.create_performance_gauges(
+            stats.subset(selected[:3])['mean']),
+        'create_ods_treemap': lambda: charts.create_ods_treemap(model, selected[0]),
+        'create_trend_analysis': lambda: charts.create_trend_analysis(model, distributions[:4]),
+        'create_distribution_box': lambda: charts.create_distribution_box(distributions),
+        'create_distribution_violin': lambda: charts.create_distribution_violin(distributions),
+        'create_correlation_heatmap': lambda: charts.create_correlation_heatmap(
+            compute_correlation(model, selected)),
+        'create_top_correlations_chart': lambda: charts.create_top_correlations_chart(
+            most_correlated(model, selected[0]), selected[0]),
+        'create_performance_categories_chart': lambda: charts.create_performance_categories_chart(stats, selected),
+        'create_cluster_radar': lambda: charts.create_cluster_radar(model, clusters),
+        'create_gap_heatmap': lambda: charts.create_gap_heatmap(gaps, selected),
+        'create_scenario_comparison': lambda: charts.create_scenario_comparison(model, projections, selected[0]),
+        'create_scenario_sweep_chart': lambda: charts.create_scenario_sweep_chart(sweep, sweep.best(10)),
+        'create_vintage_trend_chart': lambda: charts.create_vintage_trend_chart(vintage_summary, selected[:4]),
+        'create_state_ranking_chart': lambda: charts.create_state_ranking_chart(ranks, selected[0]),
+    }
+    missing = sorted(name for name in dir(charts)
+                     if name.startswith('create_') and callable(getattr(charts, name)) and name not in builders)
+    for name in missing:
+        print(f"warning: no benchmark case for {name}", file=sys.stderr)
+    for name, builder in builders.items():
+        results[name] = time_call(builder, repeat)
+    trend = charts.create_trend_analysis(model, distributions[:4])
+    results['compact_figure'] = time_call(lambda: compact_figure(trend), repeat)
+    results['build_comparison_table'] = time_call(
+        lambda: dashboard.build_comparison_table(model, selected, slice(0, dashboard.TABLE_ROWS_PER_PAGE),
+                                                 slice(0, dashboard.TABLE_COLUMNS_PER_PAGE)), repeat)
+
+    # Views, driven through Streamlit's AppTest
+    results.update(time_views(selected, repeat))
+
+    return {
+        'municipalities': n_municipalities,
+        'ods': n_ods,
+        'selection': len(selected),
+        'stages': results,
+    }
+
+
+def time_views(selected, repeat):
+    """Time every show_* view through AppTest, cold (first run) and warm (rerun)"""
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py'),
+                            default_timeout=600)
+    start = time.perf_counter()
+    app.run()
+    results['app[first_run]'] = {'min_ms': (time.perf_counter() - start) * 1000,
+                                 'median_ms': (time.perf_counter() - start) * 1000, 'runs': 1}
+    app.sidebar.multiselect[0].set_value(selected).run()
+    _raise_app_exception(app)
+
+    view_functions = ['show_overview', 'show_detailed_comparison', 'show_advanced_analysis', 'show_scenarios',
+                      'show_targets', 'show_state_ranking', 'show_executive_report']
+    for view, function in zip(VIEWS, view_functions):
+        app.sidebar.radio[0].set_value(view)
+        start = time.perf_counter()
+        app.run()
+        cold = (time.perf_counter() - start) * 1000
+        _raise_app_exception(app)
+        results[f"{function}[cold]"] = {'min_ms': cold, 'median_ms': cold, 'runs': 1}
+        results[f"{function}[warm]"] = time_call(app.run, repeat)
+    return results
+
+
+def _raise_app_exception(app):
+    if app.exception:
+        raise RuntimeError('; '.join(str(e.value) for e in app.exception))
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """List the stages that got slower than the baseline allows"""
+    regressions = []
+    previous = {scale['key']: scale for scale in baseline.get('scales', [])}
+    for scale in results['scales']:
+        old = previous.get(scale['key'])
+        if not old:
+            continue
+        for stage, timing in scale['stages'].items():
+            old_timing = old['stages'].get(stage)
+            if not old_timing:
+                continue
+            before, after = old_timing['median_ms'], timing['median_ms']
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append({
+                    'scale': scale['key'],
+                    'stage': stage,
+                    'baseline_ms': before,
+                    'current_ms': after,
+                    'ratio': after / before if before else float('inf'),
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help="comma separated MUNICIPALITIESxODS pairs (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per stage (default: %(default)s)")
+    parser.add_argument('--selection', type=int, default=4,
+                        help="municipalities selected in the views (default: %(default)s)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="results file (default: %(default)s)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown ratio before flagging a regression (default: %(default)s)")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help="ignore slowdowns smaller than this (default: %(default)s)")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR,
+                        help="where synthetic workbooks and snapshots live (default: %(default)s)")
+    parser.add_argument('--run-scale', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_scale:
+        (n_municipalities, n_ods), = parse_scales(args.run_scale)
+        result = run_scale(n_municipalities, n_ods, args.repeat, args.selection, args.workdir)
+        print(json.dumps(result))
+        return 0
+
+    scales = []
+    for n_municipalities, n_ods in parse_scales(args.scales):
+        key = f"{n_municipalities}x{n_ods}"
+        print(f"▶ {key} ...", file=sys.stderr, flush=True)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-scale', key, '--repeat', str(args.repeat),
+             '--selection', str(args.selection), '--workdir', args.workdir],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(child.stderr, file=sys.stderr)
+            return 2
+        scale = json.loads(child.stdout.strip().splitlines()[-1])
+        scale['key'] = key
+        scales.append(scale)
+        for stage, timing in scale['stages'].items():
+            print(f"  {stage:<42} {timing['median_ms']:>10.1f} ms", file=sys.stderr)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'scales': scales,
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+    results['regressions'] = regressions
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['scale']} {regression['stage']}: "
+              f"{regression['baseline_ms']:.1f} ms -> {regression['current_ms']:.1f} ms "
+              f"({regression['ratio']:.2f}x)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,512 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from analytics import MAX_HEATMAP_SIZE, downsample_matrix
+from clustering import CLUSTER_METHODS
+from instrumentation import traced
+from startup import lazy_import
+
+# Imported by the first chart that draws with them; in the dashboard, after the header and sidebar are sent
+px = lazy_import('plotly.express')
+subplots = lazy_import('plotly.subplots')
+
+
+def get_ods_info():
+    """Get comprehensive ODS information"""
+    return {
+        1: {"name": "Erradicação da Pobreza", "color": "#E5243B", "icon": "🏠"},
+        2: {"name": "Fome Zero", "color": "#DDA63A", "icon": "🌾"},
+        3: {"name": "Saúde e Bem-estar", "color": "#4C9F38", "icon": "❤️"},
+        4: {"name": "Educação de Qualidade", "color": "#C5192D", "icon": "📚"},
+        5: {"name": "Igualdade de Gênero", "color": "#FF3A21", "icon": "⚖️"},
+        6: {"name": "Água Potável e Saneamento", "color": "#26BDE2", "icon": "💧"},
+        7: {"name": "Energia Limpa", "color": "#FCC30B", "icon": "⚡"},
+        8: {"name": "Trabalho Decente", "color": "#A21942", "icon": "💼"},
+        9: {"name": "Inovação e Infraestrutura", "color": "#FD6925", "icon": "🏗️"},
+        10: {"name": "Redução das Desigualdades", "color": "#DD1367", "icon": "📊"},
+        11: {"name": "Cidades Sustentáveis", "color": "#FD9D24", "icon": "🏙️"},
+        12: {"name": "Consumo Responsável", "color": "#BF8B2E", "icon": "♻️"},
+        13: {"name": "Ação Climática", "color": "#3F7E44", "icon": "🌍"},
+        14: {"name": "Vida na Água", "color": "#0A97D9", "icon": "🐠"},
+        15: {"name": "Vida Terrestre", "color": "#56C02B", "icon": "🌳"},
+        16: {"name": "Paz e Justiça", "color": "#00689D", "icon": "⚖️"},
+        17: {"name": "Parcerias", "color": "#19486A", "icon": "🤝"}
+    }
+
+
+@traced()
+def create_advanced_radar_chart(model, municipalities, title="Comparação ODS"):
+    """Create advanced radar chart with multiple municipalities"""
+    if model is None or not municipalities:
+        return None
+
+    ods_info = get_ods_info()
+
+    # Get ODS numbers and create labels
+    ods_numbers = model.sorted_ods
+    labels = [f"{ods_info.get(int(ods), {}).get('icon', '📊')} ODS {int(ods)}" for ods in ods_numbers]
+
+    # One gather returns the trace vectors of every municipality
+    names, values = model.selection(municipalities)
+    values = np.nan_to_num(values, nan=0.0)
+
+    fig = go.Figure()
+
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8']
+
+    for i, municipality in enumerate(names):
+        fig.add_trace(go.Scatterpolar(
+            r=values[:, i],
+            theta=labels,
+            fill='toself',
+            name=municipality,
+            line_color=colors[i % len(colors)],
+            fillcolor=colors[i % len(colors)],
+            opacity=0.6
+        ))
+
+    fig.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 1],
+                tickfont=dict(size=10)
+            ),
+            angularaxis=dict(
+                tickfont=dict(size=10)
+            )
+        ),
+        showlegend=True,
+        title=dict(text=title, x=0.5, font=dict(size=16)),
+        height=500,
+        font=dict(size=12)
+    )
+
+    return fig
+
+
+@traced()
+def create_performance_gauge(value, title, color_scheme="Viridis"):
+    """Create a gauge chart for performance metrics"""
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = value,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': title, 'font': {'size': 16}},
+        delta = {'reference': 0.5, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
+        gauge = {
+            'axis': {'range': [None, 1], 'tickwidth': 1, 'tickcolor': "darkblue"},
+            'bar': {'color': "darkblue"},
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "gray",
+            'steps': [
+                {'range': [0, 0.3], 'color': '#ffcccc'},
+                {'range': [0.3, 0.7], 'color': '#ffffcc'},
+                {'range': [0.7, 1], 'color': '#ccffcc'}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 0.8
+            }
+        }
+    ))
+
+    fig.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
+    return fig
+
+
+@traced()
+def create_performance_gauges(values, color_scheme="Viridis"):
+    """Create one figure stacking a gauge per municipality
+
+    A single figure carries one layout instead of one per gauge.
+    """
+    if len(values) == 0:
+        return None
+
+    fig = go.Figure()
+    n = len(values)
+    for i, (title, value) in enumerate(values.items()):
+        gauge = create_performance_gauge(value, title, color_scheme).data[0]
+        # Stack the gauges top to bottom, each in its own vertical band
+        gauge.domain = {'x': [0, 1], 'y': [1 - (i + 1) / n + 0.04, 1 - i / n - 0.04]}
+        fig.add_trace(gauge)
+
+    fig.update_layout(height=300 * n, margin=dict(l=20, r=20, t=40, b=20))
+    return fig
+
+
+@traced()
+def create_ods_treemap(model, municipality):
+    """Create treemap visualization for ODS performance"""
+    if model is None or municipality not in model.column_index:
+        return None
+
+    ods_info = get_ods_info()
+
+    # Prepare data
+    treemap_data = []
+    for ods, value in zip(model.ods, model.values(municipality)):
+        ods_num = int(ods)
+        if pd.notna(value):
+            treemap_data.append({
+                'ODS': f"ODS {ods_num}",
+                'Nome': ods_info.get(ods_num, {}).get('name', 'N/A'),
+                'Valor': value,
+                'Icon': ods_info.get(ods_num, {}).get('icon', '📊'),
+                'Color': ods_info.get(ods_num, {}).get('color', '#333333')
+            })
+
+    if not treemap_data:
+        return None
+
+    df_treemap = pd.DataFrame(treemap_data)
+
+    # Built with graph_objects so the default view never has to import plotly.express
+    fig = go.Figure(go.Treemap(
+        labels=df_treemap['ODS'],
+        parents=[''] * len(df_treemap),
+        values=df_treemap['Valor'],
+        customdata=df_treemap[['Nome']],
+        marker=dict(colors=df_treemap['Valor'], colorscale='RdYlGn', showscale=True,
+                    colorbar=dict(title='Valor')),
+        hovertemplate='<b>%{label}</b><br>%{customdata[0]}<br>Valor: %{value:.3f}<extra></extra>'
+    ))
+    fig.update_layout(title=f'Mapa de Árvore ODS - {municipality}')
+
+    fig.update_traces(
+        texttemplate="<b>%{label}</b><br>%{value:.3f}",
+        textfont_size=12
+    )
+
+    fig.update_layout(height=500)
+    return fig
+
+
+def _box_trace(name, summary, **kwargs):
+    """Box trace drawn from precomputed quartiles instead of raw samples"""
+    return go.Box(
+        x=[name], name=name,
+        q1=[summary.q1], median=[summary.median], q3=[summary.q3],
+        lowerfence=[summary.lower_fence], upperfence=[summary.upper_fence],
+        mean=[summary.mean], boxpoints=False, **kwargs
+    )
+
+
+def _outlier_trace(name, summary, color=None):
+    """Markers of the samples outside the whiskers of a box"""
+    return go.Scatter(x=[name] * len(summary.outliers), y=summary.outliers, mode='markers',
+                      marker=dict(color=color, size=5), name=name, showlegend=False,
+                      hovertemplate='%{y:.3f}<extra>%{x}</extra>')
+
+
+def _violin_trace(position, name, summary, width=0.8, **kwargs):
+    """Violin outline drawn from a precomputed density curve"""
+    half = summary.kde_y / summary.kde_y.max() * width / 2 if summary.kde_y.max() > 0 else summary.kde_y
+    x = np.concatenate([position - half, (position + half)[::-1]])
+    y = np.concatenate([summary.kde_x, summary.kde_x[::-1]])
+    return go.Scatter(x=x, y=y, fill='toself', mode='lines', name=name,
+                      hoveron='fills', text=f"{name}<br>mediana: {summary.median:.3f}", hoverinfo='text',
+                      **kwargs)
+
+
+def _histogram_trace(name, summary, **kwargs):
+    """Histogram drawn from precomputed bin counts"""
+    edges = summary.hist_edges
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=summary.hist_counts, width=np.diff(edges),
+                  name=name, **kwargs)
+
+
+@traced()
+def create_trend_analysis(model, distributions):
+    """Create trend analysis chart from the distribution summaries of up to 4 municipalities"""
+    if model is None or not distributions:
+        return None
+
+    fig = subplots.make_subplots(
+        rows=2, cols=2,
+        subplot_titles=('Distribuição de Performance', 'Comparação por Quartis',
+                       'Análise de Variabilidade', 'Performance Relativa'),
+        specs=[[{"secondary_y": False}, {"secondary_y": False}],
+               [{"secondary_y": False}, {"secondary_y": False}]]
+    )
+
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
+    distributions = distributions[:4]
+
+    # One gather returns the ODS-sorted vectors of every municipality
+    names, matrix = model.selection([name for name, _ in distributions])
+
+    for i, (municipality, summary) in enumerate(distributions):
+        color = colors[i % len(colors)]
+        column = matrix[:, i]
+        values = column[~np.isnan(column)]
+
+        # Histogram
+        fig.add_trace(
+            _histogram_trace(f'{municipality} Dist', summary, opacity=0.7, marker_color=color),
+            row=1, col=1
+        )
+
+        # Box plot
+        fig.add_trace(
+            _box_trace(f'{municipality} Box', summary, marker_color=color),
+            row=1, col=2
+        )
+
+        # Violin plot
+        fig.add_trace(
+            _violin_trace(i, f'{municipality} Violin', summary, line_color=color),
+            row=2, col=1
+        )
+
+        # Performance by ODS
+        fig.add_trace(
+            go.Scatter(x=np.arange(len(values)), y=values,
+                      mode='lines+markers', name=f'{municipality} Trend',
+                      line=dict(color=color, width=3),
+                      marker=dict(size=8)),
+            row=2, col=2
+        )
+
+    fig.update_xaxes(tickvals=list(range(len(distributions))), ticktext=[name for name, _ in distributions],
+                     row=2, col=1)
+    fig.update_layout(height=800, showlegend=True, title_text="Análise Avançada de Tendências",
+                      barmode='overlay')
+    return fig
+
+
+@traced()
+def create_distribution_box(distributions):
+    """Create box plot comparing the ODS distribution of municipalities"""
+    if not distributions:
+        return None
+
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, (municipality, summary) in enumerate(distributions):
+        color = colors[i % len(colors)]
+        fig.add_trace(_box_trace(municipality, summary, marker_color=color))
+        if len(summary.outliers):
+            fig.add_trace(_outlier_trace(municipality, summary, color))
+    fig.update_layout(title='Distribuição de Performance ODS', height=400,
+                      xaxis_title='Município', yaxis_title='Valor ODS')
+    return fig
+
+
+@traced()
+def create_distribution_violin(distributions):
+    """Create violin plot comparing the ODS density of municipalities"""
+    if not distributions:
+        return None
+
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, (municipality, summary) in enumerate(distributions):
+        fig.add_trace(_violin_trace(i, municipality, summary, line_color=colors[i % len(colors)]))
+    fig.update_layout(title='Densidade de Performance ODS', height=400,
+                      xaxis=dict(title='Município', tickvals=list(range(len(distributions))),
+                                 ticktext=[name for name, _ in distributions]),
+                      yaxis_title='Valor ODS')
+    return fig
+
+
+@traced()
+def create_correlation_heatmap(correlation, max_size=MAX_HEATMAP_SIZE):
+    """Create correlation heatmap between municipalities
+
+    Large selections are averaged into blocks so the browser receives at
+    most max_size x max_size cells.
+    """
+    if correlation is None or correlation.size < 2:
+        return None
+
+    matrix, labels = downsample_matrix(correlation.matrix, correlation.names, max_size)
+
+    fig = px.imshow(matrix, x=labels, y=labels,
+                    title='Matriz de Correlação entre Municípios',
+                    color_continuous_scale='RdBu',
+                    zmin=-1, zmax=1,
+                    aspect='auto')
+    if len(labels) > 40:
+        fig.update_xaxes(showticklabels=False)
+        fig.update_yaxes(showticklabels=False)
+    fig.update_layout(height=500)
+    return fig
+
+
+@traced()
+def create_top_correlations_chart(top, municipality):
+    """Create bar chart of the municipalities most correlated with one municipality"""
+    if top is None or top.empty:
+        return None
+
+    fig = px.bar(top.iloc[::-1], x='Correlação', y='Município', orientation='h',
+                 title=f'Municípios mais correlacionados com {municipality}',
+                 color='Correlação', color_continuous_scale='RdBu', range_color=[-1, 1])
+    fig.update_layout(height=max(300, 28 * len(top) + 120))
+    return fig
+
+
+@traced()
+def create_performance_categories_chart(stats, municipalities):
+    """Create stacked bars of high/medium/low performance ODS counts"""
+    selected_stats = stats.subset(municipalities)
+    if selected_stats.empty:
+        return None
+
+    perf_df = selected_stats[['high', 'medium', 'low']].rename(columns={
+        'high': 'Alta Performance (≥0.7)',
+        'medium': 'Média Performance (0.4-0.7)',
+        'low': 'Baixa Performance (<0.4)'
+    }).reset_index()
+
+    fig = px.bar(perf_df, x='Município',
+                 y=['Alta Performance (≥0.7)', 'Média Performance (0.4-0.7)', 'Baixa Performance (<0.4)'],
+                 title='Distribuição de Performance por Categoria',
+                 color_discrete_map={
+                     'Alta Performance (≥0.7)': '#2ECC71',
+                     'Média Performance (0.4-0.7)': '#F39C12',
+                     'Baixa Performance (<0.4)': '#E74C3C'
+                 })
+    fig.update_layout(height=500)
+    return fig
+
+
+@traced()
+def create_scenario_comparison(model, result, baseline):
+    """Create grouped ODS bars of each scenario with the benchmark averages as lines"""
+    if result.size == 0:
+        return None
+
+    ods_labels = [f"ODS {int(o)}" for o in model.sorted_ods]
+    fig = go.Figure()
+    for position in range(result.size):
+        fig.add_trace(go.Bar(x=ods_labels, y=result.values[position], name=result.label(position)))
+    for label in result.benchmark_labels:
+        fig.add_trace(go.Scatter(x=ods_labels, y=model.reference(label)[model.ods_order], name=label,
+                                 mode='lines+markers', line=dict(dash='dash')))
+    fig.update_layout(title=f"Cenários a partir de {baseline}", barmode='group', height=500,
+                      yaxis=dict(title='Índice ODS', range=[0, 1]))
+    return fig
+
+
+@traced()
+def create_scenario_sweep_chart(result, best):
+    """Create an effort x average score scatter of a sweep, highlighting the best scenarios"""
+    if result.size == 0:
+        return None
+
+    # Scenarios with the same effort and mean are drawn once
+    points = np.unique(np.column_stack([result.effort.round(3), result.mean.round(4)]), axis=0)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=points[:, 0], y=points[:, 1], mode='markers', name='Cenários',
+                             marker=dict(size=5, color=points[:, 1], colorscale='Viridis', opacity=0.6),
+                             hovertemplate='Esforço %{x:.2f}<br>Média %{y:.3f}<extra></extra>'))
+    fig.add_trace(go.Scatter(x=result.effort[best], y=result.mean[best], mode='markers', name='Melhores',
+                             text=[result.label(p) for p in best],
+                             marker=dict(size=11, color='#E74C3C', symbol='star'),
+                             hovertemplate='%{text}<br>Esforço %{x:.2f}<br>Média %{y:.3f}<extra></extra>'))
+    fig.update_layout(title=f"{result.size} cenários avaliados", height=500,
+                      xaxis_title='Esforço (soma das variações)', yaxis_title='Média ODS projetada')
+    return fig
+
+
+@traced()
+def create_cluster_radar(model, clusters):
+    """Create a radar chart with one centroid trace per cluster"""
+    if clusters is None or clusters.k == 0:
+        return None
+
+    ods_info = get_ods_info()
+    labels = [f"{ods_info.get(int(ods), {}).get('icon', '📊')} ODS {int(ods)}" for ods in model.sorted_ods]
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8']
+
+    fig = go.Figure()
+    for cluster, centroid in enumerate(clusters.centroids):
+        fig.add_trace(go.Scatterpolar(
+            r=centroid,
+            theta=labels,
+            fill='toself',
+            name=f"Cluster {cluster + 1} ({clusters.sizes[cluster]})",
+            line_color=colors[cluster % len(colors)],
+            fillcolor=colors[cluster % len(colors)],
+            opacity=0.5
+        ))
+
+    fig.update_layout(
+        polar=dict(radialaxis=dict(visible=True, range=[0, 1], tickfont=dict(size=10)),
+                   angularaxis=dict(tickfont=dict(size=10))),
+        showlegend=True,
+        title=dict(text=f"Centroides - {CLUSTER_METHODS[clusters.method]}", x=0.5, font=dict(size=16)),
+        height=500,
+        font=dict(size=12)
+    )
+    return fig
+
+
+@traced()
+def create_gap_heatmap(gaps, municipalities):
+    """Create a municipality x ODS heatmap of the distance to the ideal range"""
+    table = gaps.frame(municipalities)
+    if table.empty:
+        return None
+
+    fig = px.imshow(table.T.round(3), x=[f"ODS {int(o)}" for o in table.index], y=list(table.columns),
+                    color_continuous_scale='Reds', zmin=0, aspect='auto', text_auto='.2f',
+                    labels=dict(color='Distância'), title='Distância até o Valor Ideal de IDS')
+    fig.update_layout(height=max(300, 40 * len(table.columns) + 150))
+    return fig
+
+
+@traced()
+def create_vintage_trend_chart(summary, municipalities):
+    """Create the per-edition mean (with its rolling mean) and year-over-year change of a selection"""
+    if summary.empty:
+        return None
+
+    fig = subplots.make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.65, 0.35],
+                                 subplot_titles=('Média ODS por edição', 'Variação sobre a edição anterior'))
+    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
+    for i, municipality in enumerate(municipalities):
+        rows = summary[summary['municipality'] == municipality].sort_values('year')
+        if rows.empty:
+            continue
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Scatter(x=rows['year'], y=rows['mean'], mode='lines+markers', name=municipality,
+                                 legendgroup=municipality, line=dict(color=color, width=3)), row=1, col=1)
+        fig.add_trace(go.Scatter(x=rows['year'], y=rows['rolling_mean'], mode='lines', name=f'{municipality} (móvel)',
+                                 legendgroup=municipality, line=dict(color=color, dash='dot')), row=1, col=1)
+        fig.add_trace(go.Bar(x=rows['year'], y=rows['delta'], name=f'{municipality} Δ', legendgroup=municipality,
+                             marker_color=color, showlegend=False), row=2, col=1)
+    fig.update_xaxes(dtick=1)
+    fig.update_layout(height=600, barmode='group', title_text='Evolução entre Edições do IDS')
+    return fig
+
+
+@traced()
+def create_state_ranking_chart(ranks, municipality):
+    """Create horizontal bars of a municipality's state percentile on every ODS"""
+    positions = ranks.positions(municipality)
+    if positions['posição'].isna().all():
+        return None
+
+    ods_info = get_ods_info()
+    labels = [f"ODS {int(o)}: {ods_info.get(int(o), {}).get('name', 'N/A')}" for o in positions.index]
+    text = [f"{rank}º de {count}" if not pd.isna(rank) else "sem dado"
+            for rank, count in zip(positions['posição'], positions['de'])]
+    fig = go.Figure(go.Bar(
+        x=(positions['percentil'] * 100).round(1), y=labels, orientation='h', text=text,
+        textposition='auto', customdata=positions['valor'].round(4),
+        hovertemplate='%{y}<br>Percentil: %{x:.1f}<br>Posição: %{text}<br>Valor: %{customdata}<extra></extra>',
+        marker=dict(color=positions['percentil'] * 100, colorscale='RdYlGn', cmin=0, cmax=100,
+                    colorbar=dict(title='Percentil'))
+    ))
+    fig.add_vline(x=50, line_dash='dash', line_color='gray')
+    fig.update_layout(title=f'Posição de {municipality} no Estado por ODS', xaxis=dict(range=[0, 100],
+                      title='Percentil (% dos municípios abaixo)'), yaxis=dict(autorange='reversed'),
+                      height=max(400, 30 * len(labels) + 150))
+    return fig
@@ -0,0 +1,291 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Clustering methods offered by the dashboard
+CLUSTER_METHODS = {
+    'kmeans': 'K-means',
+    'ward': 'Hierárquico (Ward)',
+    'average': 'Hierárquico (média)',
+}
+# Above this many municipalities k-means switches to mini-batch updates
+MINIBATCH_THRESHOLD = 2000
+MINIBATCH_SIZE = 512
+# Above this many municipalities the linkage runs on MICRO_CLUSTERS k-means
+# micro-clusters instead of the O(n^3) merge of every municipality
+LINKAGE_MAX_SIZE = 800
+MICRO_CLUSTERS = 200
+# Silhouettes are averaged over at most this many municipalities
+SILHOUETTE_SAMPLE_SIZE = 1000
+# Rows per block of the pairwise distance computations
+DISTANCE_BLOCK_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class ClusterResult:
+    """Cluster membership of every municipality of one model version
+
+    ``centroids`` are the mean ODS vectors of each cluster, in ascending ODS
+    order; ``silhouettes`` hold the score of the municipalities listed in
+    ``sampled`` (all of them for small models).
+    """
+    method: str
+    k: int
+    names: tuple
+    labels: np.ndarray
+    centroids: np.ndarray
+    sizes: np.ndarray
+    inertia: float
+    silhouette: float
+    cluster_silhouettes: np.ndarray
+    silhouettes: np.ndarray
+    sampled: np.ndarray
+
+    def members(self, cluster):
+        """Municipalities of one cluster"""
+        return [self.names[i] for i in np.flatnonzero(self.labels == cluster)]
+
+    def frame(self, municipalities=None):
+        """Cluster of each municipality (of a selection), with its silhouette when sampled"""
+        silhouettes = np.full(len(self.names), np.nan)
+        silhouettes[self.sampled] = self.silhouettes
+        table = pd.DataFrame({'cluster': self.labels + 1, 'silhueta': silhouettes},
+                             index=pd.Index(self.names, name='Município'))
+        if municipalities is not None:
+            table = table.loc[[m for m in municipalities if m in table.index]]
+        return table
+
+
+def cluster_features(model):
+    """(n_municipalities, n_ods) feature matrix; missing scores take the ODS mean"""
+    values = model.matrix[model.ods_order].T.astype(np.float64)
+    missing = np.isnan(values)
+    if missing.any():
+        with np.errstate(invalid='ignore'):
+            means = np.nanmean(np.where(missing.all(axis=0), 0.0, values), axis=0)
+        values = np.where(missing, np.nan_to_num(means)[None, :], values)
+    return values
+
+
+def squared_distances(x, y):
+    """Squared Euclidean distances between the rows of x and y"""
+    distances = (x * x).sum(axis=1)[:, None] - 2.0 * x @ y.T + (y * y).sum(axis=1)[None, :]
+    return np.maximum(distances, 0.0)
+
+
+def _nearest(x, centroids):
+    """Closest centroid of every row and the squared distance to it, in row blocks"""
+    labels = np.empty(len(x), dtype=np.intp)
+    distances = np.empty(len(x))
+    for start in range(0, len(x), DISTANCE_BLOCK_SIZE):
+        block = squared_distances(x[start:start + DISTANCE_BLOCK_SIZE], centroids)
+        labels[start:start + len(block)] = block.argmin(axis=1)
+        distances[start:start + len(block)] = block[np.arange(len(block)), labels[start:start + len(block)]]
+    return labels, distances
+
+
+def _kmeans_plus_plus(x, k, rng, weights=None):
+    """k-means++ seeding: each new centroid is drawn proportionally to its squared distance"""
+    weights = np.ones(len(x)) if weights is None else weights
+    centroids = [x[rng.choice(len(x), p=weights / weights.sum())]]
+    closest = squared_distances(x, centroids[0][None, :])[:, 0]
+    for _ in range(1, k):
+        probabilities = closest * weights
+        total = probabilities.sum()
+        index = rng.choice(len(x), p=probabilities / total) if total > 0 else rng.integers(len(x))
+        centroids.append(x[index])
+        closest = np.minimum(closest, squared_distances(x, x[index][None, :])[:, 0])
+    return np.array(centroids)
+
+
+def _membership(labels, k, weights=None):
+    """(n, k) one-hot membership matrix, optionally weighted"""
+    members = (labels[:, None] == np.arange(k)[None, :]).astype(np.float64)
+    return members if weights is None else members * weights[:, None]
+
+
+def _update_centroids(x, labels, centroids, weights=None):
+    """Weighted mean of every cluster; empty clusters keep their previous centroid"""
+    k = len(centroids)
+    members = _membership(labels, k, weights)
+    totals = members.sum(axis=0)
+    sums = members.T @ x
+    filled = totals > 0
+    updated = centroids.copy()
+    updated[filled] = sums[filled] / totals[filled, None]
+    return updated
+
+
+def kmeans(x, k, seed=0, max_iter=100, tol=1e-6, weights=None):
+    """Lloyd's k-means with k-means++ seeding; returns (labels, centroids, inertia)"""
+    rng = np.random.default_rng(seed)
+    centroids = _kmeans_plus_plus(x, k, rng, weights)
+    for _ in range(max_iter):
+        labels, _ = _nearest(x, centroids)
+        updated = _update_centroids(x, labels, centroids, weights)
+        shift = ((updated - centroids) ** 2).sum()
+        centroids = updated
+        if shift <= tol:
+            break
+    labels, distances = _nearest(x, centroids)
+    inertia = distances.sum() if weights is None else (distances * weights).sum()
+    return labels, centroids, float(inertia)
+
+
+def minibatch_kmeans(x, k, seed=0, batch_size=MINIBATCH_SIZE, max_iter=50, centroids=None):
+    """Mini-batch k-means (Sculley, 2010); returns (labels, centroids, inertia)
+
+    Each step moves the centroids towards a random batch with a per-centroid
+    learning rate of 1 / points seen, so the cost per step does not grow with
+    the number of municipalities. Pass ``centroids`` to continue from an
+    earlier result instead of seeding again.
+    """
+    rng = np.random.default_rng(seed)
+    if centroids is None:
+        seed_rows = rng.choice(len(x), size=min(len(x), max(batch_size, 10 * k)), replace=False)
+        centroids = _kmeans_plus_plus(x[seed_rows], k, rng)
+    centroids = np.array(centroids, dtype=np.float64)
+    seen = np.zeros(k)
+
+    for _ in range(max_iter):
+        batch = x[rng.choice(len(x), size=min(batch_size, len(x)), replace=False)]
+        labels, _ = _nearest(batch, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = _membership(labels, k).T @ batch
+        hit = counts > 0
+        seen[hit] += counts[hit]
+        # Equivalent to one 1/seen step per point, applied to the batch mean
+        rate = counts[hit] / seen[hit]
+        previous = centroids.copy()
+        centroids[hit] += rate[:, None] * (sums[hit] / counts[hit, None] - centroids[hit])
+        if ((centroids - previous) ** 2).sum() <= 1e-9:
+            break
+
+    labels, distances = _nearest(x, centroids)
+    return labels, centroids, float(distances.sum())
+
+
+def linkage_labels(x, k, method='ward', weights=None):
+    """Agglomerative clustering cut at k clusters, merging with Lance-Williams updates
+
+    ``weights`` are the sizes of the rows when they already stand for groups
+    of municipalities (micro-clusters). Ward merges minimize the increase in
+    within-cluster variance; 'average' uses the mean pairwise distance.
+    """
+    n = len(x)
+    size = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64).copy()
+    if method == 'ward':
+        # Ward's merge cost between two groups, from their centroids and sizes
+        d = squared_distances(x, x) * (size[:, None] * size[None, :]) / (size[:, None] + size[None, :])
+    elif method == 'average':
+        d = np.sqrt(squared_distances(x, x))
+    else:
+        raise ValueError(f"Unsupported linkage method: {method}")
+    np.fill_diagonal(d, np.inf)
+    labels = np.arange(n)
+
+    for _ in range(n - max(k, 1)):
+        i, j = np.unravel_index(np.argmin(d), d.shape)
+        if i > j:
+            i, j = j, i
+        if method == 'ward':
+            total = size[i] + size[j] + size
+            merged = ((size[i] + size) * d[i] + (size[j] + size) * d[j] - size * d[i, j]) / total
+        else:
+            merged = (size[i] * d[i] + size[j] * d[j]) / (size[i] + size[j])
+        d[i, :] = merged
+        d[:, i] = merged
+        d[i, i] = np.inf
+        d[j, :] = np.inf
+        d[:, j] = np.inf
+        size[i] += size[j]
+        labels[labels == j] = i
+
+    # Renumber the surviving clusters 0..k-1
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+
+def silhouette_scores(x, labels, k, sample_size=SILHOUETTE_SAMPLE_SIZE, seed=0):
+    """Silhouette of a sample of rows (all of them for small inputs)
+
+    Mean distances to every cluster come from one distance block times a
+    one-hot membership matrix. Returns the sampled positions and their scores.
+    """
+    n = len(x)
+    sampled = np.arange(n) if n <= sample_size else \
+        np.sort(np.random.default_rng(seed).choice(n, size=sample_size, replace=False))
+    members = _membership(labels, k)
+    counts = members.sum(axis=0)
+
+    scores = np.empty(len(sampled))
+    for start in range(0, len(sampled), DISTANCE_BLOCK_SIZE):
+        rows = sampled[start:start + DISTANCE_BLOCK_SIZE]
+        distance_sums = np.sqrt(squared_distances(x[rows], x)) @ members
+        own = labels[rows]
+        own_count = counts[own]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # The zero distance to itself is excluded from its own cluster mean
+            a = distance_sums[np.arange(len(rows)), own] / (own_count - 1)
+            means = distance_sums / counts[None, :]
+        means[np.arange(len(rows)), own] = np.inf
+        means[:, counts == 0] = np.inf
+        b = means.min(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            score = (b - a) / np.maximum(a, b)
+        # Singletons score 0 by convention
+        scores[start:start + len(rows)] = np.where(own_count > 1, np.nan_to_num(score), 0.0)
+    return sampled, scores
+
+
+def cluster_municipalities(model, k, method='kmeans', seed=0):
+    """Cluster every municipality of a model on its ODS vector"""
+    x = cluster_features(model)
+    n = len(x)
+    k = max(1, min(k, n))
+
+    if method == 'kmeans':
+        if n > MINIBATCH_THRESHOLD:
+            labels, centroids, inertia = minibatch_kmeans(x, k, seed)
+        else:
+            labels, centroids, inertia = kmeans(x, k, seed)
+    elif method in ('ward', 'average'):
+        if n > LINKAGE_MAX_SIZE:
+            # Merge weighted micro-clusters instead of every municipality
+            micro, micro_centroids, _ = minibatch_kmeans(x, MICRO_CLUSTERS, seed)
+            weights = np.bincount(micro, minlength=len(micro_centroids)).astype(np.float64)
+            used = weights > 0
+            groups = np.full(len(micro_centroids), -1)
+            groups[used] = linkage_labels(micro_centroids[used], k, method, weights[used])
+            labels = groups[micro]
+        else:
+            labels = linkage_labels(x, k, method)
+        centroids = _update_centroids(x, labels, np.zeros((k, x.shape[1])))
+        inertia = float(((x - centroids[labels]) ** 2).sum())
+    else:
+        raise ValueError(f"Unsupported clustering method: {method}")
+
+    sizes = np.bincount(labels, minlength=k)
+    if k > 1 and n > k:
+        sampled, silhouettes = silhouette_scores(x, labels, k, seed=seed)
+    else:
+        sampled, silhouettes = np.arange(n), np.zeros(n)
+    sampled_labels = labels[sampled]
+    per_cluster = np.bincount(sampled_labels, weights=silhouettes, minlength=k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_cluster = per_cluster / np.bincount(sampled_labels, minlength=k)
+
+    return ClusterResult(
+        method=method,
+        k=k,
+        names=model.municipalities,
+        labels=labels,
+        centroids=centroids.astype(np.float32),
+        sizes=sizes,
+        inertia=inertia,
+        silhouette=float(silhouettes.mean()) if len(silhouettes) else float('nan'),
+        cluster_silhouettes=per_cluster,
+        silhouettes=silhouettes.astype(np.float32),
+        sampled=sampled,
+    )
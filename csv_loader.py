@@ -0,0 +1,114 @@
+import csv
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# Layout of the CSV exports of the workbook (Excel pt-BR "CSV separado por
+# ponto e vírgula"): cp1252 text, ';' between fields, ',' as the decimal
+# mark, '.' between thousands and values stored as percent strings
+CSV_ENCODING = 'cp1252'
+CSV_DELIMITER = ';'
+
+# Numbers in pt-BR notation, optionally with thousands dots and a percent sign
+NUMBER_PATTERN = r'^[-+]?(\d{1,3}(\.\d{3})+|\d+)(,\d+)?%?$'
+
+# First cells of the row that holds the real column labels
+LABEL_ROW_MARKERS = ('ODS', 'Nº ODS', 'N° ODS', 'NO ODS')
+
+
+def _column_count(path, encoding, delimiter):
+    """Number of fields of the first record"""
+    with open(path, encoding=encoding, newline='') as f:
+        return len(next(csv.reader(f, delimiter=delimiter), []))
+
+
+def parse_cells(cells):
+    """Split string cells into numbers and text with vectorized Arrow kernels
+
+    Returns a float64 NumPy array (NaN where the cell is not a number) and
+    an Arrow string array holding the remaining text (null for numbers and
+    blanks). Percent strings such as '52,41%' become fractions (0.5241).
+    """
+    trimmed = pc.utf8_trim_whitespace(cells)
+    is_number = pc.fill_null(pc.match_substring_regex(trimmed, NUMBER_PATTERN), False)
+    canonical = pc.replace_substring(pc.replace_substring(trimmed, '.', ''), ',', '.')
+    canonical = pc.replace_substring(canonical, '%', '')
+    numbers = pc.cast(pc.if_else(is_number, canonical, pa.scalar(None, pa.string())), pa.float64())
+    is_percent = pc.fill_null(pc.ends_with(trimmed, '%'), False)
+    numbers = pc.if_else(pc.and_(is_number, is_percent), pc.divide(numbers, 100.0), numbers)
+
+    numbers = numbers.to_numpy(zero_copy_only=False).astype(np.float64)
+    # Text keeps its original spacing, as the workbook reader does
+    blank = pc.fill_null(pc.equal(trimmed, ''), True)
+    text = pc.if_else(pc.or_(is_number, blank), pa.scalar(None, pa.string()), cells)
+    return numbers, text
+
+
+def detect_label_row(first_column, max_rows=10):
+    """Position of the label row in the first rows of a sheet, or None
+
+    The exports have a two-row (or titled) header: summary numbers or a
+    title come first and the labels live in the row that starts with 'ODS'.
+    """
+    for position, value in enumerate(first_column[:max_rows]):
+        if isinstance(value, str) and value.strip().upper() in LABEL_ROW_MARKERS:
+            return position
+    return None
+
+
+def read_csv_export(path, encoding=CSV_ENCODING, delimiter=CSV_DELIMITER):
+    """Read one CSV export of the workbook into a DataFrame
+
+    The file is parsed by Arrow's multithreaded reader with every column as
+    text, and the numeric conversion runs once over all cells. The label row
+    becomes the header; rows above it are kept in ``df.attrs['header_rows']``.
+    Columns without any text become float64, the others stay object.
+    """
+    n_columns = _column_count(path, encoding, delimiter)
+    names = [f"f{i}" for i in range(n_columns)]
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(encoding=encoding, column_names=names, use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in names},
+                                             strings_can_be_null=True),
+    )
+    n_rows = table.num_rows
+
+    # All cells in one column-major array, parsed in a single pass
+    cells = pa.concat_arrays([chunk for column in table.columns for chunk in column.chunks]) \
+        if n_columns else pa.array([], type=pa.string())
+    numbers, text = parse_cells(cells)
+    numbers = numbers.reshape(n_columns, n_rows)
+    has_text = pc.is_valid(text).to_numpy(zero_copy_only=False).reshape(n_columns, n_rows)
+
+    def cells_at(positions):
+        """Cells at flat positions as objects: the text where present, else the number"""
+        values = numbers.ravel()[positions].astype(object)
+        mask = has_text.ravel()[positions]
+        values[mask] = text.take(pa.array(positions[mask])).to_numpy(zero_copy_only=False)
+        return values
+
+    # Python objects are only built for text columns and header rows; the
+    # numeric columns go straight from the float array into the frame
+    label_row = detect_label_row(cells_at(np.arange(min(n_rows, 10)))) if n_columns else None
+    first = label_row + 1 if label_row is not None else 0
+    columns_start = np.arange(n_columns) * n_rows
+
+    header_rows = [cells_at(columns_start + r).tolist() for r in range(label_row or 0)]
+    labels = cells_at(columns_start + label_row) if label_row is not None else [None] * n_columns
+    labels = [label if isinstance(label, str) else f"Unnamed: {position}" for position, label in enumerate(labels)]
+
+    text_columns = has_text[:, first:].any(axis=1)
+    columns = {
+        position: (cells_at(np.arange(columns_start[position] + first, columns_start[position] + n_rows))
+                   if text_columns[position] else numbers[position, first:])
+        for position in range(n_columns)
+    }
+    df = pd.DataFrame(columns)
+    df.columns = pd.Index(labels, dtype=object)
+    df.attrs['header_rows'] = header_rows
+    return df
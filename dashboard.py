@@ -1,10 +1,32 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
-from datetime import datetime
+import functools
+import time
+
+from analytics import MAX_HEATMAP_SIZE, compute_correlation, most_correlated, summarize_distribution
+from charts import (create_advanced_radar_chart, create_cluster_radar, create_correlation_heatmap,
+                    create_distribution_box, create_distribution_violin, create_gap_heatmap, create_ods_treemap,
+                    create_performance_categories_chart, create_performance_gauge, create_performance_gauges,
+                    create_scenario_comparison, create_scenario_sweep_chart, create_state_ranking_chart,
+                    create_top_correlations_chart, create_trend_analysis, create_vintage_trend_chart, get_ods_info)
+from clustering import CLUSTER_METHODS, cluster_municipalities
+from data_loader import WORKBOOK_PATH
+from data_version import DataVersionService
+from figure_cache import FigureCache, figure_key
+from figure_payload import compact_figure, payload_size
+from instrumentation import ENABLED as PROFILING_ENABLED, recorder, span, traced, traced_cache
+from report_export import ACTION_ITEMS, EXPORT_FORMATS, executive_summary, export_file_name, export_report
+from scenarios import (DEFAULT_BASELINE, MAX_SCENARIOS, baseline_options, baseline_values, evaluate_scenarios,
+                       projection_deltas, scenario_hash, sweep_deltas)
+from shared_store import SharedStore
+from startup import page_style
+from targets import build_gap_index, build_program_catalog, ideal_table
+from vintage_store import VINTAGE_DIR, VintageStore
+
+# Server-side window of the comparison table
+TABLE_ROWS_PER_PAGE = 50
+TABLE_COLUMNS_PER_PAGE = 25
 
 # Page configuration
 st.set_page_config(
@@ -14,306 +36,170 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        background: linear-gradient(90deg, #2E8B57, #20B2AA);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        text-align: center;
-        margin-bottom: 2rem;
-        padding: 1rem;
-    }
-    
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.37);
-        backdrop-filter: blur(4px);
-        border: 1px solid rgba(255, 255, 255, 0.18);
-        margin: 0.5rem 0;
-    }
-    
-    .ods-card {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
-        box-shadow: 0 4px 15px 0 rgba(31, 38, 135, 0.2);
-    }
-    
-    .success-card {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
-    }
-    
-    .warning-card {
-        background: linear-gradient(135deg, #fa709a 0%, #fee140 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
-    }
-    
-    .info-box {
-        background: rgba(255, 255, 255, 0.1);
-        backdrop-filter: blur(10px);
-        border-radius: 15px;
-        padding: 1.5rem;
-        border: 1px solid rgba(255, 255, 255, 0.2);
-        margin: 1rem 0;
-    }
-    
-    .sidebar .sidebar-content {
-        background: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
-    }
-    
-    .stSelectbox > div > div {
-        background-color: rgba(255, 255, 255, 0.1);
-        border-radius: 10px;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for better styling, minified once per process from static/dashboard.css
+st.markdown(page_style(), unsafe_allow_html=True)
 
 # Utility functions
-@st.cache_data
+@st.cache_resource
+def get_data_service():
+    """Process-wide data source, re-ingested when the workbook or its CSV exports change"""
+    service = DataVersionService(WORKBOOK_PATH)
+    service.refresh()
+    service.start()
+    return service
+
+@traced()
 def load_and_process_data():
-    """Load and process the Excel data"""
+    """Load the data; sheets are read only when a view asks for them
+    
+    CSV exports newer than the Excel workbook are read instead of it.
+    """
     try:
-        # Load ODS Municipios sheet
-        ods_data = pd.read_excel('Projeto Goiana - PE.xlsx', sheet_name='ODS Municipios')
-        ods_data = ods_data.dropna(how='all').dropna(axis=1, how='all')
-        
-        # Load other relevant sheets
-        tabela_dados = pd.read_excel('Projeto Goiana - PE.xlsx', sheet_name='Tabela Dados')
-        dados_tabela_din = pd.read_excel('Projeto Goiana - PE.xlsx', sheet_name='Dados Tabela Din')
-        
-        return ods_data, tabela_dados, dados_tabela_din
+        return get_data_service().workbook
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
-        return None, None, None
-
-def get_ods_info():
-    """Get comprehensive ODS information"""
-    return {
-        1: {"name": "Erradicação da Pobreza", "color": "#E5243B", "icon": "🏠"},
-        2: {"name": "Fome Zero", "color": "#DDA63A", "icon": "🌾"},
-        3: {"name": "Saúde e Bem-estar", "color": "#4C9F38", "icon": "❤️"},
-        4: {"name": "Educação de Qualidade", "color": "#C5192D", "icon": "📚"},
-        5: {"name": "Igualdade de Gênero", "color": "#FF3A21", "icon": "⚖️"},
-        6: {"name": "Água Potável e Saneamento", "color": "#26BDE2", "icon": "💧"},
-        7: {"name": "Energia Limpa", "color": "#FCC30B", "icon": "⚡"},
-        8: {"name": "Trabalho Decente", "color": "#A21942", "icon": "💼"},
-        9: {"name": "Inovação e Infraestrutura", "color": "#FD6925", "icon": "🏗️"},
-        10: {"name": "Redução das Desigualdades", "color": "#DD1367", "icon": "📊"},
-        11: {"name": "Cidades Sustentáveis", "color": "#FD9D24", "icon": "🏙️"},
-        12: {"name": "Consumo Responsável", "color": "#BF8B2E", "icon": "♻️"},
-        13: {"name": "Ação Climática", "color": "#3F7E44", "icon": "🌍"},
-        14: {"name": "Vida na Água", "color": "#0A97D9", "icon": "🐠"},
-        15: {"name": "Vida Terrestre", "color": "#56C02B", "icon": "🌳"},
-        16: {"name": "Paz e Justiça", "color": "#00689D", "icon": "⚖️"},
-        17: {"name": "Parcerias", "color": "#19486A", "icon": "🤝"}
-    }
-
-def create_advanced_radar_chart(data, municipalities, title="Comparação ODS"):
-    """Create advanced radar chart with multiple municipalities"""
-    if data is None or not municipalities:
         return None
-    
-    ods_info = get_ods_info()
-    
-    # Get ODS numbers and create labels
-    ods_numbers = sorted(data['ODS'].dropna().unique())
-    labels = [f"{ods_info.get(int(ods), {}).get('icon', '📊')} ODS {int(ods)}" for ods in ods_numbers]
-    
-    fig = go.Figure()
-    
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8']
-    
-    for i, municipality in enumerate(municipalities):
-        if municipality in data.columns:
-            values = []
-            for ods in ods_numbers:
-                ods_row = data[data['ODS'] == ods]
-                if not ods_row.empty and municipality in ods_row.columns:
-                    value = ods_row[municipality].iloc[0]
-                    values.append(value if pd.notna(value) else 0)
-                else:
-                    values.append(0)
-            
-            fig.add_trace(go.Scatterpolar(
-                r=values,
-                theta=labels,
-                fill='toself',
-                name=municipality,
-                line_color=colors[i % len(colors)],
-                fillcolor=colors[i % len(colors)],
-                opacity=0.6
-            ))
-    
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[0, 1],
-                tickfont=dict(size=10)
-            ),
-            angularaxis=dict(
-                tickfont=dict(size=10)
-            )
-        ),
-        showlegend=True,
-        title=dict(text=title, x=0.5, font=dict(size=16)),
-        height=500,
-        font=dict(size=12)
-    )
-    
-    return fig
-
-def create_performance_gauge(value, title, color_scheme="Viridis"):
-    """Create a gauge chart for performance metrics"""
-    fig = go.Figure(go.Indicator(
-        mode = "gauge+number+delta",
-        value = value,
-        domain = {'x': [0, 1], 'y': [0, 1]},
-        title = {'text': title, 'font': {'size': 16}},
-        delta = {'reference': 0.5, 'increasing': {'color': "green"}, 'decreasing': {'color': "red"}},
-        gauge = {
-            'axis': {'range': [None, 1], 'tickwidth': 1, 'tickcolor': "darkblue"},
-            'bar': {'color': "darkblue"},
-            'bgcolor': "white",
-            'borderwidth': 2,
-            'bordercolor': "gray",
-            'steps': [
-                {'range': [0, 0.3], 'color': '#ffcccc'},
-                {'range': [0.3, 0.7], 'color': '#ffffcc'},
-                {'range': [0.7, 1], 'color': '#ccffcc'}
-            ],
-            'threshold': {
-                'line': {'color': "red", 'width': 4},
-                'thickness': 0.75,
-                'value': 0.8
-            }
-        }
-    ))
-    
-    fig.update_layout(height=300, margin=dict(l=20, r=20, t=40, b=20))
-    return fig
 
-def create_ods_treemap(data, municipality):
-    """Create treemap visualization for ODS performance"""
-    if data is None or municipality not in data.columns:
-        return None
-    
-    ods_info = get_ods_info()
-    
-    # Prepare data
-    treemap_data = []
-    for _, row in data.iterrows():
-        ods_num = int(row['ODS'])
-        value = row[municipality]
-        if pd.notna(value):
-            treemap_data.append({
-                'ODS': f"ODS {ods_num}",
-                'Nome': ods_info.get(ods_num, {}).get('name', 'N/A'),
-                'Valor': value,
-                'Icon': ods_info.get(ods_num, {}).get('icon', '📊'),
-                'Color': ods_info.get(ods_num, {}).get('color', '#333333')
-            })
-    
-    if not treemap_data:
-        return None
-    
-    df_treemap = pd.DataFrame(treemap_data)
-    
-    fig = px.treemap(
-        df_treemap,
-        path=['ODS'],
-        values='Valor',
-        color='Valor',
-        color_continuous_scale='RdYlGn',
-        title=f'Mapa de Árvore ODS - {municipality}',
-        hover_data=['Nome']
-    )
-    
-    fig.update_traces(
-        texttemplate="<b>%{label}</b><br>%{value:.3f}",
-        textfont_size=12
-    )
-    
-    fig.update_layout(height=500)
-    return fig
+@st.cache_resource
+def get_shared_store():
+    """Typed ODS model and statistics, built once per data version and shared by every session"""
+    return SharedStore()
 
-def create_trend_analysis(data, municipalities):
-    """Create trend analysis chart"""
-    if data is None or not municipalities:
-        return None
-    
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=('Distribuição de Performance', 'Comparação por Quartis', 
-                       'Análise de Variabilidade', 'Performance Relativa'),
-        specs=[[{"secondary_y": False}, {"secondary_y": False}],
-               [{"secondary_y": False}, {"secondary_y": False}]]
-    )
-    
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
-    
-    for i, municipality in enumerate(municipalities[:4]):
-        if municipality in data.columns:
-            values = data[municipality].dropna()
-            
-            # Histogram
-            fig.add_trace(
-                go.Histogram(x=values, name=f'{municipality} Dist', 
-                           opacity=0.7, nbinsx=10, 
-                           marker_color=colors[i % len(colors)]),
-                row=1, col=1
-            )
-            
-            # Box plot
-            fig.add_trace(
-                go.Box(y=values, name=f'{municipality} Box',
-                      marker_color=colors[i % len(colors)]),
-                row=1, col=2
-            )
-            
-            # Violin plot
-            fig.add_trace(
-                go.Violin(y=values, name=f'{municipality} Violin',
-                         line_color=colors[i % len(colors)]),
-                row=2, col=1
-            )
+@traced_cache(st.cache_resource(max_entries=16))
+def get_correlation(_model, version, municipalities, method, ordered):
+    """Correlation matrix of a selection, cached per selection and data version"""
+    return compute_correlation(_model, municipalities, method, ordered)
+
+@traced_cache(st.cache_data(max_entries=64))
+def get_most_correlated(_model, version, municipality, k, method):
+    """Municipalities most correlated with one municipality"""
+    return most_correlated(_model, municipality, k, method)
+
+@traced_cache(st.cache_resource(max_entries=4096))
+def get_distribution(_model, version, municipality, bins):
+    """Distribution summary of one municipality, cached per data version"""
+    return summarize_distribution(_model.values(municipality), bins)
+
+def get_distributions(model, municipalities, bins=10):
+    """Cached distribution summaries of the municipalities of a selection"""
+    distributions = []
+    for municipality in model.known(municipalities):
+        summary = get_distribution(model, model.version, municipality, bins)
+        if summary is not None:
+            distributions.append((municipality, summary))
+    return distributions
+
+@traced_cache(st.cache_resource(max_entries=16))
+def get_report_export(_model, _stats, version, municipalities, fmt):
+    """Executive report file of a selection, built once per selection, format and data version"""
+    municipalities = list(municipalities)
+    figures = ()
+    if fmt == 'html':
+        figures = (create_advanced_radar_chart(_model, municipalities[:4], "Comparação Multidimensional ODS"),
+                   create_performance_categories_chart(_stats, municipalities))
+    return export_report(fmt, _model, _stats, municipalities, figures)
+
+@traced_cache(st.cache_resource(max_entries=16))
+def get_clusters(_model, version, k, method):
+    """Clusters of every municipality, computed once per data version, k and method"""
+    return cluster_municipalities(_model, k, method)
+
+@traced_cache(st.cache_resource(max_entries=2))
+def get_targets(_workbook, version):
+    """Ideal ranges and program catalog of 'Dados Tabela Din', parsed once per sheet version"""
+    sheet = _workbook.sheet('Dados Tabela Din')
+    return ideal_table(sheet), build_program_catalog(sheet)
+
+@traced_cache(st.cache_resource(max_entries=2))
+def get_gap_index(_model, _ideals, version):
+    """Gap-to-ideal of every municipality and ODS, computed once per data version"""
+    return build_gap_index(_model, _ideals, version)
+
+@st.cache_resource
+def get_vintage_store():
+    """Yearly IDS editions ingested with `python vintage_store.py ingest`"""
+    return VintageStore(VINTAGE_DIR)
+
+@traced_cache(st.cache_data(max_entries=16))
+def get_vintage_summary(_store, version, municipalities):
+    """Per-edition aggregates of a selection, read once per store version"""
+    return _store.summary(municipalities)
+
+@traced_cache(st.cache_resource(max_entries=32))
+def get_scenarios(_model, version, baseline, scenario_key, _deltas, labels=None):
+    """What-if scenarios over a baseline, cached per scenario hash"""
+    return evaluate_scenarios(_model, baseline_values(_model, baseline), _deltas, labels)
+
+@st.cache_resource
+def get_figure_cache():
+    """Process-wide LRU cache of serialized figures"""
+    return FigureCache()
+
+def cached_figure(chart, municipalities, version, builder, **options):
+    """Return a figure from the figure cache, building it on a miss
+    
+    In compact mode the figure is slimmed down before it is cached, so the
+    compact and full variants live under different keys.
+    """
+    compact = bool(st.session_state.get('compact_charts'))
+    key = figure_key(chart, municipalities, dict(options, compact=compact), version)
+    if compact:
+        return get_figure_cache().get_or_build(key, lambda: compact_figure(builder()))
+    return get_figure_cache().get_or_build(key, builder)
+
+def show_chart(fig, name):
+    """Render a Plotly figure, recording its payload when the meter is on"""
+    with span('plotly_chart', chart=name) as fields:
+        st.plotly_chart(fig, use_container_width=True)
+        if PROFILING_ENABLED:
+            fields['bytes'] = payload_size(fig)
+    if st.session_state.get('show_chart_payloads'):
+        size = payload_size(fig)
+        st.session_state.setdefault('chart_payloads', {})[name] = size
+        st.caption(f"📦 {name}: {size / 1024:.1f} KB")
+
+def timed_fragment(name):
+    """Run a dashboard section as a fragment and record its rerun cost
+    
+    A fragment re-executes on its own when one of its widgets changes,
+    without rerunning the rest of the page.
+    """
+    def decorator(func):
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            elapsed_ms = (time.perf_counter() - start) * 1000
             
-            # Performance by ODS
-            ods_performance = []
-            for ods in sorted(data['ODS'].dropna().unique()):
-                ods_row = data[data['ODS'] == ods]
-                if not ods_row.empty:
-                    value = ods_row[municipality].iloc[0]
-                    if pd.notna(value):
-                        ods_performance.append(value)
+            timings = st.session_state.setdefault('fragment_timings', {})
+            entry = timings.setdefault(name, {'runs': 0, 'last_ms': 0.0, 'total_ms': 0.0})
+            entry['runs'] += 1
+            entry['last_ms'] = elapsed_ms
+            entry['total_ms'] += elapsed_ms
             
-            fig.add_trace(
-                go.Scatter(x=list(range(len(ods_performance))), y=ods_performance,
-                          mode='lines+markers', name=f'{municipality} Trend',
-                          line=dict(color=colors[i % len(colors)], width=3),
-                          marker=dict(size=8)),
-                row=2, col=2
-            )
+            if st.session_state.get('show_fragment_timings'):
+                st.caption(f"⏱️ Fragmento '{name}': {elapsed_ms:.1f} ms (execução nº {entry['runs']})")
+            return result
+        return wrapper
+    return decorator
+
+
+def build_comparison_table(model, municipalities, rows=slice(None), columns=slice(None)):
+    """Numeric comparison table of a selection, for one window of rows and columns
+    
+    Values keep their numeric dtype (formatting is left to the column
+    config), and only the requested window is ever materialized.
+    """
+    known = model.known(municipalities)[columns]
+    table = model.frame[known].iloc[rows]
     
-    fig.update_layout(height=800, showlegend=True, title_text="Análise Avançada de Tendências")
-    return fig
+    ods_info = get_ods_info()
+    ods_numbers = table.index.to_numpy()
+    table = table.reset_index(drop=True)
+    table.insert(0, 'Nome', [ods_info.get(int(ods), {}).get('name', 'N/A') for ods in ods_numbers])
+    table.insert(0, 'ODS', [f"{ods_info.get(int(ods), {}).get('icon', '📊')} ODS {int(ods)}" for ods in ods_numbers])
+    return table
 
 # Main application
 def main():
@@ -321,18 +207,23 @@ def main():
     st.markdown('<h1 class="main-header">🌍 Dashboard Interativo ODS - Goiana PE</h1>', unsafe_allow_html=True)
     
     # Load data
-    ods_data, tabela_dados, dados_tabela_din = load_and_process_data()
+    workbook = load_and_process_data()
     
-    if ods_data is None:
+    if workbook is None:
         st.error("❌ Não foi possível carregar os dados. Verifique o arquivo Excel.")
         return
     
-    # Process data
-    municipalities = [col for col in ods_data.columns if col not in ['Unnamed: 0', 'Unnamed: 1'] and 'Unnamed' not in str(col)]
-    ods_data_clean = ods_data[['Unnamed: 0'] + municipalities].copy()
-    ods_data_clean.columns = ['ODS'] + municipalities
-    ods_data_clean['ODS'] = pd.to_numeric(ods_data_clean['ODS'], errors='coerce')
-    ods_data_clean = ods_data_clean.dropna(subset=['ODS'])
+    # Typed ODS model, cleaned once per data version instead of on every rerun
+    try:
+        with span('cleaning'):
+            # Keyed by the content of this sheet only: edits elsewhere keep every cache warm
+            data = get_shared_store().get(workbook, workbook.sheet_version('ODS Municipios')[:16])
+            model, stats, ranks = data.model, data.stats, data.ranks
+    except Exception as e:
+        st.error(f"❌ Não foi possível carregar os dados. Verifique o arquivo Excel. ({e})")
+        return
+    
+    municipalities = list(model.municipalities)
     
     # Sidebar
     st.sidebar.markdown("## 🎛️ Controles do Dashboard")
@@ -346,7 +237,7 @@ def main():
     )
     
     # ODS selection
-    available_ods = sorted(ods_data_clean['ODS'].dropna().unique())
+    available_ods = sorted(model.ods.tolist())
     selected_ods = st.sidebar.selectbox(
         "🎯 Foco em ODS:",
         available_ods,
@@ -356,20 +247,89 @@ def main():
     # Analysis type
     analysis_type = st.sidebar.radio(
         "📊 Tipo de Análise:",
-        ["Visão Geral", "Comparativo Detalhado", "Análise Avançada", "Relatório Executivo"]
+        ["Visão Geral", "Comparativo Detalhado", "Análise Avançada", "Cenários", "Metas e Ações",
+         "Ranking Estadual", "Relatório Executivo"]
+    )
+    
+    st.sidebar.checkbox(
+        "⏱️ Mostrar custo de cada seção",
+        key='show_fragment_timings',
+        help="Exibe o tempo de execução de cada seção interativa do painel"
     )
     
+    st.sidebar.checkbox(
+        "📱 Modo compacto",
+        key='compact_charts',
+        help="Gráficos mais leves: valores arredondados, WebGL para muitos pontos e tema enxuto"
+    )
+    
+    st.sidebar.checkbox(
+        "📦 Medir tamanho dos gráficos",
+        key='show_chart_payloads',
+        help="Exibe quantos bytes cada gráfico envia ao navegador a cada execução"
+    )
+    # Payloads are counted per rerun and summed once the views have rendered
+    st.session_state['chart_payloads'] = {}
+    payload_total = st.sidebar.empty()
+    
     # Main content based on analysis type
     if analysis_type == "Visão Geral":
-        show_overview(ods_data_clean, selected_municipalities)
+        show_overview(model, stats, ranks, selected_municipalities)
     elif analysis_type == "Comparativo Detalhado":
-        show_detailed_comparison(ods_data_clean, selected_municipalities)
+        show_detailed_comparison(model, selected_municipalities)
     elif analysis_type == "Análise Avançada":
-        show_advanced_analysis(ods_data_clean, selected_municipalities)
+        show_advanced_analysis(model, stats, selected_municipalities)
+    elif analysis_type == "Cenários":
+        show_scenarios(model, selected_municipalities)
+    elif analysis_type == "Metas e Ações":
+        show_targets(workbook, model, selected_municipalities)
+    elif analysis_type == "Ranking Estadual":
+        show_state_ranking(ranks, selected_municipalities, selected_ods)
     else:
-        show_executive_report(ods_data_clean, selected_municipalities)
+        show_executive_report(model, stats, ranks, selected_municipalities)
+    
+    if st.session_state.get('show_chart_payloads'):
+        payloads = st.session_state['chart_payloads']
+        payload_total.caption(f"📦 {len(payloads)} gráficos, {sum(payloads.values()) / 1024:.1f} KB nesta execução")
+    
+    if PROFILING_ENABLED:
+        show_performance_panel()
 
-def show_overview(data, municipalities):
+def show_performance_panel():
+    """Sidebar panel with the profiling spans of this server process (ODS_PROFILE=1)"""
+    with st.sidebar.expander("⚙️ Desempenho"):
+        stages = recorder.stages()
+        if stages:
+            st.markdown("**Etapas**")
+            timings = pd.DataFrame.from_dict(stages, orient='index')
+            timings['média_ms'] = timings['total_ms'] / timings['count']
+            columns = ['count', 'last_ms', 'média_ms', 'max_ms'] + (['last_bytes'] if 'last_bytes' in timings else [])
+            st.dataframe(timings[columns].sort_values('max_ms', ascending=False).round(2),
+                         use_container_width=True)
+        
+        st.markdown("**Caches**")
+        caches = {name: {'chamadas': entry['calls'], 'acertos': entry['hit_rate']}
+                  for name, entry in recorder.cache_stats().items()}
+        figure_stats = get_figure_cache().stats()
+        caches['figuras'] = {'chamadas': figure_stats['hits'] + figure_stats['misses'],
+                             'acertos': figure_stats['hit_rate']}
+        st.dataframe(pd.DataFrame.from_dict(caches, orient='index').style.format({'acertos': '{:.0%}'}),
+                     use_container_width=True)
+        st.caption(f"Cache de figuras: {figure_stats['entries']} entradas, "
+                   f"{figure_stats['bytes'] / 1024:.0f} KB")
+        store_stats = get_shared_store().stats()
+        st.caption(f"Dados compartilhados: {len(store_stats['versions'])} versões, "
+                   f"{store_stats['builds']} construções, {store_stats['hits']} acertos, "
+                   f"{store_stats['bytes'] / 1024:.0f} KB")
+        
+        service = get_data_service()
+        if service.updated_at is not None:
+            changed = f" (alteradas: {', '.join(service.changed_sheets)})" if service.changed_sheets else ""
+            st.caption(f"Dados: versão {service.token} de {time.strftime('%d/%m %H:%M:%S', time.localtime(service.updated_at))}"
+                       f"{changed}{'' if service.watching else ', sem monitoramento de arquivos'}")
+
+@traced()
+def show_overview(model, stats, ranks, municipalities):
     """Show overview dashboard"""
     st.markdown("## 📊 Visão Geral do Desempenho ODS")
     
@@ -377,11 +337,13 @@ def show_overview(data, municipalities):
         st.warning("⚠️ Selecione pelo menos um município para visualizar os dados.")
         return
     
+    selected_stats = stats.subset(municipalities)
+    
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_ods = len(data['ODS'].dropna())
+        total_ods = model.n_ods
         st.markdown(f"""
         <div class="metric-card">
             <h3>🎯 ODS Avaliados</h3>
@@ -399,8 +361,8 @@ def show_overview(data, municipalities):
         """, unsafe_allow_html=True)
     
     with col3:
-        if 'Goiana 1' in data.columns:
-            avg_goiana = data['Goiana 1'].mean()
+        if 'Goiana 1' in stats.table.index:
+            avg_goiana = stats.row('Goiana 1')['mean']
             st.markdown(f"""
             <div class="metric-card">
                 <h3>📈 Média Goiana</h3>
@@ -409,21 +371,15 @@ def show_overview(data, municipalities):
             """, unsafe_allow_html=True)
     
     with col4:
-        if municipalities:
-            best_municipality = municipalities[0]
-            best_avg = 0
-            for municipality in municipalities:
-                if municipality in data.columns:
-                    avg = data[municipality].mean()
-                    if avg > best_avg:
-                        best_avg = avg
-                        best_municipality = municipality
+        if selected_stats['mean'].notna().any():
+            best_municipality = selected_stats['mean'].idxmax()
+            best_avg = selected_stats.loc[best_municipality, 'mean']
             
             st.markdown(f"""
             <div class="metric-card">
                 <h3>🏆 Melhor Média</h3>
                 <h2>{best_municipality}</h2>
-                <p>{best_avg:.3f}</p>
+                <p>{best_avg:.3f} · {ranks.rank_of(best_municipality)}º de {ranks.count[ranks.row()]} no estado</p>
             </div>
             """, unsafe_allow_html=True)
     
@@ -432,29 +388,43 @@ def show_overview(data, municipalities):
     
     with col1:
         # Radar chart
-        radar_fig = create_advanced_radar_chart(data, municipalities[:4], "Comparação Multidimensional ODS")
+        radar_fig = cached_figure('radar', municipalities[:4], model.version,
+                                  lambda: create_advanced_radar_chart(model, municipalities[:4], "Comparação Multidimensional ODS"))
         if radar_fig:
-            st.plotly_chart(radar_fig, use_container_width=True)
+            show_chart(radar_fig, 'Radar')
     
     with col2:
         # Performance gauges
         st.markdown("### 🎯 Medidores de Performance")
-        for municipality in municipalities[:3]:
-            if municipality in data.columns:
-                avg_performance = data[municipality].mean()
-                gauge_fig = create_performance_gauge(avg_performance, municipality)
-                st.plotly_chart(gauge_fig, use_container_width=True)
+        averages = stats.subset(municipalities[:3])['mean']
+        if st.checkbox("Combinar medidores em um gráfico", key='combined_gauges'):
+            gauges_fig = cached_figure('gauges', list(averages.index), model.version,
+                                       lambda: create_performance_gauges(averages))
+            show_chart(gauges_fig, 'Medidores')
+        else:
+            for municipality, avg_performance in averages.items():
+                gauge_fig = cached_figure('gauge', [municipality], model.version,
+                                          lambda: create_performance_gauge(avg_performance, municipality))
+                show_chart(gauge_fig, f'Medidor {municipality}')
     
     # Treemap visualization
     if municipalities:
-        st.markdown("### 🗺️ Mapa de Árvore - Distribuição ODS")
-        selected_municipality = st.selectbox("Escolha um município para o mapa de árvore:", municipalities)
-        
-        treemap_fig = create_ods_treemap(data, selected_municipality)
-        if treemap_fig:
-            st.plotly_chart(treemap_fig, use_container_width=True)
+        show_treemap_section(model, municipalities)
+
+@timed_fragment('Mapa de Árvore')
+@traced()
+def show_treemap_section(model, municipalities):
+    """Treemap section, rerun on its own when its municipality changes"""
+    st.markdown("### 🗺️ Mapa de Árvore - Distribuição ODS")
+    selected_municipality = st.selectbox("Escolha um município para o mapa de árvore:", municipalities)
+    
+    treemap_fig = cached_figure('treemap', [selected_municipality], model.version,
+                                lambda: create_ods_treemap(model, selected_municipality))
+    if treemap_fig:
+        show_chart(treemap_fig, 'Mapa de Árvore')
 
-def show_detailed_comparison(data, municipalities):
+@traced()
+def show_detailed_comparison(model, municipalities):
     """Show detailed comparison analysis"""
     st.markdown("## 📈 Análise Comparativa Detalhada")
     
@@ -463,27 +433,7 @@ def show_detailed_comparison(data, municipalities):
         return
     
     # Performance comparison table
-    st.markdown("### 📊 Tabela de Performance Comparativa")
-    
-    comparison_data = []
-    ods_info = get_ods_info()
-    
-    for _, row in data.iterrows():
-        ods_num = int(row['ODS'])
-        row_data = {
-            'ODS': f"{ods_info.get(ods_num, {}).get('icon', '📊')} ODS {ods_num}",
-            'Nome': ods_info.get(ods_num, {}).get('name', 'N/A')
-        }
-        
-        for municipality in municipalities:
-            if municipality in data.columns:
-                value = row[municipality]
-                row_data[municipality] = f"{value:.3f}" if pd.notna(value) else "N/A"
-        
-        comparison_data.append(row_data)
-    
-    comparison_df = pd.DataFrame(comparison_data)
-    st.dataframe(comparison_df, use_container_width=True)
+    show_comparison_table_section(model, municipalities)
     
     # Statistical comparison
     st.markdown("### 📈 Análise Estatística")
@@ -492,44 +442,99 @@ def show_detailed_comparison(data, municipalities):
     
     with col1:
         # Box plot comparison
-        box_data = []
-        for municipality in municipalities:
-            if municipality in data.columns:
-                values = data[municipality].dropna()
-                for value in values:
-                    box_data.append({'Município': municipality, 'Valor ODS': value})
-        
-        if box_data:
-            box_df = pd.DataFrame(box_data)
-            fig_box = px.box(box_df, x='Município', y='Valor ODS',
-                           title='Distribuição de Performance ODS',
-                           color='Município')
-            fig_box.update_layout(height=400)
-            st.plotly_chart(fig_box, use_container_width=True)
+        fig_box = cached_figure('box', municipalities, model.version,
+                                lambda: create_distribution_box(get_distributions(model, municipalities)))
+        if fig_box:
+            show_chart(fig_box, 'Box Plot')
     
     with col2:
         # Violin plot
-        if box_data:
-            fig_violin = px.violin(box_df, x='Município', y='Valor ODS',
-                                 title='Densidade de Performance ODS',
-                                 color='Município')
-            fig_violin.update_layout(height=400)
-            st.plotly_chart(fig_violin, use_container_width=True)
+        fig_violin = cached_figure('violin', municipalities, model.version,
+                                   lambda: create_distribution_violin(get_distributions(model, municipalities)))
+        if fig_violin:
+            show_chart(fig_violin, 'Violino')
     
     # Correlation analysis
+    show_correlation_section(model, municipalities)
+
+@timed_fragment('Tabela Comparativa')
+@traced()
+def show_comparison_table_section(model, municipalities):
+    """Comparison table, paged server-side for large selections"""
+    st.markdown("### 📊 Tabela de Performance Comparativa")
+    
+    known = model.known(municipalities)
+    row_pages = max(1, -(-model.n_ods // TABLE_ROWS_PER_PAGE))
+    column_pages = max(1, -(-len(known) // TABLE_COLUMNS_PER_PAGE))
+    
+    row_page, column_page = 1, 1
+    if row_pages > 1 or column_pages > 1:
+        col1, col2 = st.columns(2)
+        with col1:
+            if row_pages > 1:
+                row_page = st.number_input(f"Página de ODS (de {row_pages}):", min_value=1, max_value=row_pages, value=1)
+        with col2:
+            if column_pages > 1:
+                column_page = st.number_input(f"Página de municípios (de {column_pages}):",
+                                              min_value=1, max_value=column_pages, value=1)
+    
+    rows = slice((row_page - 1) * TABLE_ROWS_PER_PAGE, row_page * TABLE_ROWS_PER_PAGE)
+    columns = slice((column_page - 1) * TABLE_COLUMNS_PER_PAGE, column_page * TABLE_COLUMNS_PER_PAGE)
+    comparison_df = build_comparison_table(model, known, rows, columns)
+    
+    st.dataframe(
+        comparison_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            municipality: st.column_config.NumberColumn(municipality, format="%.3f")
+            for municipality in comparison_df.columns[2:]
+        }
+    )
+
+@timed_fragment('Correlação')
+@traced()
+def show_correlation_section(model, municipalities):
+    """Correlation section, rerun on its own when its method changes"""
     st.markdown("### 🔗 Análise de Correlação")
     
-    if len(municipalities) >= 2:
-        correlation_data = data[municipalities].corr()
+    col1, col2 = st.columns(2)
+    with col1:
+        mode = st.radio("Modo:", ["Matriz", "Mais correlacionados"], horizontal=True)
+    with col2:
+        method = st.radio(
+            "Método de correlação:",
+            ['pearson', 'spearman'],
+            format_func=lambda x: {'pearson': 'Pearson', 'spearman': 'Spearman'}[x],
+            horizontal=True
+        )
+    
+    if mode == "Matriz":
+        known = tuple(model.known(municipalities))
+        ordered = st.checkbox("Ordenar por agrupamento hierárquico", value=True)
+        if len(known) > MAX_HEATMAP_SIZE:
+            st.caption(f"ℹ️ {len(known)} municípios agregados em {MAX_HEATMAP_SIZE} blocos (média das correlações).")
         
-        fig_corr = px.imshow(correlation_data,
-                           title='Matriz de Correlação entre Municípios',
-                           color_continuous_scale='RdBu',
-                           aspect='auto')
-        fig_corr.update_layout(height=500)
-        st.plotly_chart(fig_corr, use_container_width=True)
-
-def show_advanced_analysis(data, municipalities):
+        fig_corr = cached_figure('correlation', known, model.version,
+                                 lambda: create_correlation_heatmap(get_correlation(model, model.version, known, method, ordered)),
+                                 method=method, ordered=ordered)
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            reference = st.selectbox("Município de referência:", municipalities)
+        with col2:
+            k = st.slider("Quantidade:", min_value=5, max_value=50, value=10)
+        
+        fig_corr = cached_figure('top_correlation', [reference], model.version,
+                                 lambda: create_top_correlations_chart(
+                                     get_most_correlated(model, model.version, reference, k, method), reference),
+                                 k=k, method=method)
+    
+    if fig_corr:
+        show_chart(fig_corr, 'Correlação')
+
+@traced()
+def show_advanced_analysis(model, stats, municipalities):
     """Show advanced analysis"""
     st.markdown("## 🔬 Análise Avançada")
     
@@ -538,71 +543,36 @@ def show_advanced_analysis(data, municipalities):
         return
     
     # Trend analysis
-    trend_fig = create_trend_analysis(data, municipalities)
-    if trend_fig:
-        st.plotly_chart(trend_fig, use_container_width=True)
+    show_trend_section(model, municipalities)
     
     # Performance clustering
     st.markdown("### 🎯 Análise de Clusters de Performance")
     
     # Create performance categories
-    performance_categories = []
-    ods_info = get_ods_info()
+    fig_stack = cached_figure('categories', municipalities, model.version,
+                              lambda: create_performance_categories_chart(stats, municipalities))
+    if fig_stack:
+        show_chart(fig_stack, 'Categorias')
     
-    for municipality in municipalities:
-        if municipality in data.columns:
-            values = data[municipality].dropna()
-            high_performance = len(values[values >= 0.7])
-            medium_performance = len(values[(values >= 0.4) & (values < 0.7)])
-            low_performance = len(values[values < 0.4])
-            
-            performance_categories.append({
-                'Município': municipality,
-                'Alta Performance (≥0.7)': high_performance,
-                'Média Performance (0.4-0.7)': medium_performance,
-                'Baixa Performance (<0.4)': low_performance
-            })
-    
-    if performance_categories:
-        perf_df = pd.DataFrame(performance_categories)
-        
-        fig_stack = px.bar(perf_df, x='Município',
-                          y=['Alta Performance (≥0.7)', 'Média Performance (0.4-0.7)', 'Baixa Performance (<0.4)'],
-                          title='Distribuição de Performance por Categoria',
-                          color_discrete_map={
-                              'Alta Performance (≥0.7)': '#2ECC71',
-                              'Média Performance (0.4-0.7)': '#F39C12',
-                              'Baixa Performance (<0.4)': '#E74C3C'
-                          })
-        fig_stack.update_layout(height=500)
-        st.plotly_chart(fig_stack, use_container_width=True)
+    show_cluster_section(model, municipalities)
     
     # Recommendations
     st.markdown("### 💡 Recomendações Baseadas em Dados")
     
-    recommendations = []
-    
-    for municipality in municipalities[:3]:
-        if municipality in data.columns:
-            values = data[municipality].dropna()
-            worst_ods_idx = values.idxmin()
-            worst_ods = data.loc[worst_ods_idx, 'ODS']
-            worst_value = values.min()
-            
-            best_ods_idx = values.idxmax()
-            best_ods = data.loc[best_ods_idx, 'ODS']
-            best_value = values.max()
-            
-            recommendations.append({
-                'municipality': municipality,
-                'worst_ods': int(worst_ods),
-                'worst_value': worst_value,
-                'best_ods': int(best_ods),
-                'best_value': best_value
-            })
+    recommendations = [
+        {
+            'municipality': municipality,
+            'worst_ods': int(row['worst_ods']),
+            'worst_value': row['min'],
+            'best_ods': int(row['best_ods']),
+            'best_value': row['max']
+        }
+        for municipality, row in stats.subset(municipalities[:3]).iterrows()
+        if row['count'] > 0
+    ]
     
+    ods_info = get_ods_info()
     for rec in recommendations:
-        ods_info = get_ods_info()
         worst_name = ods_info.get(rec['worst_ods'], {}).get('name', 'N/A')
         best_name = ods_info.get(rec['best_ods'], {}).get('name', 'N/A')
         
@@ -618,7 +588,288 @@ def show_advanced_analysis(data, municipalities):
         </div>
         """, unsafe_allow_html=True)
 
-def show_executive_report(data, municipalities):
+@timed_fragment('Clusters')
+@traced()
+def show_cluster_section(model, municipalities):
+    """Clusters of all municipalities on their ODS vectors, rerun on their own when k or the method change"""
+    if model.n_municipalities < 3:
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        method = st.selectbox("Método de agrupamento:", list(CLUSTER_METHODS), format_func=CLUSTER_METHODS.get)
+    with col2:
+        k = st.slider("Número de clusters:", min_value=2, max_value=min(8, model.n_municipalities - 1), value=3)
+    
+    clusters = get_clusters(model, model.version, k, method)
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fig = cached_figure('clusters', [], model.version, lambda: create_cluster_radar(model, clusters),
+                            k=k, method=method)
+        if fig:
+            show_chart(fig, 'Clusters')
+    with col2:
+        st.metric("Silhueta média", f"{clusters.silhouette:.3f}",
+                  help="De -1 a 1: quanto maior, mais separados e coesos são os clusters")
+        summary = pd.DataFrame({
+            'municípios': clusters.sizes,
+            'silhueta': clusters.cluster_silhouettes.round(3),
+        }, index=pd.Index([f"Cluster {c + 1}" for c in range(clusters.k)], name='Cluster'))
+        st.dataframe(summary, use_container_width=True)
+    
+    if municipalities:
+        st.markdown("**Municípios selecionados**")
+        st.dataframe(clusters.frame(municipalities).round(3), use_container_width=True)
+
+@timed_fragment('Tendências')
+@traced()
+def show_trend_section(model, municipalities):
+    """Trend panel, rerun on its own when its histogram bins change"""
+    nbins = st.slider("Intervalos do histograma:", min_value=5, max_value=30, value=10)
+    
+    trend_fig = cached_figure('trend', municipalities[:4], model.version,
+                              lambda: create_trend_analysis(
+                                  model, get_distributions(model, municipalities[:4], nbins)), nbins=nbins)
+    if trend_fig:
+        show_chart(trend_fig, 'Tendências')
+    
+    show_vintage_trend(municipalities[:4])
+
+@traced()
+def show_vintage_trend(municipalities):
+    """Evolution of a selection across the ingested IDS editions"""
+    store = get_vintage_store()
+    years = store.years
+    if len(years) < 2:
+        st.caption("📅 Evolução entre edições: armazene ao menos duas edições do IDS com "
+                   "`python vintage_store.py ingest <ano> <arquivo.xlsx>`.")
+        return
+    
+    summary = get_vintage_summary(store, store.version, tuple(municipalities))
+    vintage_fig = cached_figure('vintages', municipalities, store.version,
+                                lambda: create_vintage_trend_chart(summary, municipalities))
+    if vintage_fig:
+        show_chart(vintage_fig, 'Edições')
+        latest = summary[summary['year'] == years[-1]].set_index('municipality')
+        st.dataframe(latest[['mean', 'delta', 'rolling_mean', 'trend']].rename(columns={
+            'mean': f'média {years[-1]}', 'delta': 'Δ edição anterior', 'rolling_mean': 'média móvel',
+            'trend': 'tendência/ano'}).round(4), use_container_width=True)
+
+@traced()
+def show_scenarios(model, municipalities):
+    """Show projections and what-if sweeps over a baseline"""
+    st.markdown("## 🔮 Cenários e Projeções")
+    
+    options = baseline_options(model, municipalities)
+    if not options:
+        st.warning("⚠️ Selecione municípios para simular cenários.")
+        return
+    
+    baseline = st.selectbox("Ponto de partida:", options,
+                            index=options.index(DEFAULT_BASELINE) if DEFAULT_BASELINE in options else 0)
+    base = baseline_values(model, baseline)
+    
+    # The sheet's own projections, side by side with the benchmark averages
+    labels, deltas = projection_deltas(model, base)
+    if labels:
+        st.markdown("### 📈 Projeções da Planilha")
+        key = scenario_hash(model.version, baseline, deltas)
+        result = get_scenarios(model, model.version, baseline, key, deltas, tuple(labels))
+        fig = cached_figure('scenarios', [baseline], model.version,
+                            lambda: create_scenario_comparison(model, result, baseline), scenario=key)
+        if fig:
+            show_chart(fig, 'Cenários')
+        st.dataframe(result.frame().round(3), use_container_width=True)
+    
+    show_scenario_sweep(model, baseline)
+
+@timed_fragment('Simulação de Metas')
+@traced()
+def show_scenario_sweep(model, baseline):
+    """What-if sweep, rerun on its own while the targets are adjusted"""
+    st.markdown("### 🎚️ Simulação de Metas")
+    
+    base = baseline_values(model, baseline)
+    ods_numbers = model.sorted_ods.tolist()
+    ods_info = get_ods_info()
+    # Start from the weakest ODS of the baseline
+    weakest = [ods_numbers[i] for i in np.argsort(np.nan_to_num(base, nan=np.inf))[:3]]
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        swept = st.multiselect("ODS a variar:", ods_numbers, default=weakest,
+                               format_func=lambda x: f"ODS {int(x)}: {ods_info.get(int(x), {}).get('name', 'N/A')}")
+    with col2:
+        max_delta = st.slider("Variação máxima por ODS:", min_value=0.05, max_value=0.5, value=0.2, step=0.05)
+    with col3:
+        n_steps = st.slider("Passos por ODS:", min_value=2, max_value=11, value=6)
+    
+    n_scenarios = n_steps ** len(swept)
+    if n_scenarios > MAX_SCENARIOS:
+        st.warning(f"⚠️ {n_scenarios:,} combinações excedem o limite de {MAX_SCENARIOS:,}. "
+                   "Reduza o número de ODS ou de passos.")
+        return
+    
+    budget = st.slider("Orçamento de esforço (soma das variações):", min_value=0.0,
+                       max_value=float(max_delta * max(len(swept), 1)), value=float(max_delta),
+                       step=0.05)
+    
+    positions = [ods_numbers.index(o) for o in swept]
+    deltas = sweep_deltas(model.n_ods, positions, np.linspace(0.0, max_delta, n_steps))
+    key = scenario_hash(model.version, baseline, deltas)
+    result = get_scenarios(model, model.version, baseline, key, deltas)
+    best = result.best(10, max_effort=budget)
+    
+    fig = cached_figure('scenario_sweep', [baseline], model.version,
+                        lambda: create_scenario_sweep_chart(result, best), scenario=key, budget=round(budget, 2))
+    if fig:
+        show_chart(fig, 'Simulação de Metas')
+    
+    st.markdown(f"**Melhores cenários dentro do orçamento** ({n_scenarios:,} avaliados)")
+    st.dataframe(result.frame(best).round(3), use_container_width=True)
+
+@traced()
+def show_targets(workbook, model, municipalities):
+    """Show the distance to the ideal ranges and the programs that address it"""
+    st.markdown("## 🎯 Metas e Ações")
+    
+    sheet_version = workbook.sheet_version('Dados Tabela Din')[:16]
+    try:
+        ideals, catalog = get_targets(workbook, sheet_version)
+    except ValueError:
+        st.warning("⚠️ A planilha 'Dados Tabela Din' não foi encontrada.")
+        return
+    if ideals.empty:
+        st.warning("⚠️ A planilha 'Dados Tabela Din' não traz os Valores Ideais de IDS.")
+        return
+    
+    gaps = get_gap_index(model, ideals, f"{model.version}:{sheet_version}")
+    
+    if municipalities:
+        fig = cached_figure('gaps', municipalities, gaps.version, lambda: create_gap_heatmap(gaps, municipalities))
+        if fig:
+            show_chart(fig, 'Metas')
+        
+        focus = model.known(municipalities)[0]
+        st.markdown(f"### 📏 Maiores distâncias - {focus}")
+        largest = gaps.largest(focus, k=5).to_frame('distância')
+        largest = largest.join(ideals[['nome', 'faixa', 'meta']])
+        largest['atual'] = [model.values(focus)[model.ods_index[int(o)]] for o in largest.index]
+        st.dataframe(largest[['nome', 'atual', 'faixa', 'distância', 'meta']].round(3), use_container_width=True)
+    else:
+        focus = None
+        st.info("ℹ️ Selecione municípios para ver a distância até as metas.")
+    
+    show_program_catalog(catalog, gaps, focus)
+
+@timed_fragment('Programas')
+@traced()
+def show_program_catalog(catalog, gaps, focus):
+    """Program filters, rerun on their own; lookups come from the catalog's index"""
+    st.markdown("### 🗂️ Programas e Responsáveis")
+    
+    if catalog.table.empty:
+        st.info("ℹ️ Nenhum programa cadastrado na planilha.")
+        return
+    
+    # Start from the ODS furthest from the ideal that have programs
+    default = [int(o) for o in gaps.largest(focus, k=len(gaps.ods)).index if int(o) in catalog.by_ods][:3] \
+        if focus else []
+    col1, col2 = st.columns(2)
+    with col1:
+        ods = st.multiselect("ODS:", catalog.ods, default=default, format_func=lambda o: f"ODS {o}")
+    with col2:
+        departments = st.multiselect("Responsável:", catalog.departments)
+    
+    programs = catalog.filter(ods, departments)
+    st.caption(f"{len(programs)} de {len(catalog.table)} programas")
+    st.dataframe(programs.assign(ODS=programs['ODS'].map(lambda o: ', '.join(map(str, o)))),
+                 use_container_width=True, hide_index=True)
+
+@traced()
+def show_state_ranking(ranks, municipalities, selected_ods):
+    """Show where a municipality stands among every municipality of the state, ODS by ODS"""
+    st.markdown("## 🏅 Ranking Estadual")
+    
+    names = list(ranks.municipalities)
+    default = 'Goiana 1' if 'Goiana 1' in ranks.column_index else (municipalities or names)[0]
+    focus = st.selectbox("🏙️ Município:", names, index=names.index(default))
+    
+    # Position on the mean and on the ODS where it stands best and worst
+    positions = ranks.positions(focus)
+    ranked = positions.dropna(subset=['posição'])
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        rank = ranks.rank_of(focus)
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>📈 Média ODS</h3>
+            <h2>{f"{rank}º de {ranks.count[ranks.row()]}" if rank else "—"}</h2>
+            <p>{f"Percentil {ranks.percentile_of(focus) * 100:.0f}" if rank else "sem dado"}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    if not ranked.empty:
+        best, worst = ranked['percentil'].idxmax(), ranked['percentil'].idxmin()
+        for column, title, ods in ((col2, "🏆 Melhor Posição", best), (col3, "⚠️ Pior Posição", worst)):
+            with column:
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h3>{title}</h3>
+                    <h2>ODS {int(ods)}</h2>
+                    <p>{ranked.loc[ods, 'posição']}º de {ranked.loc[ods, 'de']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+    
+    ranking_fig = cached_figure('state_ranking', [focus], ranks.version,
+                                lambda: create_state_ranking_chart(ranks, focus))
+    if ranking_fig:
+        show_chart(ranking_fig, 'Ranking Estadual')
+    
+    ods_info = get_ods_info()
+    table = positions.assign(nome=[ods_info.get(int(o), {}).get('name', 'N/A') for o in positions.index])
+    st.dataframe(table[['nome', 'valor', 'posição', 'de', 'percentil', 'líder', 'valor_líder']].round(4),
+                 use_container_width=True)
+    
+    show_top_k_section(ranks, focus, selected_ods)
+
+@timed_fragment('Ranking')
+@traced()
+def show_top_k_section(ranks, focus, selected_ods):
+    """Best and worst municipalities of one ODS, sliced from the precomputed order"""
+    st.markdown("### 🔝 Melhores e Piores do Estado")
+    
+    # 0 stands for the mean: a None option would read as "nothing selected"
+    options = [0] + [int(o) for o in ranks.ods]
+    col1, col2 = st.columns(2)
+    with col1:
+        ods = st.selectbox("Classificar por:", options,
+                           index=options.index(int(selected_ods)) if int(selected_ods) in options else 0,
+                           format_func=lambda o: f"ODS {o}" if o else "Média ODS") or None
+    with col2:
+        count = int(ranks.count[ranks.row(ods)])
+        k = st.slider("Municípios:", min_value=1, max_value=max(2, min(50, count)), value=max(1, min(10, count)))
+    
+    def table(scores):
+        return pd.DataFrame({'posição': [ranks.rank_of(name, ods) for name in scores.index],
+                             'valor': scores.round(4)}, index=scores.index)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"**{k} melhores**")
+        st.dataframe(table(ranks.top(k, ods)), use_container_width=True)
+    with col2:
+        st.markdown(f"**{k} piores**")
+        st.dataframe(table(ranks.bottom(k, ods)), use_container_width=True)
+    
+    rank = ranks.rank_of(focus, ods)
+    st.caption(f"📍 {focus}: " + (f"{rank}º de {count}, percentil "
+                                  f"{ranks.percentile_of(focus, ods) * 100:.0f}" if rank else "sem dado"))
+
+@traced()
+def show_executive_report(model, stats, ranks, municipalities):
     """Show executive report"""
     st.markdown("## 📋 Relatório Executivo")
     
@@ -628,24 +879,13 @@ def show_executive_report(data, municipalities):
     if municipalities:
         # Calculate overall statistics
         total_municipalities = len(municipalities)
-        total_ods = len(data['ODS'].dropna())
+        total_ods = model.n_ods
         
-        # Performance summary
-        performance_summary = {}
-        for municipality in municipalities:
-            if municipality in data.columns:
-                values = data[municipality].dropna()
-                performance_summary[municipality] = {
-                    'média': values.mean(),
-                    'mediana': values.median(),
-                    'desvio_padrão': values.std(),
-                    'mínimo': values.min(),
-                    'máximo': values.max()
-                }
+        # Performance summary, read from the precomputed statistics
+        performance_summary = stats.summary(municipalities)
         
         # Create summary table
-        summary_df = pd.DataFrame(performance_summary).T
-        summary_df = summary_df.round(3)
+        summary_df = executive_summary(stats, municipalities)
         
         st.markdown("#### 📈 Estatísticas Gerais")
         st.dataframe(summary_df, use_container_width=True)
@@ -654,10 +894,8 @@ def show_executive_report(data, municipalities):
         st.markdown("### 🔍 Principais Insights")
         
         # Best and worst performing municipalities
-        best_municipality = max(performance_summary.keys(), 
-                              key=lambda x: performance_summary[x]['média'])
-        worst_municipality = min(performance_summary.keys(), 
-                               key=lambda x: performance_summary[x]['média'])
+        best_municipality = performance_summary['média'].idxmax()
+        worst_municipality = performance_summary['média'].idxmin()
         
         col1, col2 = st.columns(2)
         
@@ -666,7 +904,8 @@ def show_executive_report(data, municipalities):
             <div class="success-card">
                 <h4>🏆 Melhor Performance Geral</h4>
                 <h3>{best_municipality}</h3>
-                <p>Média ODS: {performance_summary[best_municipality]['média']:.3f}</p>
+                <p>Média ODS: {performance_summary.loc[best_municipality, 'média']:.3f}</p>
+                <p>Posição no estado: {ranks.rank_of(best_municipality)}º de {ranks.count[ranks.row()]}</p>
             </div>
             """, unsafe_allow_html=True)
         
@@ -675,36 +914,45 @@ def show_executive_report(data, municipalities):
             <div class="warning-card">
                 <h4>⚠️ Maior Potencial de Melhoria</h4>
                 <h3>{worst_municipality}</h3>
-                <p>Média ODS: {performance_summary[worst_municipality]['média']:.3f}</p>
+                <p>Média ODS: {performance_summary.loc[worst_municipality, 'média']:.3f}</p>
+                <p>Posição no estado: {ranks.rank_of(worst_municipality)}º de {ranks.count[ranks.row()]}</p>
             </div>
             """, unsafe_allow_html=True)
         
         # Action items
         st.markdown("### 🎯 Plano de Ação Recomendado")
         
-        action_items = [
-            "🔍 **Análise Detalhada**: Investigar as causas dos baixos índices nos ODS críticos",
-            "📊 **Benchmarking**: Estudar as melhores práticas dos municípios com melhor performance",
-            "🤝 **Parcerias**: Estabelecer colaborações entre municípios para compartilhamento de experiências",
-            "📈 **Monitoramento**: Implementar sistema de acompanhamento contínuo dos indicadores ODS",
-            "💡 **Inovação**: Desenvolver soluções inovadoras para os desafios identificados"
-        ]
-        
-        for item in action_items:
+        for item in ACTION_ITEMS:
             st.markdown(f"- {item}")
         
         # Download report
-        st.markdown("### 📥 Exportar Relatório")
-        
-        if st.button("📊 Gerar Relatório Completo"):
-            # Create comprehensive report data
-            report_data = {
-                'Resumo Executivo': summary_df,
-                'Dados Completos': data[['ODS'] + municipalities]
-            }
-            
-            st.success("✅ Relatório gerado com sucesso!")
-            st.info("💡 Os dados estão disponíveis nas tabelas acima para análise detalhada.")
+        show_report_export(model, stats, municipalities)
+
+@timed_fragment('Exportação')
+@traced()
+def show_report_export(model, stats, municipalities):
+    """Report export section, rerun on its own when its button is clicked
+    
+    The file is only built once requested and is then served from the
+    cache for the same selection, format and data version.
+    """
+    st.markdown("### 📥 Exportar Relatório")
+    
+    fmt = st.selectbox("Formato:", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0])
+    request = (tuple(model.known(municipalities)), fmt, model.version)
+    
+    if st.button("📊 Gerar Relatório Completo"):
+        st.session_state['report_request'] = request
+    
+    # Keep offering the last generated file until the selection changes
+    if st.session_state.get('report_request') == request:
+        with st.spinner("Gerando relatório..."):
+            data = get_report_export(model, stats, model.version, request[0], fmt)
+        label, _, mime = EXPORT_FORMATS[fmt]
+        st.success(f"✅ Relatório gerado com sucesso! ({len(data) / 1024:.0f} KB)")
+        st.download_button(f"⬇️ Baixar {label}", data=data,
+                           file_name=export_file_name(fmt, request[0], model.version),
+                           mime=mime, on_click='ignore')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,305 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from csv_loader import read_csv_export
+
+# Both can be overridden, e.g. to point the dashboard at another workbook
+WORKBOOK_PATH = os.environ.get('ODS_WORKBOOK', 'Projeto Goiana - PE.xlsx')
+SNAPSHOT_DIR = os.environ.get('ODS_SNAPSHOT_DIR', '.snapshots')
+
+# Sheets that may also be shipped as CSV exports next to the workbook
+CSV_SHEETS = ('ODS Municipios', 'Dados Tabela Din')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the SHA-256 content hash of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def csv_export_path(sheet_name, path=WORKBOOK_PATH):
+    """Path of a sheet's CSV export, e.g. 'Projeto Goiana - PE.xlsx - ODS Municipios.csv'"""
+    return f"{path} - {sheet_name}.csv"
+
+
+def fresh_csv_exports(path=WORKBOOK_PATH, sheet_names=CSV_SHEETS):
+    """CSV exports that are newer than the workbook, by sheet name
+
+    Those sheets are read from the CSV instead of the workbook. Without a
+    workbook every existing export counts as fresh.
+
+    Freshness is decided by modification time only. git does not keep
+    mtimes, so in a fresh clone the choice follows checkout order, and the
+    bundled exports must hold the same data as the workbook
+    (test_csv_loader checks this). Caches are not affected either way:
+    versions come from ``source_hash``, which hashes content.
+    """
+    try:
+        workbook_mtime = os.path.getmtime(path)
+    except OSError:
+        workbook_mtime = float('-inf')
+
+    exports = {}
+    for sheet_name in sheet_names:
+        export = csv_export_path(sheet_name, path)
+        try:
+            if os.path.getmtime(export) > workbook_mtime:
+                exports[sheet_name] = export
+        except OSError:
+            continue
+    return exports
+
+
+def source_hash(path=WORKBOOK_PATH, csv_exports=None):
+    """Content hash of the workbook plus the CSV exports read instead of it"""
+    parts = [file_hash(path) if os.path.exists(path) else '']
+    for sheet_name, export in sorted((csv_exports or {}).items()):
+        parts.append(f"{sheet_name}={file_hash(export)}")
+    if len(parts) == 1:
+        return parts[0]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+_XLSX_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+# Workbook parts whose content every sheet depends on
+_XLSX_SHARED_PARTS = ('xl/sharedStrings.xml', 'xl/styles.xml')
+
+
+def sheet_hashes(path=WORKBOOK_PATH):
+    """Content key of every sheet of an .xlsx workbook, without parsing cells
+
+    Each key combines the CRC and size of the sheet's XML part with those of
+    the shared strings and styles, read from the zip directory. Editing one
+    sheet therefore leaves the keys of the other sheets unchanged, unless
+    the edit also touched the shared parts. Returns {} for files that are
+    not .xlsx packages.
+    """
+    try:
+        with zipfile.ZipFile(path) as package:
+            infos = {info.filename: info for info in package.infolist()}
+            workbook = ElementTree.fromstring(package.read('xl/workbook.xml'))
+            relations = ElementTree.fromstring(package.read('xl/_rels/workbook.xml.rels'))
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return {}
+
+    targets = {rel.get('Id'): rel.get('Target', '') for rel in relations}
+    shared = '|'.join(f"{infos[part].CRC}:{infos[part].file_size}" for part in _XLSX_SHARED_PARTS if part in infos)
+
+    hashes = {}
+    for sheet in workbook.iter(f'{_XLSX_MAIN}sheet'):
+        target = targets.get(sheet.get(_XLSX_REL_ID), '')
+        member = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+        info = infos.get(member)
+        if info is None:
+            continue
+        key = f"{sheet.get('name')}|{info.CRC}:{info.file_size}|{shared}"
+        hashes[sheet.get('name')] = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return hashes
+
+
+def _sheet_slug(sheet_name):
+    """Turn a sheet name into a file-system friendly slug"""
+    slug = ''.join(c if c.isalnum() else '_' for c in sheet_name.strip())
+    return slug.lower() or 'sheet'
+
+
+def snapshot_path(workbook_hash, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+    """Path of the Parquet snapshot for one sheet of one workbook version"""
+    return os.path.join(snapshot_dir, f"{_sheet_slug(sheet_name)}-{workbook_hash[:16]}.parquet")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def _to_table(df):
+    """Encode a sheet DataFrame as an Arrow table
+
+    Excel sheets mix numbers and text in the same column, which Arrow cannot
+    store in a single typed column, so every cell goes into one long float64
+    column and one long string column (column-major). Column labels and
+    dtypes are kept in the schema metadata. A single pair of columns keeps
+    very wide sheets (thousands of municipalities) as cheap as narrow ones.
+    """
+    n_rows, n_columns = df.shape
+    cells = df.to_numpy(dtype=object).ravel(order='F')
+    is_null = pd.isna(cells)
+    is_number = np.frompyfunc(_is_number, 1, 1)(cells).astype(bool) & ~is_null
+    is_text = ~is_null & ~is_number
+
+    numbers = np.full(cells.shape, np.nan)
+    numbers[is_number] = cells[is_number].astype(np.float64)
+    text = np.full(cells.shape, None, dtype=object)
+    text[is_text] = np.frompyfunc(str, 1, 1)(cells[is_text]) if is_text.any() else []
+
+    layout = {
+        'rows': n_rows,
+        'labels': [['num', c] if _is_number(c) else ['str', str(c)] for c in df.columns],
+        'dtypes': [str(dtype) for dtype in df.dtypes],
+    }
+    table = pa.Table.from_arrays([pa.array(numbers, type=pa.float64()), pa.array(text, type=pa.string())],
+                                 names=['num', 'str'])
+    return table.replace_schema_metadata({b'sheet_layout': json.dumps(layout).encode('utf-8')})
+
+
+def _from_table(table):
+    """Decode an Arrow table written by _to_table back into a DataFrame"""
+    layout = json.loads(table.schema.metadata[b'sheet_layout'])
+    labels = [label for _, label in layout['labels']]
+    n_rows = layout['rows']
+
+    cells = table.column('num').to_numpy().astype(object)
+    text = table.column('str').to_numpy(zero_copy_only=False)
+    has_text = pd.notna(text)
+    cells[has_text] = text[has_text]
+
+    block = cells.reshape(len(labels), n_rows).T if labels else np.empty((n_rows, 0), dtype=object)
+    df = pd.DataFrame(block, columns=pd.Index(labels, dtype=object))
+    for position, dtype in enumerate(layout['dtypes']):
+        if dtype != 'object':
+            df.isetitem(position, df.iloc[:, position].astype(dtype))
+    return df
+
+
+def write_snapshot(df, path):
+    """Atomically write a sheet snapshot"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(_to_table(df), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale_snapshots(sheet_name, keep, snapshot_dir=SNAPSHOT_DIR):
+    """Delete snapshots of a sheet that belong to older workbook versions"""
+    if not os.path.isdir(snapshot_dir):
+        return
+    prefix = f"{_sheet_slug(sheet_name)}-"
+    for name in os.listdir(snapshot_dir):
+        path = os.path.join(snapshot_dir, name)
+        if name.startswith(prefix) and name.endswith('.parquet') and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_sheets(sheet_names, path=WORKBOOK_PATH, workbook_hash=None, snapshot_dir=SNAPSHOT_DIR, sheet_keys=None):
+    """Read several workbook sheets, going through the Parquet snapshots when possible
+
+    Sheets without a snapshot are parsed in a single read-only pass over the
+    workbook instead of reopening it once per sheet. Snapshots are keyed by
+    ``sheet_keys`` (see sheet_hashes) when given, so a sheet that did not
+    change is not parsed again after another sheet of the workbook changed.
+    """
+    workbook_hash = workbook_hash or file_hash(path)
+    sheet_keys = sheet_keys or {}
+    sheets, missing = {}, []
+
+    for sheet_name in sheet_names:
+        snap = snapshot_path(sheet_keys.get(sheet_name, workbook_hash), sheet_name, snapshot_dir)
+        if os.path.exists(snap):
+            try:
+                sheets[sheet_name] = _from_table(pq.read_table(snap))
+                continue
+            except Exception:
+                # Corrupt or incompatible snapshot, rebuild it below
+                pass
+        missing.append(sheet_name)
+
+    if missing:
+        with pd.ExcelFile(path, engine='openpyxl') as workbook:
+            for sheet_name in missing:
+                df = workbook.parse(sheet_name)
+                sheets[sheet_name] = df
+                snap = snapshot_path(sheet_keys.get(sheet_name, workbook_hash), sheet_name, snapshot_dir)
+                try:
+                    write_snapshot(df, snap)
+                    _remove_stale_snapshots(sheet_name, snap, snapshot_dir)
+                except OSError:
+                    # Read-only deployments still work, just without the snapshot
+                    pass
+
+    return sheets
+
+
+def read_sheet(sheet_name, path=WORKBOOK_PATH, workbook_hash=None, snapshot_dir=SNAPSHOT_DIR):
+    """Read a workbook sheet, going through the Parquet snapshot when possible"""
+    return read_sheets([sheet_name], path, workbook_hash, snapshot_dir)[sheet_name]
+
+
+class LazyWorkbook:
+    """On-demand access to the sheets of one workbook version
+
+    Nothing is read up front: each sheet is materialized the first time it is
+    requested and kept for later calls. Sheets listed in ``csv_exports`` are
+    read from their CSV export instead of the workbook.
+    """
+
+    def __init__(self, path=WORKBOOK_PATH, workbook_hash=None, snapshot_dir=SNAPSHOT_DIR, csv_exports=None,
+                 version=None):
+        self.path = path
+        self.csv_exports = dict(csv_exports or {})
+        if workbook_hash is None and os.path.exists(path):
+            workbook_hash = file_hash(path)
+        self.workbook_hash = workbook_hash
+        self.version = version or (source_hash(path, self.csv_exports) if self.csv_exports else workbook_hash)
+        self.snapshot_dir = snapshot_dir
+        self.sheet_keys = sheet_hashes(path) if workbook_hash else {}
+        self._csv_hashes = {name: file_hash(export) for name, export in self.csv_exports.items()}
+        self._sheets = {}
+        self._lock = threading.Lock()
+
+    def sheet_version(self, sheet_name):
+        """Content hash of a single sheet, from its CSV export or its part of the workbook
+
+        Falls back to the workbook hash when the sheet cannot be told apart.
+        """
+        if sheet_name in self._csv_hashes:
+            return self._csv_hashes[sheet_name]
+        return self.sheet_keys.get(sheet_name) or self.workbook_hash or self.version
+
+    def adopt(self, previous):
+        """Take over the sheets of an older version whose content did not change
+
+        Returns the names of the sheets taken over.
+        """
+        adopted = [name for name in previous.loaded_sheets
+                   if previous.sheet_version(name) == self.sheet_version(name)]
+        with self._lock:
+            for name in adopted:
+                self._sheets.setdefault(name, previous._sheets[name])
+        return adopted
+
+    def sheets(self, *sheet_names):
+        """Return the requested sheets, reading all missing ones in one pass"""
+        with self._lock:
+            missing = [name for name in sheet_names if name not in self._sheets]
+            for name in [name for name in missing if name in self.csv_exports]:
+                self._sheets[name] = read_csv_export(self.csv_exports[name])
+            missing = [name for name in missing if name not in self._sheets]
+            if missing:
+                self._sheets.update(read_sheets(missing, self.path, self.workbook_hash, self.snapshot_dir,
+                                                self.sheet_keys))
+            return {name: self._sheets[name] for name in sheet_names}
+
+    def sheet(self, sheet_name):
+        """Return a single sheet"""
+        return self.sheets(sheet_name)[sheet_name]
+
+    @property
+    def loaded_sheets(self):
+        """Names of the sheets materialized so far"""
+        return list(self._sheets)
@@ -0,0 +1,151 @@
+"""Data versioning for a running dashboard.
+
+DataVersionService watches the workbook and its CSV exports with watchdog.
+When one of them changes it opens a new LazyWorkbook, takes over the sheets
+whose content hash did not change, and bumps an integer version token.
+Downstream caches are keyed by the content hash of the sheets they read
+(LazyWorkbook.sheet_version), so results built from untouched sheets stay
+cached across data updates.
+
+Without watchdog (or when the observer cannot start) the files are polled
+with a stat() call every time the workbook is requested.
+"""
+import os
+import threading
+import time
+
+from data_loader import CSV_SHEETS, SNAPSHOT_DIR, WORKBOOK_PATH, LazyWorkbook, csv_export_path, fresh_csv_exports
+
+# Quiet period before a change is ingested; Excel and copy tools write in bursts
+DEBOUNCE_SECONDS = 1.0
+
+
+def _stat_signature(paths):
+    """(path, mtime, size) of every existing file, cheap to compare between calls"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+class DataVersionService:
+    """Current LazyWorkbook of a data source, refreshed when its files change"""
+
+    def __init__(self, path=WORKBOOK_PATH, snapshot_dir=SNAPSHOT_DIR, sheet_names=CSV_SHEETS,
+                 debounce=DEBOUNCE_SECONDS):
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self.sheet_names = tuple(sheet_names)
+        self.debounce = debounce
+        self.token = 0
+        self.updated_at = None
+        self.changed_sheets = []
+        self._workbook = None
+        self._signature = None
+        self._observer = None
+        self._timer = None
+        self._lock = threading.RLock()
+
+    @property
+    def watched_paths(self):
+        """The workbook and the CSV exports that may replace its sheets"""
+        return [self.path] + [csv_export_path(name, self.path) for name in self.sheet_names]
+
+    @property
+    def workbook(self):
+        """LazyWorkbook of the current version"""
+        if self._workbook is None or self._observer is None:
+            self.refresh()
+        return self._workbook
+
+    @property
+    def watching(self):
+        return self._observer is not None
+
+    def refresh(self):
+        """Ingest the files if they changed since the last call; True when the version moved
+
+        Sheets of the previous version whose content hash is unchanged are
+        carried over instead of being read again.
+        """
+        with self._lock:
+            signature = _stat_signature(self.watched_paths)
+            if self._workbook is not None and signature == self._signature:
+                return False
+
+            csv_exports = fresh_csv_exports(self.path, self.sheet_names)
+            workbook = LazyWorkbook(self.path, snapshot_dir=self.snapshot_dir, csv_exports=csv_exports)
+            self._signature = signature
+            previous = self._workbook
+            if previous is not None and workbook.version == previous.version:
+                # Touched or rewritten with the same content
+                return False
+
+            if previous is not None:
+                adopted = workbook.adopt(previous)
+                self.changed_sheets = [name for name in previous.loaded_sheets if name not in adopted]
+            self._workbook = workbook
+            self.token += 1
+            self.updated_at = time.time()
+            return True
+
+    def _schedule_refresh(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._refresh_quietly)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # A half-written file; the next event or poll tries again
+            self._signature = None
+
+    def start(self):
+        """Watch the data directory; returns False when watchdog is unavailable"""
+        if self._observer is not None:
+            return True
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        service = self
+        watched = {os.path.abspath(path) for path in self.watched_paths}
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = {os.path.abspath(os.fsdecode(event.src_path))}
+                if getattr(event, 'dest_path', None):
+                    paths.add(os.path.abspath(os.fsdecode(event.dest_path)))
+                if paths & watched:
+                    service._schedule_refresh()
+
+        observer = Observer()
+        try:
+            observer.schedule(_Handler(), os.path.dirname(os.path.abspath(self.path)), recursive=False)
+            observer.daemon = True
+            observer.start()
+        except OSError:
+            return False
+        self._observer = observer
+        return True
+
+    def stop(self):
+        """Stop watching; the workbook is then polled on every request"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            observer, self._observer = self._observer, None
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout=5)
@@ -0,0 +1,111 @@
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 512
+
+
+def figure_key(chart, municipalities, options, version):
+    """Cache key of a figure: chart type, selection, options and data version"""
+    return (
+        chart,
+        tuple(municipalities),
+        tuple(sorted((name, repr(value)) for name, value in (options or {}).items())),
+        version,
+    )
+
+
+class FigureCache:
+    """Bounded LRU of serialized Plotly figures
+
+    Figures are stored as their JSON payload, so the byte size of each entry
+    is known exactly and eviction keeps the total under ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached figure for a key, or None when it is not cached"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            payload = self._entries[key]
+        return self._load(payload)
+
+    def get_or_build(self, key, builder):
+        """Return the cached figure for a key, building and storing it on a miss"""
+        with self._lock:
+            cached = key in self._entries
+            if cached:
+                self._entries.move_to_end(key)
+                payload = self._entries[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if cached:
+            return self._load(payload)
+
+        fig = builder()
+        self.put(key, fig)
+        return fig
+
+    def put(self, key, fig):
+        """Store a figure (or a None result) under a key"""
+        payload = fig.to_json().encode('utf-8') if fig is not None else None
+        size = len(payload) if payload is not None else 0
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._size(self._entries.pop(key))
+            self._entries[key] = payload
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached figure"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    @staticmethod
+    def _size(payload):
+        return len(payload) if payload is not None else 0
+
+    @staticmethod
+    def _load(payload):
+        # The payload came from a validated figure, so skip re-validation
+        if payload is None:
+            return None
+        return go.Figure(json.loads(payload), _validate=False)
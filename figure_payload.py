@@ -0,0 +1,89 @@
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Decimal places kept by compact figures; scores are shown with three
+DISPLAY_DECIMALS = 4
+# Point count above which a trace is moved to its WebGL variant
+WEBGL_THRESHOLD = 1000
+# Trace types with a WebGL variant that accepts the same attributes
+WEBGL_TYPES = {'scatter': 'scattergl', 'scatterpolar': 'scatterpolargl'}
+
+# Small layout template shared by every compact figure. The default Plotly
+# template adds ~6.6 KB to each figure and Streamlit's theme overrides most
+# of it in the browser anyway.
+COMPACT_TEMPLATE = go.layout.Template(layout=dict(
+    colorway=['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A',
+              '#19D3F3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'],
+    hovermode='closest',
+)).to_plotly_json()
+
+
+def payload_size(fig):
+    """Bytes of the JSON spec Streamlit sends to the browser for a figure"""
+    if fig is None:
+        return 0
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+def _decode(value):
+    """Typed-array dict ({'dtype', 'bdata', 'shape'}) of a Plotly spec back to a NumPy array"""
+    array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+    if 'shape' in value:
+        array = array.reshape([int(n) for n in str(value['shape']).split(',')])
+    return array
+
+
+def _is_typed_array(value):
+    return isinstance(value, dict) and 'bdata' in value and 'dtype' in value
+
+
+def _round_values(value, decimals):
+    """Round the float arrays nested in a trace, leaving everything else alone"""
+    if _is_typed_array(value):
+        value = _decode(value)
+    if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+        return np.round(value, decimals).astype(np.float32)
+    if isinstance(value, (list, tuple)) and value and all(isinstance(v, float) for v in value):
+        return [round(v, decimals) for v in value]
+    if isinstance(value, float):
+        return round(value, decimals)
+    if isinstance(value, dict):
+        return {key: _round_values(item, decimals) for key, item in value.items()}
+    return value
+
+
+def _point_count(trace):
+    for key in ('x', 'y', 'r'):
+        values = trace.get(key)
+        if _is_typed_array(values):
+            values = _decode(values)
+        if values is not None and not isinstance(values, (str, dict)):
+            return len(values)
+    return 0
+
+
+def compact_figure(fig, decimals=DISPLAY_DECIMALS, webgl_threshold=WEBGL_THRESHOLD):
+    """Lighter copy of a figure for slow links and mobile devices
+
+    Trace values are rounded to display precision (float arrays become
+    float32), point-heavy scatter traces switch to WebGL and the default
+    template is replaced by the shared COMPACT_TEMPLATE.
+    """
+    if fig is None:
+        return None
+
+    spec = fig.to_plotly_json()
+    traces = []
+    for trace in spec['data']:
+        trace = _round_values(trace, decimals)
+        # Filled outlines (e.g. violins) keep the SVG renderer for their hover
+        if trace.get('type') in WEBGL_TYPES and not trace.get('fill') and _point_count(trace) > webgl_threshold:
+            trace['type'] = WEBGL_TYPES[trace['type']]
+        traces.append(trace)
+
+    layout = dict(spec['layout'])
+    layout['template'] = COMPACT_TEMPLATE
+    return go.Figure({'data': traces, 'layout': layout}, _validate=False)
@@ -0,0 +1,188 @@
+"""Opt-in timing spans for the dashboard hot path.
+
+Set ODS_PROFILE=1 to enable. Every span is aggregated in memory (for the
+sidebar "Desempenho" panel) and appended to a JSON-lines log, by default
+profile.jsonl (override with ODS_PROFILE_LOG). When profiling is off the
+decorators return the original functions and span() hands back a shared
+no-op context manager, so nothing is measured or written.
+
+Summarize a log, e.g. collected from several servers:
+    python instrumentation.py profile.jsonl [more.jsonl ...]
+"""
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get('ODS_PROFILE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+LOG_PATH = os.environ.get('ODS_PROFILE_LOG', 'profile.jsonl')
+
+# Suffix of the spans recorded inside a cached function, i.e. on cache misses
+MISS_SUFFIX = '[miss]'
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def _session_id():
+    """Streamlit session of the running script, if any"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+class SpanRecorder:
+    """Thread-safe span aggregates plus an append-only JSON-lines log"""
+
+    def __init__(self, log_path=LOG_PATH):
+        self.log_path = log_path
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._log = None
+
+    def record(self, name, elapsed_ms, **fields):
+        """Add one finished span"""
+        with self._lock:
+            stage = self._stages.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+            stage['count'] += 1
+            stage['total_ms'] += elapsed_ms
+            stage['max_ms'] = max(stage['max_ms'], elapsed_ms)
+            stage['last_ms'] = elapsed_ms
+            if 'bytes' in fields:
+                stage['last_bytes'] = fields['bytes']
+                stage['total_bytes'] = stage.get('total_bytes', 0) + fields['bytes']
+            self._write({'ts': time.time(), 'pid': os.getpid(), 'session': _session_id(),
+                         'name': name, 'ms': round(elapsed_ms, 3), **fields})
+
+    def _write(self, entry):
+        if not self.log_path:
+            return
+        try:
+            if self._log is None:
+                os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                self._log = open(self.log_path, 'a', encoding='utf-8', buffering=1)
+            self._log.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        except OSError:
+            # A read-only deployment keeps the in-memory aggregates only
+            self.log_path = None
+
+    def stages(self):
+        """Copy of the per-span aggregates"""
+        with self._lock:
+            return {name: dict(stage) for name, stage in self._stages.items()}
+
+    def cache_stats(self):
+        """Calls, misses and hit rate of every function traced with traced_cache"""
+        stages = self.stages()
+        result = {}
+        for name, stage in stages.items():
+            if name + MISS_SUFFIX not in stages:
+                continue
+            misses = stages[name + MISS_SUFFIX]['count']
+            calls = stage['count']
+            result[name] = {'calls': calls, 'misses': misses,
+                            'hit_rate': max(calls - misses, 0) / calls if calls else 0.0}
+        return result
+
+    def reset(self):
+        """Drop the in-memory aggregates (the log is kept)"""
+        with self._lock:
+            self._stages.clear()
+
+
+recorder = SpanRecorder()
+
+
+@contextlib.contextmanager
+def _span(name, fields):
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        recorder.record(name, (time.perf_counter() - start) * 1000, **fields)
+
+
+def span(name, **fields):
+    """Context manager timing a block; yields a dict for extra fields (e.g. bytes)"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _span(name, fields)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function (identity when profiling is off)"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_cache(cache_decorator, name=None):
+    """Apply a caching decorator and count its calls and misses
+
+    The outer span times every call; the inner one only runs when the
+    cached body does, which gives the hit rate of the cache.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return cache_decorator(func)
+        span_name = name or func.__name__
+        cached = cache_decorator(traced(span_name + MISS_SUFFIX)(func))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _span(span_name, {}):
+                return cached(*args, **kwargs)
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize_log(paths):
+    """Per-span count, p50, p95 and max over one or more JSON-lines logs"""
+    samples = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                samples.setdefault(entry['name'], []).append(entry['ms'])
+
+    summary = {}
+    for name, values in samples.items():
+        values.sort()
+        summary[name] = {'count': len(values), 'p50_ms': _percentile(values, 0.5),
+                         'p95_ms': _percentile(values, 0.95), 'max_ms': values[-1]}
+    return summary
+
+
+def main(argv=None):
+    paths = (argv if argv is not None else sys.argv[1:]) or [LOG_PATH]
+    summary = summarize_log(paths)
+    print(f"{'span':<48} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, stage in sorted(summary.items(), key=lambda item: -item[1]['p95_ms']):
+        print(f"{name:<48} {stage['count']:>7} {stage['p50_ms']:>10.2f} {stage['p95_ms']:>10.2f} "
+              f"{stage['max_ms']:>10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Load test of the dashboard with many concurrent simulated sessions.
+
+Usage:
+    python load_test.py                           # 1, 5, 10 and 25 sessions
+    python load_test.py --sessions 1,10,50        # concurrency levels
+    python load_test.py --scale 5570x17           # synthetic workbook instead of the real one
+
+Every session is a Streamlit AppTest driven from a worker thread: a first
+run, then reruns that cycle through the analysis views. Each concurrency
+level runs in its own subprocess so memory starts from the same point; the
+report lists the p50/p95 rerun latency and the resident memory added per
+session, and goes to a JSON file as well.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_SESSIONS = '1,5,10,25'
+DEFAULT_RERUNS = 6
+DEFAULT_OUTPUT = 'load_test_results.json'
+DEFAULT_WORKDIR = '.bench'
+# Interval of the resident memory sampler
+MEMORY_SAMPLE_SECONDS = 0.05
+
+
+def resident_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Peak instead of current where /proc is unavailable (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemorySampler:
+    """Peak resident memory of the process while the sessions run"""
+
+    def __init__(self, interval=MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak = resident_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, resident_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_bytes())
+
+
+def pin_app_test_globals():
+    """Pin the process-wide state AppTest swaps around every run
+
+    Each AppTest run installs a fresh mock Runtime singleton and patches the
+    config getter, then restores both when it ends, so a session finishing
+    its run would pull them from under the sessions still running. Every
+    session gets the same runtime and an always-patched config instead, and
+    one script cache so the script is compiled once, as on a real server.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    config.get_option = build_mock_config_get_option({'global.appTest': True})
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def new_session():
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py'),
+                             default_timeout=600)
+
+
+def run_session(app, views, reruns, offset):
+    """First run and `reruns` view switches of one session; returns (first_ms, rerun latencies)"""
+    start = time.perf_counter()
+    app.run()
+    first = (time.perf_counter() - start) * 1000
+    _raise_app_exception(app)
+
+    latencies = []
+    for i in range(reruns):
+        # Sessions start on different views so they do not move in lockstep
+        app.sidebar.radio[0].set_value(views[(offset + i) % len(views)])
+        start = time.perf_counter()
+        app.run()
+        latencies.append((time.perf_counter() - start) * 1000)
+        _raise_app_exception(app)
+    return first, latencies
+
+
+def _raise_app_exception(app):
+    if app.exception:
+        raise RuntimeError('; '.join(str(e.value) for e in app.exception))
+
+
+def percentiles(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    if not len(samples):
+        return {'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max()),
+    }
+
+
+def run_level(sessions, reruns, workdir, scale=None):
+    """Drive `sessions` concurrent sessions (runs inside the child process)"""
+    from bench import VIEWS, parse_scales, write_synthetic_workbook
+
+    if scale:
+        (n_municipalities, n_ods), = parse_scales(scale)
+        workbook = os.path.abspath(os.path.join(workdir, f"synthetic_{n_municipalities}x{n_ods}.xlsx"))
+        if not os.path.exists(workbook):
+            write_synthetic_workbook(workbook, n_municipalities, n_ods)
+        os.environ['ODS_WORKBOOK'] = workbook
+        os.environ['ODS_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+
+    warnings.filterwarnings('ignore')
+    import logging
+    logging.disable(logging.WARNING)
+    pin_app_test_globals()
+
+    # Warm the process-wide caches once so the levels measure sessions, not ingestion
+    run_session(new_session(), VIEWS, len(VIEWS), 0)
+    baseline = resident_bytes()
+
+    apps = [new_session() for _ in range(sessions)]
+    start = time.perf_counter()
+    with MemorySampler() as memory, ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(run_session, app, VIEWS, reruns, i) for i, app in enumerate(apps)]
+        outcomes = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    # Sessions are still referenced here, so their state counts towards the total
+    retained = resident_bytes()
+
+    first = [first for first, _ in outcomes]
+    latencies = [latency for _, session in outcomes for latency in session]
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'elapsed_s': elapsed,
+        'reruns_per_s': len(latencies) / elapsed if elapsed else None,
+        'first_run': percentiles(first),
+        'rerun': percentiles(latencies),
+        'baseline_bytes': baseline,
+        'peak_bytes': memory.peak,
+        'retained_bytes': retained,
+        'bytes_per_session': max(retained - baseline, 0) / sessions,
+        'peak_bytes_per_session': max(memory.peak - baseline, 0) / sessions,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default=DEFAULT_SESSIONS,
+                        help="comma separated concurrency levels (default: %(default)s)")
+    parser.add_argument('--reruns', type=int, default=DEFAULT_RERUNS,
+                        help="view switches per session after its first run (default: %(default)s)")
+    parser.add_argument('--scale', help="MUNICIPALITIESxODS of a synthetic workbook (default: the real data)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="results file (default: %(default)s)")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR,
+                        help="where synthetic workbooks and snapshots live (default: %(default)s)")
+    parser.add_argument('--run-level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    # Every level needs at least one session and one rerun to report latencies
+    if args.reruns < 1:
+        parser.error("--reruns must be at least 1")
+    try:
+        sessions_levels = [int(level) for level in args.sessions.split(',')]
+    except ValueError:
+        parser.error(f"--sessions must be comma separated integers, got {args.sessions!r}")
+    if min(sessions_levels) < 1:
+        parser.error("--sessions levels must be at least 1")
+
+    if args.run_level:
+        print(json.dumps(run_level(args.run_level, args.reruns, args.workdir, args.scale)))
+        return 0
+
+    levels = []
+    print(f"{'sessões':>8} {'p50 ms':>10} {'p95 ms':>10} {'máx ms':>10} {'reruns/s':>9} {'MB/sessão':>10}",
+          file=sys.stderr)
+    for sessions in sessions_levels:
+        command = [sys.executable, os.path.abspath(__file__), '--run-level', str(sessions),
+                   '--reruns', str(args.reruns), '--workdir', args.workdir]
+        if args.scale:
+            command += ['--scale', args.scale]
+        child = subprocess.run(command, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr, file=sys.stderr)
+            return 2
+        level = json.loads(child.stdout.strip().splitlines()[-1])
+        levels.append(level)
+        rerun = level['rerun']
+        print(f"{sessions:>8} {rerun['p50_ms']:>10.1f} {rerun['p95_ms']:>10.1f} {rerun['max_ms']:>10.1f} "
+              f"{level['reruns_per_s']:>9.1f} {level['bytes_per_session'] / 2 ** 20:>10.2f}", file=sys.stderr)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'scale': args.scale or 'workbook',
+        'levels': levels,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
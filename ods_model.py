@@ -0,0 +1,259 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# Columns of the 'ODS Municipios' sheet that hold projections and benchmark
+# averages rather than municipalities
+REFERENCE_PREFIXES = ('atual', 'projeção', 'projecao', 'média', 'media')
+# Reference columns that are a trajectory of the municipality ('Atual',
+# 'projeção 1', ...); the other reference columns are benchmark averages
+PROJECTION_PREFIXES = ('atual', 'projeção', 'projecao')
+
+
+def is_reference_label(label):
+    """Whether a column label is a projection/benchmark column"""
+    return str(label).strip().lower().startswith(REFERENCE_PREFIXES)
+
+
+def is_projection_label(label):
+    """Whether a reference column is the current value or a projection of it"""
+    return str(label).strip().lower().startswith(PROJECTION_PREFIXES)
+
+
+def _read_only(array):
+    """Return a C-contiguous, read-only copy of an array"""
+    array = np.ascontiguousarray(array)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class ODSModel:
+    """Immutable ODS x municipality matrix for one data version"""
+    matrix: np.ndarray
+    ods: np.ndarray
+    municipalities: tuple
+    ods_index: MappingProxyType
+    column_index: MappingProxyType
+    ods_order: np.ndarray
+    version: str
+    frame: pd.DataFrame
+    references: np.ndarray
+    reference_labels: tuple
+
+    @property
+    def n_ods(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_municipalities(self):
+        return self.matrix.shape[1]
+
+    def columns(self, municipalities):
+        """Matrix column positions of the known municipalities in a selection"""
+        return np.array([self.column_index[m] for m in municipalities if m in self.column_index], dtype=np.intp)
+
+    def known(self, municipalities):
+        """Municipalities of a selection that exist in the model, in order"""
+        return [m for m in municipalities if m in self.column_index]
+
+    def values(self, municipality):
+        """ODS vector of one municipality"""
+        return self.matrix[:, self.column_index[municipality]]
+
+    @property
+    def sorted_ods(self):
+        """ODS numbers in ascending order"""
+        return self.ods[self.ods_order]
+
+    def selection(self, municipalities):
+        """Known municipalities of a selection and their ODS-sorted values
+
+        The values come back as one (n_ods, n_selected) matrix, so every
+        trace vector of a chart is produced by a single gather.
+        """
+        names = self.known(municipalities)
+        return names, self.matrix[np.ix_(self.ods_order, self.columns(names))]
+
+    @property
+    def projection_labels(self):
+        """Reference columns holding the current value and its projections"""
+        return tuple(label for label in self.reference_labels if is_projection_label(label))
+
+    @property
+    def benchmark_labels(self):
+        """Reference columns holding benchmark averages"""
+        return tuple(label for label in self.reference_labels if not is_projection_label(label))
+
+    def reference(self, label):
+        """ODS vector of one projection/benchmark column"""
+        return self.references[:, self.reference_labels.index(label)]
+
+
+def _label_row(sheet):
+    """Position of the 'ODS' header row inside the sheet body, if any"""
+    first = sheet.iloc[:, 0].astype(str).str.strip().str.upper()
+    matches = np.flatnonzero(first.to_numpy() == 'ODS')
+    return int(matches[0]) if len(matches) else None
+
+
+def sheet_labels(sheet):
+    """Column labels of the 'ODS Municipios' sheet
+
+    The sheet has a two-row header: the first row holds summary numbers over
+    some columns and the real labels live in the row that starts with 'ODS'.
+    """
+    labels = [str(c).strip() if not isinstance(c, str) else c for c in sheet.columns]
+    row = _label_row(sheet)
+    if row is not None:
+        body_labels = sheet.iloc[row].tolist()
+        labels = [lbl if isinstance(lbl, str) and lbl.strip() else labels[i] for i, lbl in enumerate(body_labels)]
+    return labels
+
+
+def reference_columns(sheet):
+    """Sheet column positions holding projections and benchmark averages, with their labels"""
+    return [(position, label.strip()) for position, label in enumerate(sheet_labels(sheet)[2:], start=2)
+            if is_reference_label(label)]
+
+
+def municipality_columns(sheet):
+    """Sheet column positions holding municipality scores, with their names"""
+    labels = sheet_labels(sheet)
+    columns = []
+    for position, label in enumerate(labels[2:], start=2):
+        if 'Unnamed' in label or is_reference_label(label):
+            continue
+        try:
+            float(label)
+            continue
+        except ValueError:
+            columns.append((position, label))
+    return columns
+
+
+def ods_rows(sheet):
+    """Boolean mask of the sheet rows that hold an ODS number, and those numbers"""
+    ods = pd.to_numeric(sheet.iloc[:, 0], errors='coerce')
+    return ods.notna().to_numpy(), ods
+
+
+def _numeric_block(sheet, mask, positions):
+    """float32 block of the given rows and columns; non-numeric cells become NaN"""
+    # One to_numeric call over the flattened block instead of one per column
+    body = sheet.iloc[mask, positions].to_numpy(dtype=object)
+    numeric = pd.to_numeric(pd.Series(body.ravel()), errors='coerce').to_numpy(dtype=np.float32)
+    return _read_only(numeric.reshape(body.shape))
+
+
+def build_ods_model(sheet, version):
+    """Build the typed ODS model from the raw 'ODS Municipios' sheet"""
+    mask, ods = ods_rows(sheet)
+    columns = municipality_columns(sheet)
+    positions = [position for position, _ in columns]
+    names = tuple(name for _, name in columns)
+    references = reference_columns(sheet)
+
+    matrix = _numeric_block(sheet, mask, positions)
+    ods_numbers = _read_only(ods[mask].to_numpy(dtype=np.int64))
+
+    frame = pd.DataFrame(matrix, index=pd.Index(ods_numbers, name='ODS'), columns=list(names), copy=False)
+
+    return ODSModel(
+        matrix=matrix,
+        ods=ods_numbers,
+        municipalities=names,
+        ods_index=MappingProxyType({int(o): i for i, o in enumerate(ods_numbers)}),
+        column_index=MappingProxyType({name: i for i, name in enumerate(names)}),
+        ods_order=_read_only(np.argsort(ods_numbers, kind='stable')),
+        version=version,
+        frame=frame,
+        references=_numeric_block(sheet, mask, [position for position, _ in references]),
+        reference_labels=tuple(label for _, label in references),
+    )
+
+
+# Score thresholds of the high / medium / low performance buckets
+HIGH_THRESHOLD = 0.7
+LOW_THRESHOLD = 0.4
+
+# Labels of the executive summary columns
+SUMMARY_COLUMNS = {
+    'mean': 'média',
+    'median': 'mediana',
+    'std': 'desvio_padrão',
+    'min': 'mínimo',
+    'max': 'máximo',
+}
+
+
+@dataclass(frozen=True)
+class MunicipalityStats:
+    """Per-municipality aggregates of one ODS model version"""
+    table: pd.DataFrame
+    version: str
+
+    def subset(self, municipalities):
+        """Rows of the known municipalities in a selection, in order"""
+        return self.table.loc[[m for m in municipalities if m in self.table.index]]
+
+    def row(self, municipality):
+        """Statistics of a single municipality"""
+        return self.table.loc[municipality]
+
+    def summary(self, municipalities):
+        """Executive summary table (média, mediana, ...) of a selection"""
+        return self.subset(municipalities)[list(SUMMARY_COLUMNS)].rename(columns=SUMMARY_COLUMNS)
+
+
+def compute_stats(model):
+    """Compute every per-municipality aggregate in one vectorized pass"""
+    matrix = model.matrix.astype(np.float64)
+    ods = model.ods
+    if matrix.shape[0] == 0:
+        # A single all-missing row keeps the reductions below well defined
+        matrix = np.full((1, matrix.shape[1]), np.nan)
+        ods = np.zeros(1, dtype=np.int64)
+
+    valid = ~np.isnan(matrix)
+    count = valid.sum(axis=0)
+    has_values = count > 0
+    columns = np.arange(matrix.shape[1])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, matrix, 0.0).sum(axis=0) / count
+        squared = np.where(valid, (matrix - mean) ** 2, 0.0).sum(axis=0)
+        std = np.where(count > 1, np.sqrt(squared / (count - 1)), np.nan)
+
+        # Missing cells sort last for the median and never win argmin/argmax
+        median = np.full(matrix.shape[1], np.nan)
+        ordered = np.sort(matrix, axis=0)
+        lower = ordered[np.maximum((count - 1) // 2, 0), columns]
+        upper = ordered[np.maximum(count // 2, 0), columns]
+        median[has_values] = ((lower + upper) / 2)[has_values]
+
+        worst = np.where(valid, matrix, np.inf).argmin(axis=0)
+        best = np.where(valid, matrix, -np.inf).argmax(axis=0)
+
+        high = (matrix >= HIGH_THRESHOLD).sum(axis=0)
+        medium = ((matrix >= LOW_THRESHOLD) & (matrix < HIGH_THRESHOLD)).sum(axis=0)
+        low = (matrix < LOW_THRESHOLD).sum(axis=0)
+
+    table = pd.DataFrame({
+        'mean': mean,
+        'median': median,
+        'std': std,
+        'min': np.where(has_values, matrix[worst, columns], np.nan),
+        'max': np.where(has_values, matrix[best, columns], np.nan),
+        'worst_ods': pd.array(np.where(has_values, ods[worst], 0), dtype='Int64'),
+        'best_ods': pd.array(np.where(has_values, ods[best], 0), dtype='Int64'),
+        'high': high,
+        'medium': medium,
+        'low': low,
+        'count': count,
+    }, index=pd.Index(model.municipalities, name='Município'))
+    table.loc[~has_values, ['worst_ods', 'best_ods']] = pd.NA
+
+    return MunicipalityStats(table=table, version=model.version)
@@ -0,0 +1,148 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# Rank of a municipality without a score on an ODS
+UNRANKED = 0
+
+
+def _read_only(array):
+    """Return a C-contiguous, read-only copy of an array"""
+    array = np.ascontiguousarray(array)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class RankIndex:
+    """State-wide position of every municipality on every ODS and on the mean
+
+    Row ``i < len(ods)`` ranks the municipalities by the i-th ODS (ascending
+    ODS order) and the last row by their mean score. ``order`` lists the
+    matrix columns best first with missing scores last, so top-k and bottom-k
+    are slices; ``rank`` and ``percentile`` are indexed by column, so a
+    lookup is two dict hits and an array read. Tied scores share the best
+    rank of their group (1, 2, 2, 4); ``percentile`` is the share of the
+    other ranked municipalities scoring strictly lower.
+    """
+    ods: np.ndarray
+    municipalities: tuple
+    column_index: MappingProxyType
+    row_index: MappingProxyType
+    values: np.ndarray
+    order: np.ndarray
+    rank: np.ndarray
+    percentile: np.ndarray
+    count: np.ndarray
+    version: str
+
+    def row(self, ods=None):
+        """Row of one ODS, or of the mean when ods is None"""
+        return self.row_index[None if ods is None else int(ods)]
+
+    def rank_of(self, municipality, ods=None):
+        """Position of a municipality in the state (1 is best), or None without a score"""
+        rank = int(self.rank[self.row(ods), self.column_index[municipality]])
+        return None if rank == UNRANKED else rank
+
+    def percentile_of(self, municipality, ods=None):
+        row = self.row(ods)
+        column = self.column_index[municipality]
+        return None if self.rank[row, column] == UNRANKED else float(self.percentile[row, column])
+
+    def _series(self, row, columns):
+        return pd.Series(self.values[row, columns], name='valor',
+                         index=pd.Index([self.municipalities[c] for c in columns], name='Município'))
+
+    def top(self, k=10, ods=None):
+        """The k best scores of one ODS (or of the mean), best first"""
+        row = self.row(ods)
+        return self._series(row, self.order[row, :min(k, self.count[row])])
+
+    def bottom(self, k=10, ods=None):
+        """The k worst scores of one ODS (or of the mean), worst first"""
+        row = self.row(ods)
+        count = self.count[row]
+        return self._series(row, self.order[row, max(count - k, 0):count][::-1])
+
+    def among(self, municipalities, ods=None, k=None):
+        """Known municipalities of a selection ordered by their state rank, unranked last"""
+        row = self.row(ods)
+        columns = np.array([self.column_index[m] for m in municipalities if m in self.column_index], dtype=np.intp)
+        ranks = self.rank[row, columns].astype(np.int64)
+        ranks[ranks == UNRANKED] = len(self.municipalities) + 1
+        # Ties keep the selection order, with or without k
+        key = ranks * len(columns) + np.arange(len(columns))
+        if k is not None and k < len(columns):
+            # Only the k best are sorted
+            keep = np.argpartition(key, k - 1)[:k]
+            columns, key = columns[keep], key[keep]
+        return columns[np.argsort(key)]
+
+    def positions(self, municipality):
+        """Score, state rank and percentile of one municipality on every ODS, with each ODS leader"""
+        column = self.column_index[municipality]
+        rows = np.arange(len(self.ods))
+        ranked = self.rank[rows, column] != UNRANKED
+        ranks = pd.array(self.rank[rows, column], dtype='Int64')
+        ranks[~ranked] = pd.NA
+        leaders = self.order[rows, 0]
+        has_leader = self.count[rows] > 0
+        return pd.DataFrame({
+            'valor': self.values[rows, column],
+            'posição': ranks,
+            'de': self.count[rows],
+            'percentil': np.where(ranked, self.percentile[rows, column], np.nan),
+            'líder': [self.municipalities[c] if found else None for c, found in zip(leaders, has_leader)],
+            'valor_líder': np.where(has_leader, self.values[rows, leaders], np.nan),
+        }, index=pd.Index(self.ods, name='ODS'))
+
+
+def build_rank_index(model, stats):
+    """Rank every municipality on every ODS and on its mean with one argsort per matrix"""
+    values = np.vstack([model.matrix[model.ods_order].astype(np.float64),
+                        stats.table['mean'].to_numpy(dtype=np.float64)[None, :]])
+    n_rows, n_columns = values.shape
+    valid = ~np.isnan(values)
+    # Descending scores with missing ones last; the stable sort keeps ties in column order
+    key = np.where(valid, -values, np.inf)
+    order = np.argsort(key, axis=1, kind='stable')
+    ordered = np.take_along_axis(key, order, axis=1)
+
+    # Every tie group runs from its first to its last sorted position
+    positions = np.broadcast_to(np.arange(n_columns), (n_rows, n_columns))
+    starts = np.ones((n_rows, n_columns), dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    ends = np.ones((n_rows, n_columns), dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, n_columns)[:, ::-1], axis=1)[:, ::-1]
+
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lower = (count[:, None] - last - 1) / np.maximum(count[:, None] - 1, 1)
+    # A municipality alone on its row is above everyone
+    lower = np.where(count[:, None] == 1, 1.0, lower)
+
+    rank = np.empty((n_rows, n_columns), dtype=np.int32)
+    percentile = np.empty((n_rows, n_columns), dtype=np.float32)
+    np.put_along_axis(rank, order, first + 1, axis=1)
+    np.put_along_axis(percentile, order, lower, axis=1)
+    rank[~valid] = UNRANKED
+    percentile[~valid] = np.nan
+
+    ods = model.sorted_ods
+    return RankIndex(
+        ods=ods,
+        municipalities=model.municipalities,
+        column_index=model.column_index,
+        row_index=MappingProxyType({**{int(o): i for i, o in enumerate(ods)}, None: len(ods)}),
+        values=_read_only(values.astype(np.float32)),
+        order=_read_only(order.astype(np.int32)),
+        rank=_read_only(rank),
+        percentile=_read_only(percentile),
+        count=_read_only(count),
+        version=model.version,
+    )
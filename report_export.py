@@ -0,0 +1,198 @@
+import hashlib
+import html
+import io
+import math
+import re
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Export formats: label shown in the UI, file extension and MIME type
+EXPORT_FORMATS = {
+    'xlsx': ('Excel (.xlsx)', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV (.csv)', 'csv', 'text/csv'),
+    'parquet': ('Parquet (.parquet)', 'parquet', 'application/vnd.apache.parquet'),
+    'html': ('HTML com gráficos (.html)', 'html', 'text/html'),
+}
+
+# Recommendations listed at the end of every executive report
+ACTION_ITEMS = [
+    "🔍 **Análise Detalhada**: Investigar as causas dos baixos índices nos ODS críticos",
+    "📊 **Benchmarking**: Estudar as melhores práticas dos municípios com melhor performance",
+    "🤝 **Parcerias**: Estabelecer colaborações entre municípios para compartilhamento de experiências",
+    "📈 **Monitoramento**: Implementar sistema de acompanhamento contínuo dos indicadores ODS",
+    "💡 **Inovação**: Desenvolver soluções inovadoras para os desafios identificados"
+]
+
+
+def data_fingerprint(model, municipalities):
+    """Short hash of the scores a report shows: the ODS numbers and the selected columns
+
+    Unlike the model version it ignores the rest of the sheet, so editing an
+    unrelated municipality leaves the reports of the others unchanged.
+    """
+    names, values = model.selection(municipalities)
+    digest = hashlib.sha256('|'.join(names).encode('utf-8'))
+    digest.update(model.sorted_ods.tobytes())
+    digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def executive_summary(stats, municipalities):
+    """Summary table of the executive report (média, mediana, ... rounded to 3 places)"""
+    return stats.summary(municipalities).round(3)
+
+
+def key_insights(summary):
+    """Best and worst municipality of a summary table, by average score"""
+    means = summary['média'].dropna()
+    if means.empty:
+        return None, None
+    return means.idxmax(), means.idxmin()
+
+
+def _widen(values):
+    """float32 model values as float64 without the widening noise (0.5241000056...)"""
+    return values.astype(np.float64).round(6)
+
+
+def long_table(model, stats, municipalities):
+    """One row per municipality and ODS, with the municipality summary alongside"""
+    names, values = model.selection(municipalities)
+    ods = model.sorted_ods
+    table = pd.DataFrame({
+        'Município': np.repeat(np.array(names, dtype=object), len(ods)),
+        'ODS': np.tile(ods, len(names)),
+        'valor': _widen(values).T.ravel(),
+    })
+    summary = executive_summary(stats, names)
+    return table.join(summary, on='Município')
+
+
+def _cell(value):
+    """Python value for a spreadsheet cell; missing numbers become empty cells"""
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def write_xlsx(model, stats, municipalities, target):
+    """Stream the executive report into an .xlsx file or buffer
+
+    The workbook is opened in write-only mode and rows are appended one at a
+    time from the model matrix, so memory stays flat for wide selections.
+    """
+    from openpyxl import Workbook
+
+    names, values = model.selection(municipalities)
+    summary = executive_summary(stats, names)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Resumo Executivo')
+    sheet.append([summary.index.name] + list(summary.columns))
+    for name, *row in summary.itertuples(name=None):
+        sheet.append([name] + [_cell(v) for v in row])
+
+    sheet = workbook.create_sheet('Dados Completos')
+    sheet.append(['ODS'] + list(names))
+    for ods, row in zip(model.sorted_ods, _widen(values)):
+        sheet.append([int(ods)] + [_cell(v) for v in row])
+
+    workbook.save(target)
+
+
+def export_xlsx(model, stats, municipalities):
+    buffer = io.BytesIO()
+    write_xlsx(model, stats, municipalities, buffer)
+    return buffer.getvalue()
+
+
+def export_csv(model, stats, municipalities):
+    # Semicolons, decimal commas and a BOM so Excel in pt-BR opens it as is
+    return long_table(model, stats, municipalities).to_csv(
+        index=False, sep=';', decimal=',', float_format='%.6g').encode('utf-8-sig')
+
+
+def export_parquet(model, stats, municipalities):
+    buffer = io.BytesIO()
+    long_table(model, stats, municipalities).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _markdown_bold(text):
+    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html.escape(text))
+
+
+def export_html(model, stats, municipalities, figures=(), title="Relatório Executivo ODS", plotlyjs=True):
+    """HTML report with its figures
+    
+    By default the page is self-contained: plotly.js is embedded once for
+    all figures. Pass plotlyjs='directory' or 'cdn' to reference it instead,
+    as batch runs do to avoid repeating it in every file.
+    """
+    names = model.known(municipalities)
+    summary = executive_summary(stats, names)
+    best, worst = key_insights(summary)
+
+    parts = [
+        '<!DOCTYPE html><html lang="pt-BR"><head><meta charset="utf-8">',
+        f'<title>{html.escape(title)}</title>',
+        '<style>body{font-family:sans-serif;margin:2rem;color:#222}'
+        'table{border-collapse:collapse;margin:1rem 0}td,th{border:1px solid #ccc;padding:.3rem .6rem;'
+        'text-align:right}th:first-child,td:first-child{text-align:left}</style></head><body>',
+        f'<h1>{html.escape(title)}</h1>',
+        f'<p>{len(names)} municípios, {model.n_ods} ODS avaliados (versão dos dados {data_fingerprint(model, names)}).</p>',
+        '<h2>📈 Estatísticas Gerais</h2>',
+        summary.to_html(na_rep='', float_format=lambda v: f"{v:.3f}"),
+    ]
+    if best is not None:
+        parts += [
+            '<h2>🔍 Principais Insights</h2><ul>',
+            f"<li>🏆 Melhor Performance Geral: <strong>{html.escape(best)}</strong> "
+            f"(média ODS {summary.loc[best, 'média']:.3f})</li>",
+            f"<li>⚠️ Maior Potencial de Melhoria: <strong>{html.escape(worst)}</strong> "
+            f"(média ODS {summary.loc[worst, 'média']:.3f})</li></ul>",
+        ]
+
+    include_plotlyjs = plotlyjs
+    for i, fig in enumerate(figures):
+        if fig is None:
+            continue
+        # Fixed div ids instead of random ones, so unchanged data renders to the same bytes
+        parts.append(pio.to_html(fig, full_html=False, include_plotlyjs=include_plotlyjs, div_id=f"figura-{i}"))
+        include_plotlyjs = False
+
+    parts.append('<h2>🎯 Plano de Ação Recomendado</h2><ul>')
+    parts += [f'<li>{_markdown_bold(item)}</li>' for item in ACTION_ITEMS]
+    parts.append('</ul></body></html>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+_EXPORTERS = {
+    'xlsx': export_xlsx,
+    'csv': export_csv,
+    'parquet': export_parquet,
+}
+
+
+def export_report(fmt, model, stats, municipalities, figures=(), **options):
+    """Executive report of a selection in one of EXPORT_FORMATS, as bytes"""
+    if fmt == 'html':
+        return export_html(model, stats, municipalities, figures, **options)
+    if fmt not in _EXPORTERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return _EXPORTERS[fmt](model, stats, municipalities)
+
+
+def file_slug(text):
+    """File-system friendly form of a name, e.g. 'Goiana 1' -> 'goiana_1'"""
+    return re.sub(r'\W+', '_', str(text).strip().lower()).strip('_') or 'sem_nome'
+
+
+def export_file_name(fmt, municipalities, version):
+    """Download file name of a report, e.g. relatorio_ods_goiana_1_3mun_ab12cd34.xlsx"""
+    first = file_slug(municipalities[0]) if municipalities else 'vazio'
+    return f"relatorio_ods_{first}_{len(municipalities)}mun_{version[:8]}.{EXPORT_FORMATS[fmt][1]}"
@@ -0,0 +1,164 @@
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from ods_model import HIGH_THRESHOLD, LOW_THRESHOLD
+
+# Upper bound of a single sweep (scenarios x ODS cells stay in the low millions)
+MAX_SCENARIOS = 200_000
+# Reference column used as the starting point when the sheet has one
+DEFAULT_BASELINE = 'Atual'
+
+
+@dataclass(frozen=True)
+class ScenarioResult:
+    """Batched outcome of many what-if scenarios over one baseline
+
+    Every array has one row per scenario; ``values`` holds the projected
+    ODS scores (in ascending ODS order) and ``gaps``/``above`` compare them
+    with each benchmark column.
+    """
+    labels: tuple
+    ods: np.ndarray
+    deltas: np.ndarray
+    values: np.ndarray
+    mean: np.ndarray
+    minimum: np.ndarray
+    effort: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    benchmark_labels: tuple
+    gaps: np.ndarray
+    above: np.ndarray
+
+    @property
+    def size(self):
+        return len(self.deltas)
+
+    def label(self, position):
+        """Name of a scenario; unnamed ones are described by their non-zero deltas"""
+        if self.labels is not None:
+            return self.labels[position]
+        changed = np.flatnonzero(self.deltas[position])
+        return ' '.join(f"ODS {int(self.ods[i])} {self.deltas[position, i]:+.2f}" for i in changed) or 'Base'
+
+    def frame(self, positions=None):
+        """One row per scenario (or per given position) with its summary metrics"""
+        positions = np.arange(self.size) if positions is None else np.asarray(positions)
+        table = pd.DataFrame({
+            'média': self.mean[positions],
+            'mínimo': self.minimum[positions],
+            'esforço': self.effort[positions],
+            'ODS altos': self.high[positions],
+            'ODS baixos': self.low[positions],
+        }, index=pd.Index([self.label(p) for p in positions], name='Cenário'))
+        for column, label in enumerate(self.benchmark_labels):
+            table[f"Δ {label}"] = self.gaps[positions, column]
+            table[f"≥ {label}"] = self.above[positions, column]
+        return table
+
+    def best(self, k=10, max_effort=None):
+        """Positions of the k scenarios with the highest mean, optionally within an effort budget"""
+        candidates = np.arange(self.size)
+        if max_effort is not None:
+            candidates = candidates[self.effort <= max_effort + 1e-9]
+        mean = np.nan_to_num(self.mean[candidates], nan=-np.inf)
+        # Ties go to the cheaper scenario
+        order = np.lexsort((self.effort[candidates], -mean))
+        return candidates[order[:k]]
+
+
+def baseline_options(model, municipalities=()):
+    """Columns a scenario can start from: projections first, then municipalities"""
+    return list(model.projection_labels) + model.known(municipalities)
+
+
+def baseline_values(model, source):
+    """ODS vector (ascending ODS order) of a projection column or a municipality"""
+    if source in model.reference_labels:
+        values = model.reference(source)
+    else:
+        values = model.values(source)
+    return values[model.ods_order]
+
+
+def projection_deltas(model, baseline):
+    """The projection columns as deltas over a baseline, one row per projection"""
+    labels = list(model.projection_labels)
+    if not labels:
+        return [], np.zeros((0, model.n_ods), dtype=np.float32)
+    projections = np.stack([model.reference(label)[model.ods_order] for label in labels])
+    return labels, np.nan_to_num(projections - baseline, nan=0.0).astype(np.float32)
+
+
+def sweep_deltas(n_ods, positions, steps):
+    """Every combination of the given delta steps over the ODS at ``positions``
+
+    Returns a (len(steps) ** len(positions), n_ods) matrix; ODS outside the
+    sweep keep a zero delta.
+    """
+    steps = np.asarray(steps, dtype=np.float32)
+    positions = list(positions)
+    n_scenarios = len(steps) ** len(positions)
+    if n_scenarios > MAX_SCENARIOS:
+        raise ValueError(f"A sweep of {n_scenarios} scenarios exceeds the limit of {MAX_SCENARIOS}")
+
+    deltas = np.zeros((n_scenarios, n_ods), dtype=np.float32)
+    if positions:
+        grid = np.meshgrid(*([steps] * len(positions)), indexing='ij')
+        deltas[:, positions] = np.stack([axis.ravel() for axis in grid], axis=1)
+    return deltas
+
+
+def scenario_hash(version, baseline, deltas):
+    """Cache key of a scenario batch: data version, baseline and the delta matrix"""
+    digest = hashlib.sha256()
+    digest.update(f"{version}|{baseline}|{deltas.shape}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(deltas, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def evaluate_scenarios(model, baseline, deltas, labels=None):
+    """Apply every delta row to the baseline and score the result in one batch
+
+    Projected scores are clipped to [0, 1]. Missing baseline cells stay
+    missing and are left out of the means, counts and benchmark gaps.
+    Without ``labels`` scenarios are named after their deltas on demand, so
+    large sweeps never build one string per scenario.
+    """
+    baseline = np.asarray(baseline, dtype=np.float32)
+    deltas = np.atleast_2d(np.asarray(deltas, dtype=np.float32))
+    values = np.clip(baseline[None, :] + deltas, 0.0, 1.0)
+
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    filled = np.where(valid, values, 0.0)
+
+    benchmark_labels = model.benchmark_labels
+    benchmarks = np.stack([model.reference(label)[model.ods_order] for label in benchmark_labels], axis=1) \
+        if benchmark_labels else np.zeros((model.n_ods, 0), dtype=np.float32)
+    # (scenario, ODS, benchmark) differences, reduced over the ODS axis
+    compared = valid[:, :, None] & ~np.isnan(benchmarks)[None, :, :]
+    difference = np.where(compared, values[:, :, None] - benchmarks[None, :, :], 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=1) / count
+        gaps = difference.sum(axis=1) / compared.sum(axis=1)
+    minimum = np.where(count > 0, np.where(valid, values, np.inf).min(axis=1), np.nan)
+
+    return ScenarioResult(
+        labels=tuple(labels) if labels is not None else None,
+        ods=model.sorted_ods,
+        deltas=deltas,
+        values=values,
+        mean=mean.astype(np.float64),
+        minimum=minimum.astype(np.float64),
+        effort=np.abs(deltas).sum(axis=1).astype(np.float64),
+        high=(values >= HIGH_THRESHOLD).sum(axis=1),
+        low=(values < LOW_THRESHOLD).sum(axis=1),
+        benchmark_labels=benchmark_labels,
+        gaps=gaps.astype(np.float64),
+        above=(compared & (difference >= 0)).sum(axis=1),
+    )
@@ -0,0 +1,101 @@
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from ods_model import ODSModel, MunicipalityStats, build_ods_model, compute_stats
+from ranking import RankIndex, build_rank_index
+
+# Data versions kept at once: the current one plus the one sessions may
+# still be rendering while a new version is ingested
+DEFAULT_MAX_VERSIONS = 2
+
+
+@dataclass(frozen=True)
+class SharedData:
+    """Read-only data of one version, referenced by every session
+
+    The model and rank arrays are flagged read-only; the stats table is
+    shared by reference as well and must not be modified in place.
+    """
+    version: str
+    model: ODSModel
+    stats: MunicipalityStats
+    ranks: RankIndex
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the model, stats and ranks"""
+        model = self.model
+        ranks = self.ranks
+        arrays = (model.matrix, model.ods, model.ods_order, model.references,
+                  ranks.values, ranks.order, ranks.rank, ranks.percentile)
+        return (sum(array.nbytes for array in arrays)
+                + int(self.stats.table.memory_usage(deep=True).sum())
+                + sys.getsizeof(model.municipalities))
+
+
+def build_shared_data(workbook, version):
+    """Clean the 'ODS Municipios' sheet into the typed model, its statistics and state ranks"""
+    sheet = workbook.sheet('ODS Municipios')
+    sheet = sheet.dropna(how='all').dropna(axis=1, how='all')
+    model = build_ods_model(sheet, version)
+    stats = compute_stats(model)
+    return SharedData(version=version, model=model, stats=stats, ranks=build_rank_index(model, stats))
+
+
+class SharedStore:
+    """Process-wide store of SharedData, built once per data version
+
+    Concurrent sessions asking for a version that is not built yet wait for
+    a single build instead of each cleaning the sheet. Old versions are
+    dropped once more than ``max_versions`` are held.
+    """
+
+    def __init__(self, max_versions=DEFAULT_MAX_VERSIONS):
+        self.max_versions = max_versions
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, workbook, version=None):
+        """Shared data of a workbook, keyed by the content of its 'ODS Municipios' sheet"""
+        version = version or workbook.sheet_version('ODS Municipios')[:16]
+        with self._lock:
+            if version in self._entries:
+                self._entries.move_to_end(version)
+                self.hits += 1
+                return self._entries[version]
+            # The first session builds; the others wait on its lock
+            build_lock = self._building.setdefault(version, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if version in self._entries:
+                    self.hits += 1
+                    return self._entries[version]
+            data = build_shared_data(workbook, version)
+            with self._lock:
+                self.builds += 1
+                self._entries[version] = data
+                self._building.pop(version, None)
+                while len(self._entries) > self.max_versions:
+                    self._entries.popitem(last=False)
+            return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Versions held, hit/build counters and memory of the store"""
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                'versions': [data.version for data in entries],
+                'hits': self.hits,
+                'builds': self.builds,
+                'bytes': sum(data.nbytes for data in entries),
+            }
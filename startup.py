@@ -0,0 +1,152 @@
+"""Cold-start helpers for the dashboard and an import-time report.
+
+lazy_import() hands back a module that is imported on first attribute
+access, so libraries used only by some views (plotly.express,
+plotly.subplots) load after the header and sidebar are sent instead of
+before anything is drawn. With ODS_PROFILE=1 each deferred import is
+recorded as an 'import <module>' span. page_style() reads the stylesheet
+shipped in static/ and minifies it once per process.
+
+Report where a fresh process spends its cold start, per top-level package:
+    python startup.py                  # 3 fresh processes
+    python startup.py --runs 5 --top 20
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STYLESHEET = os.path.join(STATIC_DIR, 'dashboard.css')
+
+# Marker written to stderr between the server and script phases of a report run
+PHASE_MARKER = '--- script phase ---'
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __getattr__(self, attr):
+        from instrumentation import span
+
+        with span(f"import {self.__name__}"):
+            module = importlib.import_module(self.__name__)
+        # Later lookups hit the copied attributes and skip __getattr__
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """Module `name`, imported on first use; already imported modules come back as is"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def minify_css(css):
+    """Drop comments and the whitespace around CSS punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Declarations only: selectors such as 'a :hover' keep their space
+    return re.sub(r'(?<=[{;])([\w-]+):\s+', r'\1:', css).replace(';}', '}').strip()
+
+
+@functools.lru_cache(maxsize=None)
+def page_style(path=STYLESHEET):
+    """<style> block of the dashboard stylesheet, minified on first use"""
+    with open(path, encoding='utf-8') as f:
+        return f"<style>{minify_css(f.read())}</style>"
+
+
+def _report_run():
+    """One cold start: server imports, then the first script run (inside the child process)"""
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    start = time.perf_counter()
+    # What `streamlit run` has loaded before the script
+    importlib.import_module('streamlit.web.server')
+    from streamlit.testing.v1 import AppTest
+    server = time.perf_counter() - start
+
+    print(PHASE_MARKER, file=sys.stderr, flush=True)
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard.py'),
+                            default_timeout=600)
+    start = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError('; '.join(str(e.value) for e in app.exception))
+    print(json.dumps({'server_ms': server * 1000, 'first_run_ms': first_run * 1000}))
+
+
+def parse_import_times(stderr):
+    """Self time (ms) per top-level package of the modules imported during the script phase"""
+    packages = {}
+    in_script = False
+    for line in stderr.splitlines():
+        if line.strip() == PHASE_MARKER:
+            in_script = True
+            continue
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not in_script or not match:
+            continue
+        self_us, module = int(match.group(1)), match.group(4)
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + self_us / 1000
+    return packages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help="fresh processes to time (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=15, help="packages listed in the breakdown (default: %(default)s)")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--run-once', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_once:
+        _report_run()
+        return 0
+
+    runs, breakdowns = [], []
+    for _ in range(args.runs):
+        child = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--run-once'],
+                               capture_output=True, text=True)
+        if child.returncode != 0:
+            print(child.stderr[-4000:], file=sys.stderr)
+            return 2
+        runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        breakdowns.append(parse_import_times(child.stderr))
+
+    packages = sorted({package for breakdown in breakdowns for package in breakdown})
+    imports = {package: statistics.median(b.get(package, 0.0) for b in breakdowns) for package in packages}
+    results = {
+        'server_ms': statistics.median(run['server_ms'] for run in runs),
+        'first_run_ms': statistics.median(run['first_run_ms'] for run in runs),
+        'script_imports_ms': sum(imports.values()),
+        'imports_ms': dict(sorted(imports.items(), key=lambda item: -item[1])),
+    }
+
+    print(f"Imports do servidor:        {results['server_ms']:>8.1f} ms", file=sys.stderr)
+    print(f"Primeira execução:          {results['first_run_ms']:>8.1f} ms", file=sys.stderr)
+    print(f"  dos quais imports:        {results['script_imports_ms']:>8.1f} ms", file=sys.stderr)
+    for package, elapsed in list(results['imports_ms'].items())[:args.top]:
+        share = elapsed / results['first_run_ms'] if results['first_run_ms'] else 0.0
+        print(f"    {package:<24}{elapsed:>8.1f} ms {share:>6.1%}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
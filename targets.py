@@ -0,0 +1,290 @@
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from csv_loader import LABEL_ROW_MARKERS
+
+# Labels of the 'Dados Tabela Din' blocks this module reads
+IDEAL_COLUMN = 'Valor Ideal de IDS (%)'
+TARGET_COLUMN = 'Para chegar IDS Ideal'
+PROGRAM_COLUMN = 'Propostas de Fomento'
+PROGRAM_ODS_COLUMN = 'ODS Relacionada'
+PROGRAM_ACTION_COLUMN = 'Como Aplicar ODS'
+DEPARTMENT_LABEL = 'Área'
+
+# "95% a 100%", "85 - 95 %", "70% até 80%"
+IDEAL_RANGE_PATTERN = r'(\d+(?:[.,]\d+)?)\s*%?\s*(?:a|à|á|-|–|até)\s*(\d+(?:[.,]\d+)?)\s*%'
+# "ODS 8", "ODS 9 e ODS 11", "ODS 13 á ODS 15"
+ODS_LIST_PATTERN = re.compile(r'^\s*ODS\s*\d+(\s*(e|a|à|á|até|,|-|–)\s*(ODS\s*)?\d+)*\s*$', re.IGNORECASE)
+ODS_RANGE_PATTERN = re.compile(r'(\d+)\s*(?:a|à|á|até|-|–)\s*(?:ODS\s*)?(\d+)', re.IGNORECASE)
+# Axis rows of the program block start with "1. ", "2. ", ...
+AXIS_PATTERN = re.compile(r'^\s*\d+\.\s+\S')
+
+# Spellings of the departments responsible for the programs
+DEPARTMENT_ALIASES = (
+    ('jur', 'Assessoria Jurídica'),
+    ('gest', 'Assessoria de Gestão'),
+    ('contáb', 'Assessoria Contábil'),
+    ('contab', 'Assessoria Contábil'),
+    ('polít', 'Política'),
+)
+UNASSIGNED_DEPARTMENT = 'Não informado'
+
+
+def _read_only(array):
+    array = np.ascontiguousarray(array)
+    array.setflags(write=False)
+    return array
+
+
+def sheet_grid(sheet):
+    """Cells of a raw sheet as an object grid, header rows included
+
+    The workbook reader keeps every row in the body, while the CSV reader
+    turns the label row into the header and keeps the rows above it in
+    ``attrs['header_rows']``; both come back as the same grid.
+    """
+    labels = [None if str(label).startswith('Unnamed') else label for label in sheet.columns]
+    rows = [list(row) for row in sheet.attrs.get('header_rows', [])] + [labels]
+    grid = np.array(rows + sheet.to_numpy(dtype=object).tolist(), dtype=object)
+    return np.where(pd.isna(grid), None, grid)
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _find_cell(grid, label, start=0):
+    """(row, column) of the first cell holding a label at or after a row, or None"""
+    target = label.strip().lower()
+    for row in range(start, len(grid)):
+        for column, value in enumerate(grid[row]):
+            if _text(value).lower() == target:
+                return row, column
+    return None
+
+
+def parse_ideal_ranges(texts):
+    """Ideal IDS ranges such as '95% a 100%' as (low, high) fractions, NaN when absent"""
+    bounds = pd.Series(texts, dtype=object).astype(str).str.extract(IDEAL_RANGE_PATTERN)
+    bounds = bounds.apply(lambda column: pd.to_numeric(column.str.replace(',', '.'), errors='coerce'))
+    return bounds[0].to_numpy(dtype=np.float64) / 100, bounds[1].to_numpy(dtype=np.float64) / 100
+
+
+def parse_ods_list(text):
+    """ODS numbers of a label such as 'ODS 9 e ODS 11' or 'ODS 13 á ODS 15'"""
+    text = _text(text)
+    numbers = set()
+    for start, end in ODS_RANGE_PATTERN.findall(text):
+        numbers.update(range(int(start), int(end) + 1))
+    numbers.update(int(n) for n in re.findall(r'\d+', text))
+    return tuple(sorted(numbers))
+
+
+def department_names(text):
+    """Canonical departments of a responsibility cell ('Jurídico e Gestão' -> both assessorias)"""
+    names = []
+    for part in re.split(r'/|,|\s+e\s+', _text(text)):
+        part = part.strip()
+        if not part:
+            continue
+        lowered = part.lower()
+        name = next((canonical for key, canonical in DEPARTMENT_ALIASES if key in lowered), part)
+        if name not in names:
+            names.append(name)
+    return names or [UNASSIGNED_DEPARTMENT]
+
+
+def ideal_table(sheet):
+    """Per-ODS ideal range and target of the 'Dados Tabela Din' sheet
+
+    Rows follow the first label row ('Nº ODS') until the first row without an
+    ODS number. Returns a frame indexed by ODS with the parsed range bounds.
+    """
+    grid = sheet_grid(sheet)
+    header = next((row for row in range(len(grid))
+                   if _text(grid[row][0]).upper() in LABEL_ROW_MARKERS
+                   and any(_text(v) == IDEAL_COLUMN for v in grid[row])), None)
+    if header is None:
+        return pd.DataFrame(columns=['nome', 'objetivo', 'faixa', 'ideal_min', 'ideal_max', 'meta'],
+                            index=pd.Index([], name='ODS'))
+
+    labels = [_text(v) for v in grid[header]]
+    body = []
+    for row in grid[header + 1:]:
+        ods = pd.to_numeric(pd.Series([row[0]]), errors='coerce').iloc[0]
+        if pd.isna(ods):
+            break
+        body.append((int(ods), row))
+
+    def column(label):
+        position = labels.index(label) if label in labels else None
+        return [_text(row[position]) if position is not None else '' for _, row in body]
+
+    ranges = column(IDEAL_COLUMN)
+    low, high = parse_ideal_ranges(ranges)
+    return pd.DataFrame({
+        'nome': column('ODS'),
+        'objetivo': column('Objetivo'),
+        'faixa': ranges,
+        'ideal_min': low,
+        'ideal_max': high,
+        'meta': column(TARGET_COLUMN),
+    }, index=pd.Index([ods for ods, _ in body], name='ODS'))
+
+
+@dataclass(frozen=True)
+class GapIndex:
+    """Distance of every municipality to the ideal floor of every ODS
+
+    ``gap`` is an (n_ods, n_municipalities) matrix in ascending ODS order:
+    how much a score must still rise to reach the lower bound of the ideal
+    range (0 once inside it). ODS without an ideal range hold NaN.
+    """
+    ods: np.ndarray
+    municipalities: tuple
+    column_index: MappingProxyType
+    ideal_min: np.ndarray
+    ideal_max: np.ndarray
+    gap: np.ndarray
+    version: str
+
+    def selection(self, municipalities):
+        """Known municipalities of a selection and their gap columns"""
+        names = [m for m in municipalities if m in self.column_index]
+        return names, self.gap[:, [self.column_index[m] for m in names]]
+
+    def frame(self, municipalities):
+        """Gap table of a selection, ODS by municipality"""
+        names, gap = self.selection(municipalities)
+        return pd.DataFrame(gap, index=pd.Index(self.ods, name='ODS'), columns=names)
+
+    def totals(self, municipalities):
+        """Summed gap of each municipality of a selection"""
+        names, gap = self.selection(municipalities)
+        return pd.Series(np.nansum(gap, axis=0), index=pd.Index(names, name='Município'), name='gap')
+
+    def largest(self, municipality, k=5):
+        """ODS with the largest gaps of one municipality, biggest first"""
+        gap = self.gap[:, self.column_index[municipality]]
+        order = np.argsort(-np.nan_to_num(gap, nan=-np.inf), kind='stable')[:k]
+        return pd.Series(gap[order], index=pd.Index(self.ods[order], name='ODS'), name='gap')
+
+
+def build_gap_index(model, ideals, version):
+    """Gap-to-ideal of the whole model in one broadcast subtraction"""
+    ods = model.sorted_ods
+    ideal_min = ideals['ideal_min'].reindex(ods).to_numpy(dtype=np.float32)
+    ideal_max = ideals['ideal_max'].reindex(ods).to_numpy(dtype=np.float32)
+    values = model.matrix[model.ods_order]
+    with np.errstate(invalid='ignore'):
+        gap = np.maximum(ideal_min[:, None] - values, 0.0)
+    return GapIndex(
+        ods=ods,
+        municipalities=model.municipalities,
+        column_index=model.column_index,
+        ideal_min=_read_only(ideal_min),
+        ideal_max=_read_only(ideal_max),
+        gap=_read_only(gap.astype(np.float32)),
+        version=version,
+    )
+
+
+@dataclass(frozen=True)
+class ProgramCatalog:
+    """Programs of the 'Dados Tabela Din' sheet with lookups by ODS and department
+
+    The lookups map each key to the sorted row positions of ``table``, so a
+    filter is a few array intersections instead of a scan of the sheet.
+    """
+    table: pd.DataFrame
+    by_ods: MappingProxyType
+    by_department: MappingProxyType
+
+    @property
+    def ods(self):
+        return sorted(self.by_ods)
+
+    @property
+    def departments(self):
+        return sorted(self.by_department)
+
+    def positions(self, ods=(), departments=()):
+        """Row positions matching any of the ODS and any of the departments (empty means all)"""
+        positions = np.arange(len(self.table))
+        empty = np.array([], dtype=np.intp)
+        if ods:
+            positions = np.intersect1d(positions, np.unique(np.concatenate(
+                [self.by_ods.get(int(o), empty) for o in ods])))
+        if departments:
+            positions = np.intersect1d(positions, np.unique(np.concatenate(
+                [self.by_department.get(d, empty) for d in departments])))
+        return positions
+
+    def filter(self, ods=(), departments=()):
+        return self.table.iloc[self.positions(ods, departments)]
+
+
+def _lookup(keys_per_row):
+    index = {}
+    for position, keys in enumerate(keys_per_row):
+        for key in keys:
+            index.setdefault(key, []).append(position)
+    return MappingProxyType({key: _read_only(np.array(rows, dtype=np.intp)) for key, rows in index.items()})
+
+
+def build_program_catalog(sheet):
+    """Index the program block ('Propostas de Fomento') of the 'Dados Tabela Din' sheet
+
+    Programs inherit the axis and the related ODS of the section they are
+    listed under; section markers such as 'ODS 9 e ODS 11' in the program
+    column switch the ODS as well. The block ends at the next 'Nº ODS' table.
+    """
+    grid = sheet_grid(sheet)
+    found = _find_cell(grid, PROGRAM_COLUMN)
+    columns = ['programa', 'eixo', 'ODS', 'responsável', 'aplicação']
+    if found is None:
+        return ProgramCatalog(pd.DataFrame(columns=columns), MappingProxyType({}), MappingProxyType({}))
+
+    header, program_column = found
+    labels = [_text(v) for v in grid[header]]
+    ods_column = labels.index(PROGRAM_ODS_COLUMN) if PROGRAM_ODS_COLUMN in labels else None
+    action_column = labels.index(PROGRAM_ACTION_COLUMN) if PROGRAM_ACTION_COLUMN in labels else None
+    department = _find_cell(grid[header:header + 3], DEPARTMENT_LABEL)
+    department_column = department[1] if department else program_column + 1
+
+    rows, axis, ods = [], '', ()
+    for row in grid[header + 1:]:
+        first = _text(row[0]) or _text(row[1])
+        if first.upper() in LABEL_ROW_MARKERS:
+            break
+        axis_cell = next((_text(v) for v in row[:program_column] if AXIS_PATTERN.match(_text(v))), None)
+        if axis_cell:
+            axis = re.sub(r'^\s*\d+\.\s*', '', axis_cell)
+        if ods_column is not None and ODS_LIST_PATTERN.match(_text(row[ods_column])):
+            ods = parse_ods_list(row[ods_column])
+        program = _text(row[program_column])
+        if not program or program.lower() == DEPARTMENT_LABEL.lower():
+            continue
+        if ODS_LIST_PATTERN.match(program):
+            ods = parse_ods_list(program)
+            continue
+        if _text(row[department_column]).lower() == DEPARTMENT_LABEL.lower():
+            continue
+        rows.append({
+            'programa': program,
+            'eixo': axis,
+            'ODS': ods,
+            'responsável': _text(row[department_column]) or UNASSIGNED_DEPARTMENT,
+            'aplicação': _text(row[action_column]) if action_column is not None else '',
+        })
+
+    table = pd.DataFrame(rows, columns=columns)
+    return ProgramCatalog(
+        table=table,
+        by_ods=_lookup(table['ODS']),
+        by_department=_lookup(table['responsável'].map(department_names)),
+    )
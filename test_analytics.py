@@ -0,0 +1,82 @@
+"""Tests of the blocked correlation routines against pandas' DataFrame.corr."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_correlation, correlation_matrix, correlation_with
+from ods_model import build_ods_model
+
+
+def random_matrix(seed, shape=(17, 11), missing=0.0):
+    rng = np.random.default_rng(seed)
+    values = rng.random(shape)
+    # Two correlated columns and a constant one
+    values[:, 1] = values[:, 0] * 0.8 + rng.random(shape[0]) * 0.2
+    values[:, 2] = 0.5
+    values[rng.random(shape) < missing] = np.nan
+    return values
+
+
+class CorrelationMatrixTest(unittest.TestCase):
+    def assert_matches_pandas(self, values, method, block_size):
+        expected = pd.DataFrame(values).corr(method=method).to_numpy()
+        got = correlation_matrix(values, method, block_size=block_size)
+        np.testing.assert_allclose(got, expected, atol=1e-12)
+
+    def test_pearson_complete(self):
+        for block_size in (1, 3, 1024):
+            self.assert_matches_pandas(random_matrix(1), 'pearson', block_size)
+
+    def test_pearson_with_missing_values(self):
+        values = random_matrix(2, missing=0.25)
+        # A column with a single value has no correlation with anything
+        values[1:, 4] = np.nan
+        for block_size in (1, 4, 1024):
+            self.assert_matches_pandas(values, 'pearson', block_size)
+
+    def test_spearman_complete(self):
+        values = random_matrix(3)
+        values[:5, 6] = values[:5, 7]  # ties inside a column pair
+        for block_size in (2, 1024):
+            self.assert_matches_pandas(values, 'spearman', block_size)
+
+    def test_spearman_with_missing_values_ranks_each_column_once(self):
+        values = random_matrix(4, missing=0.2)
+        ranked = pd.DataFrame(values).rank(axis=0)
+        expected = ranked.corr(method='pearson').to_numpy()
+        np.testing.assert_allclose(correlation_matrix(values, 'spearman', block_size=3), expected, atol=1e-12)
+
+    def test_correlation_with_matches_matrix_row(self):
+        values = random_matrix(5, missing=0.2)
+        for method in ('pearson', 'spearman'):
+            row = correlation_with(values, values[:, 3], method)
+            expected = correlation_matrix(values, method)[3]
+            expected[3] = row[3]  # the diagonal is set to 1 only in the matrix
+            np.testing.assert_allclose(row, expected, atol=1e-12)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            correlation_matrix(random_matrix(6), 'kendall')
+
+
+class ComputeCorrelationTest(unittest.TestCase):
+    def test_ordered_result_is_a_permutation_of_pandas(self):
+        values = random_matrix(7, shape=(17, 8), missing=0.1)
+        names = [f"m{i}" for i in range(values.shape[1])]
+        sheet = pd.DataFrame({'ODS': range(1, 18), 'IDS': [f"ODS {o}" for o in range(1, 18)],
+                              **{name: values[:, i] for i, name in enumerate(names)}})
+        model = build_ods_model(sheet, 'test')
+        expected = pd.DataFrame(model.matrix.astype(np.float64), columns=names).corr()
+
+        result = compute_correlation(model, names)
+        self.assertEqual(sorted(result.names), names)
+        expected = expected.loc[list(result.names), list(result.names)].to_numpy()
+        np.testing.assert_allclose(result.matrix, expected, atol=1e-6)
+
+        unordered = compute_correlation(model, names, ordered=False)
+        self.assertEqual(unordered.names, tuple(names))
+
+
+if __name__ == '__main__':
+    unittest.main()
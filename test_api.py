@@ -0,0 +1,103 @@
+"""Tests of the JSON API against the workbook shipped with the repository.
+
+    python -m pytest test_api.py
+    python -m unittest test_api
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import tornado.testing
+from tornado.escape import url_escape
+
+from api import DataAPI, make_app
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Projeto Goiana - PE.xlsx')
+
+
+class APITest(tornado.testing.AsyncHTTPTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One DataAPI for every test: the workbook is read once, snapshots go to a scratch directory
+        cls.snapshot_dir = tempfile.mkdtemp()
+        cls.api = DataAPI(WORKBOOK, cls.snapshot_dir, watch=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.snapshot_dir, ignore_errors=True)
+
+    def get_app(self):
+        return make_app(self.api)
+
+    def get_json(self, path, **kwargs):
+        response = self.fetch(path, raise_error=False, **kwargs)
+        return response, json.loads(response.body) if response.body else None
+
+    def test_municipality_vector(self):
+        response, body = self.get_json('/api/municipalities/' + url_escape('Goiana 1', plus=False))
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'application/json; charset=UTF-8')
+        self.assertEqual(body['name'], 'Goiana 1')
+        self.assertAlmostEqual(body['scores']['1'], 0.5241)
+
+    def test_ranking_is_state_wide(self):
+        response, body = self.get_json('/api/ranking?ods=3&k=3')
+        self.assertEqual(response.code, 200)
+        self.assertEqual([entry['rank'] for entry in body['ranking']], [1, 2, 3])
+        values = [entry['value'] for entry in body['ranking']]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_etag_then_not_modified(self):
+        response = self.fetch('/api/stats?municipalities=Goiana%201,Recife')
+        self.assertEqual(response.code, 200)
+        etag = response.headers['Etag']
+        self.assertTrue(etag)
+
+        response = self.fetch('/api/stats?municipalities=Goiana%201,Recife', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 304)
+        self.assertEqual(response.body, b'')
+
+        # Another query is another resource
+        response = self.fetch('/api/stats?municipalities=Recife', headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 200)
+
+    def test_gzip_when_accepted(self):
+        plain = self.fetch('/api/municipalities', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        response = self.fetch('/api/municipalities', headers={'Accept-Encoding': 'gzip'},
+                              decompress_response=False)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.body), plain.body)
+
+    def test_gzip_refused_with_zero_weight(self):
+        response = self.fetch('/api/municipalities', headers={'Accept-Encoding': 'gzip;q=0, identity'},
+                              decompress_response=False)
+        self.assertEqual(response.code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        json.loads(response.body)
+
+    def test_unknown_municipality(self):
+        response, body = self.get_json('/api/municipalities/Atlantida')
+        self.assertEqual(response.code, 404)
+        self.assertEqual(body['status'], 404)
+
+        response, _ = self.get_json('/api/stats?municipalities=Goiana%201,Atlantida')
+        self.assertEqual(response.code, 404)
+
+    def test_bad_arguments(self):
+        for path in ('/api/ranking?k=abc', '/api/ranking?k=2.5', '/api/ranking?k=0', '/api/ranking?k=-1',
+                     '/api/ranking?ods=0', '/api/ranking?ods=-4', '/api/correlation?municipality=Recife&k=-1',
+                     '/api/correlation?municipalities=Recife&method=kendall', '/api/stats'):
+            response, body = self.get_json(path)
+            self.assertEqual(response.code, 400, path)
+            self.assertEqual(body['status'], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
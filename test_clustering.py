@@ -0,0 +1,148 @@
+"""Regression tests of the clustering routines on small hand-checked matrices."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from clustering import cluster_municipalities, kmeans, linkage_labels, minibatch_kmeans, silhouette_scores
+from ods_model import build_ods_model
+
+# Municipalities on a line: {0, 1} and {10, 11} merge first, then 3 joins {0, 1}
+LINE = np.array([[0.0], [1.0], [3.0], [10.0], [11.0], [20.0]])
+
+# Two obvious groups around (1/3, 1/3) and (31/3, 31/3)
+BLOBS = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 0.0], [10.0, 10.0], [10.0, 11.0], [11.0, 10.0]])
+BLOB_CENTROIDS = np.array([[1.0, 1.0], [31.0, 31.0]]) / 3
+# Each group has squared deviations 2/9 + 5/9 + 5/9
+BLOB_INERTIA = 8 / 3
+
+
+def same_partition(a, b):
+    """Labels a and b group the rows the same way, whatever the cluster numbers"""
+    return len(set(zip(a, b))) == len(set(a)) == len(set(b))
+
+
+class LinkageTest(unittest.TestCase):
+    def test_average_merge_order(self):
+        cuts = {k: linkage_labels(LINE, k, 'average').tolist() for k in range(1, 7)}
+        self.assertEqual(cuts, {
+            6: [0, 1, 2, 3, 4, 5],
+            5: [0, 0, 1, 2, 3, 4],
+            4: [0, 0, 1, 2, 2, 3],
+            # 3 to {0, 1}: 2.5, below {10, 11} to 20: 9.5
+            3: [0, 0, 0, 1, 1, 2],
+            # {0, 1, 3} to {10, 11}: 54 / 6 = 9, below {10, 11} to 20: 9.5
+            2: [0, 0, 0, 0, 0, 1],
+            1: [0, 0, 0, 0, 0, 0],
+        })
+
+    def test_ward_merge_order(self):
+        cuts = {k: linkage_labels(LINE, k, 'ward').tolist() for k in range(2, 6)}
+        self.assertEqual(cuts, {
+            5: [0, 0, 1, 2, 3, 4],
+            4: [0, 0, 1, 2, 2, 3],
+            # Merge costs 2/3 * 2.5^2 for 3 with {0, 1}, 2/3 * 7.5^2 with {10, 11}
+            3: [0, 0, 0, 1, 1, 2],
+            # 2/3 * 9.5^2 for 20 with {10, 11}, below 6/5 * (55/6)^2 for the two groups
+            2: [0, 0, 0, 1, 1, 1],
+        })
+
+    def test_weighted_rows_count_as_groups(self):
+        # Merging a row that stands for ten municipalities costs more, so 20 stays apart
+        labels = linkage_labels(LINE, 2, 'ward', weights=[1, 1, 1, 1, 1, 10])
+        self.assertEqual(labels.tolist(), [0, 0, 0, 0, 0, 1])
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            linkage_labels(LINE, 2, 'single')
+
+
+class SilhouetteTest(unittest.TestCase):
+    def test_hand_computed_scores(self):
+        labels = np.array([0, 0, 0, 1, 1, 2])
+        sampled, scores = silhouette_scores(LINE, labels, 3)
+        np.testing.assert_array_equal(sampled, np.arange(6))
+        # (b - a) / max(a, b) with a the mean distance inside the cluster and
+        # b the mean distance to the closest other cluster; singletons score 0
+        expected = [8.5 / 10.5, 8 / 9.5, 5 / 7.5, (26 / 3 - 1) / (26 / 3), 8 / 9, 0.0]
+        np.testing.assert_allclose(scores, expected)
+
+    def test_sample(self):
+        labels = np.array([0, 0, 0, 1, 1, 2])
+        _, full = silhouette_scores(LINE, labels, 3)
+        sampled, scores = silhouette_scores(LINE, labels, 3, sample_size=4, seed=1)
+        self.assertEqual(len(sampled), 4)
+        self.assertTrue(np.all(np.diff(sampled) > 0))
+        np.testing.assert_allclose(scores, full[sampled])
+
+
+class KMeansTest(unittest.TestCase):
+    def assert_blobs(self, labels, centroids, inertia):
+        self.assertTrue(same_partition(labels, [0, 0, 0, 1, 1, 1]))
+        order = np.argsort(centroids[:, 0])
+        np.testing.assert_allclose(centroids[order], BLOB_CENTROIDS)
+        self.assertAlmostEqual(inertia, BLOB_INERTIA)
+
+    def test_kmeans(self):
+        for seed in range(5):
+            self.assert_blobs(*kmeans(BLOBS, 2, seed=seed))
+
+    def test_weighted_kmeans_moves_centroids(self):
+        weights = np.array([1.0, 1.0, 4.0, 1.0, 1.0, 1.0])
+        labels, centroids, inertia = kmeans(BLOBS, 2, weights=weights)
+        self.assertTrue(same_partition(labels, [0, 0, 0, 1, 1, 1]))
+        np.testing.assert_allclose(centroids[np.argsort(centroids[:, 0])][0], [4 / 6, 1 / 6])
+
+    def test_minibatch_full_batch_matches_kmeans(self):
+        for seed in range(5):
+            self.assert_blobs(*minibatch_kmeans(BLOBS, 2, seed=seed, batch_size=len(BLOBS)))
+
+    def test_minibatch_small_batches(self):
+        labels, centroids, _ = minibatch_kmeans(BLOBS, 2, seed=3, batch_size=2)
+        self.assertTrue(same_partition(labels, [0, 0, 0, 1, 1, 1]))
+        # Running means of the points seen stay inside each group
+        order = np.argsort(centroids[:, 0])
+        self.assertTrue(np.all((centroids[order][0] >= 0) & (centroids[order][0] <= 1)))
+        self.assertTrue(np.all((centroids[order][1] >= 10) & (centroids[order][1] <= 11)))
+
+    def test_minibatch_continues_from_centroids(self):
+        labels, centroids, _ = minibatch_kmeans(BLOBS, 2, batch_size=len(BLOBS), centroids=BLOB_CENTROIDS)
+        np.testing.assert_allclose(centroids, BLOB_CENTROIDS)
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 1, 1])
+
+
+class ClusterMunicipalitiesTest(unittest.TestCase):
+    def setUp(self):
+        names = [f"m{i}" for i in range(len(BLOBS))]
+        sheet = pd.DataFrame({'ODS': [2, 1], 'IDS': ['ODS 2', 'ODS 1'],
+                              # Rows in sheet order; features come out in ascending ODS order
+                              **{name: row[::-1] for name, row in zip(names, BLOBS)}})
+        self.model = build_ods_model(sheet, 'test')
+
+    def test_methods_agree_on_obvious_groups(self):
+        for method in ('kmeans', 'ward', 'average'):
+            result = cluster_municipalities(self.model, 2, method)
+            self.assertTrue(same_partition(result.labels, [0, 0, 0, 1, 1, 1]), method)
+            np.testing.assert_array_equal(result.sizes, [3, 3])
+            order = np.argsort(result.centroids[:, 0])
+            np.testing.assert_allclose(result.centroids[order], BLOB_CENTROIDS, rtol=1e-6)
+            self.assertAlmostEqual(result.inertia, BLOB_INERTIA, places=5)
+            self.assertEqual(result.members(result.labels[0]), ['m0', 'm1', 'm2'])
+
+    def test_silhouette_summary(self):
+        result = cluster_municipalities(self.model, 2, 'ward')
+        _, expected = silhouette_scores(BLOBS, result.labels, 2)
+        np.testing.assert_allclose(result.silhouettes, expected, rtol=1e-6)
+        self.assertAlmostEqual(result.silhouette, expected.mean(), places=6)
+        np.testing.assert_allclose(result.cluster_silhouettes,
+                                   [expected[:3].mean(), expected[3:].mean()], rtol=1e-6)
+        self.assertEqual(result.frame(['m4', 'x']).index.tolist(), ['m4'])
+
+    def test_k_is_clamped(self):
+        result = cluster_municipalities(self.model, 50, 'average')
+        self.assertEqual(result.k, 6)
+        np.testing.assert_array_equal(result.silhouettes, np.zeros(6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests of the CSV export reader against the workbook it was exported from."""
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+
+from csv_loader import parse_cells
+from data_loader import WORKBOOK_PATH, LazyWorkbook, csv_export_path
+from shared_store import build_shared_data
+
+
+class ParseCellsTest(unittest.TestCase):
+    def parse(self, cells):
+        numbers, text = parse_cells(pa.array(cells, type=pa.string()))
+        return numbers, text.to_pylist()
+
+    def test_percent_strings_become_fractions(self):
+        numbers, text = self.parse(['52,41%', '100%', '+7%', '-0,5%'])
+        np.testing.assert_allclose(numbers, [0.5241, 1.0, 0.07, -0.005])
+        self.assertEqual(text, [None] * 4)
+
+    def test_decimal_comma_and_thousands_dots(self):
+        numbers, _ = self.parse(['0,5', '1.234,5', ' 12.345.678 ', '-3', '42'])
+        np.testing.assert_allclose(numbers, [0.5, 1234.5, 12345678.0, -3.0, 42.0])
+
+    def test_text_and_blanks(self):
+        numbers, text = self.parse(['Goiana', ' ', '', None, '1.23', '12,3.4', 'ODS 1'])
+        self.assertTrue(np.isnan(numbers).all())
+        # '1.23' is not a pt-BR number: the dot only separates groups of three digits
+        self.assertEqual(text, ['Goiana', None, None, None, '1.23', '12,3.4', 'ODS 1'])
+
+
+class CsvMatchesWorkbookTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        snapshot_dir = tempfile.mkdtemp()
+        cls.workbook = build_shared_data(
+            LazyWorkbook(WORKBOOK_PATH, snapshot_dir=snapshot_dir, csv_exports={}), 'workbook').model
+        export = {'ODS Municipios': csv_export_path('ODS Municipios')}
+        cls.csv = build_shared_data(
+            LazyWorkbook(WORKBOOK_PATH, snapshot_dir=snapshot_dir, csv_exports=export), 'csv').model
+
+    def test_same_layout(self):
+        self.assertEqual(self.csv.municipalities, self.workbook.municipalities)
+        np.testing.assert_array_equal(self.csv.ods, self.workbook.ods)
+        self.assertEqual(self.csv.reference_labels, self.workbook.reference_labels)
+
+    def test_same_scores(self):
+        np.testing.assert_array_equal(self.csv.matrix, self.workbook.matrix)
+
+    def test_reference_columns_up_to_export_rounding(self):
+        np.testing.assert_allclose(self.csv.references, self.workbook.references, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
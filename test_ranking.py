@@ -0,0 +1,111 @@
+"""Tests of the state rank and percentile index against pandas' ranking."""
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ods_model import build_ods_model, compute_stats
+from ranking import build_rank_index
+
+
+def make_model(scores, ods=None):
+    """ODS model of a {municipality: scores} mapping, laid out like the 'ODS Municipios' sheet"""
+    n_ods = len(next(iter(scores.values())))
+    ods = list(ods or range(1, n_ods + 1))
+    sheet = pd.DataFrame({'ODS': ods, 'IDS': [f"ODS {o}" for o in ods], **scores})
+    return build_ods_model(sheet, 'test')
+
+
+def expected(scores):
+    """Competition rank and strictly-lower percentile of one row, from pandas"""
+    scores = pd.Series(scores, dtype=np.float64)
+    rank = scores.rank(method='min', ascending=False)
+    count = scores.notna().sum()
+    if count == 1:
+        # A municipality alone on its row is above everyone
+        return rank, rank.where(rank.isna(), 1.0)
+    lower = count - scores.rank(method='max', ascending=False)
+    return rank, lower / (count - 1)
+
+
+class RankIndexTest(unittest.TestCase):
+    def setUp(self):
+        # ODS 1: ties at the top and a missing score; ODS 2: ties at the bottom; ODS 3: one scored municipality
+        self.model = make_model({
+            'A': [0.5, 0.2, np.nan],
+            'B': [0.7, 0.9, np.nan],
+            'C': [0.7, 0.2, 0.4],
+            'D': [np.nan, 0.2, np.nan],
+            'E': [0.1, 0.6, np.nan],
+        })
+        self.ranks = build_rank_index(self.model, compute_stats(self.model))
+
+    def test_ranks_and_percentiles_match_pandas(self):
+        model, ranks = self.model, self.ranks
+        for ods in model.sorted_ods:
+            scores = dict(zip(model.municipalities, model.matrix[model.ods_index[ods]]))
+            rank, percentile = expected(scores)
+            for name in model.municipalities:
+                if np.isnan(rank[name]):
+                    self.assertIsNone(ranks.rank_of(name, ods))
+                    self.assertIsNone(ranks.percentile_of(name, ods))
+                else:
+                    self.assertEqual(ranks.rank_of(name, ods), rank[name], (ods, name))
+                    self.assertAlmostEqual(ranks.percentile_of(name, ods), percentile[name], places=6)
+
+    def test_ties_share_the_best_rank(self):
+        self.assertEqual([self.ranks.rank_of(name, 1) for name in 'BCAE'], [1, 1, 3, 4])
+        self.assertEqual([self.ranks.rank_of(name, 2) for name in 'BEACD'], [1, 2, 3, 3, 3])
+        # Tied municipalities have the same share of others strictly below them
+        self.assertEqual(self.ranks.percentile_of('B', 1), self.ranks.percentile_of('C', 1))
+        self.assertEqual(self.ranks.percentile_of('A', 2), 0.0)
+
+    def test_missing_scores_are_unranked_and_listed_last(self):
+        self.assertIsNone(self.ranks.rank_of('D', 1))
+        self.assertEqual(self.ranks.count[self.ranks.row(1)], 4)
+        self.assertEqual(list(self.ranks.bottom(10, 1).index), ['E', 'A', 'C', 'B'])
+        self.assertEqual(list(self.ranks.top(10, 1).index), ['B', 'C', 'A', 'E'])
+        self.assertEqual(list(self.model.municipalities[c] for c in self.ranks.among(['D', 'E', 'B'], 1)),
+                         ['B', 'E', 'D'])
+
+    def test_percentile_endpoints(self):
+        self.assertEqual(self.ranks.percentile_of('B', 2), 1.0)
+        self.assertEqual(self.ranks.percentile_of('E', 1), 0.0)
+        # Alone on its row: above everyone
+        self.assertEqual(self.ranks.rank_of('C', 3), 1)
+        self.assertEqual(self.ranks.percentile_of('C', 3), 1.0)
+
+    def test_mean_row(self):
+        stats = compute_stats(self.model)
+        rank, percentile = expected(stats.table['mean'])
+        for name in self.model.municipalities:
+            self.assertEqual(self.ranks.rank_of(name), rank[name])
+            self.assertAlmostEqual(self.ranks.percentile_of(name), percentile[name], places=6)
+
+    def test_top_k_and_among_k(self):
+        self.assertEqual(list(self.ranks.top(2, 2).index), ['B', 'E'])
+        self.assertEqual(list(self.ranks.bottom(1, 2).index), ['D'])
+        among = [self.model.municipalities[c] for c in self.ranks.among(['A', 'E', 'C', 'B'], 1, k=2)]
+        # Tied municipalities keep the selection order, as without k
+        self.assertEqual(among, ['C', 'B'])
+        among = [self.model.municipalities[c] for c in self.ranks.among(['A', 'E', 'C', 'B'], 1)]
+        self.assertEqual(among, ['C', 'B', 'A', 'E'])
+
+    def test_random_matrix_with_many_ties(self):
+        rng = np.random.default_rng(7)
+        values = rng.integers(0, 6, size=(4, 40)) / 5
+        values[rng.random(values.shape) < 0.15] = np.nan
+        model = make_model({f"m{i}": values[:, i] for i in range(values.shape[1])})
+        ranks = build_rank_index(model, compute_stats(model))
+        for ods in model.sorted_ods:
+            row = model.matrix[model.ods_index[ods]]
+            rank, percentile = expected(dict(zip(model.municipalities, row)))
+            got = np.array([ranks.rank_of(name, ods) or np.nan for name in model.municipalities], dtype=float)
+            np.testing.assert_array_equal(got, rank.to_numpy())
+            got = np.array([np.nan if p is None else p for p in (ranks.percentile_of(name, ods)
+                                                                 for name in model.municipalities)])
+            np.testing.assert_allclose(got, percentile.to_numpy(), rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
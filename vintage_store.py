@@ -0,0 +1,306 @@
+"""Append-only store of yearly ODS x municipality vintages.
+
+Every IDS edition is ingested once, as its own year partition, next to the
+aggregates that trend views need:
+
+    <store>/year=2024/scores.parquet   one row per municipality and ODS
+    <store>/summary.parquet            per year and municipality: mean, min, max, ...
+    <store>/ods_summary.parquet        per year and ODS: mean over the municipalities
+    <store>/manifest.json              ingested years with their content hash
+
+Ingesting a year computes the aggregates of that vintage only; the derived
+columns (delta to the previous edition, rolling mean and trend over the last
+ROLLING_WINDOW editions) are then updated from the stored aggregates, so no
+earlier partition is read again. Score queries open only the partitions of
+the years they ask for; partitions are sorted by municipality name, so the
+row-group statistics let a query skip the row groups of other municipalities.
+
+Usage:
+    python vintage_store.py ingest 2024 "Projeto Goiana - PE.xlsx"
+    python vintage_store.py list
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_loader import LazyWorkbook
+from ods_model import compute_stats
+from shared_store import build_shared_data
+
+VINTAGE_DIR = os.environ.get('ODS_VINTAGE_DIR', '.vintages')
+# Editions covered by the rolling mean and trend of each year
+ROLLING_WINDOW = 3
+
+# Partitions are sorted by municipality; row groups this small let a query
+# for a few municipalities skip most of a large vintage
+PARTITION_ROW_GROUP_SIZE = 16_384
+
+# Per-vintage aggregates kept for each municipality (columns of compute_stats)
+SUMMARY_STATS = ('mean', 'min', 'max', 'count', 'high', 'low')
+DERIVED_COLUMNS = ('delta', 'rolling_mean', 'trend')
+
+
+def model_hash(model):
+    """Content hash of the scores of a model, independent of where they were read from"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(model.municipalities), model.ods.tolist()]).encode('utf-8'))
+    digest.update(np.ascontiguousarray(model.matrix, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def _write_parquet(table, path, **options):
+    """Atomically write an Arrow table"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, **options)
+    os.replace(tmp_path, path)
+
+
+def derive_trends(summary, key, from_year, window=ROLLING_WINDOW):
+    """Fill the delta/rolling mean/trend columns of the rows at or after `from_year`
+
+    ``summary`` has one row per (year, key) with a 'mean' column. The
+    derived values of a year depend on the `window` editions up to it, so
+    rows before `from_year` keep the values they already hold. Years do not
+    need to be consecutive: the trend is the least-squares slope of the mean
+    over the actual years, per year.
+    """
+    summary = summary.copy()
+    for column in DERIVED_COLUMNS:
+        if column not in summary:
+            summary[column] = np.nan
+    means = summary.pivot(index='year', columns=key, values='mean').sort_index()
+    years = means.index.to_numpy(dtype=np.float64)
+    values = means.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    delta = np.full(values.shape, np.nan)
+    rolling = np.full(values.shape, np.nan)
+    trend = np.full(values.shape, np.nan)
+    for row in np.flatnonzero(years >= from_year):
+        if row > 0:
+            delta[row] = values[row] - values[row - 1]
+        block = slice(max(0, row - window + 1), row + 1)
+        n = valid[block].sum(axis=0)
+        x = np.where(valid[block], years[block, None], 0.0)
+        y = filled[block]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling[row] = y.sum(axis=0) / n
+            sx, sy = x.sum(axis=0), y.sum(axis=0)
+            sxx, sxy = (x * x).sum(axis=0), (x * y).sum(axis=0)
+            slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        trend[row] = np.where(n > 1, slope, np.nan)
+
+    derived = pd.DataFrame({
+        'year': np.repeat(means.index.to_numpy(), len(means.columns)),
+        key: np.tile(means.columns.to_numpy(), len(means.index)),
+        'delta': delta.ravel(),
+        'rolling_mean': rolling.ravel(),
+        'trend': trend.ravel(),
+    })
+    derived = derived[derived['year'] >= from_year]
+    merged = summary.merge(derived, on=['year', key], how='left', suffixes=('', '_new'))
+    for column in DERIVED_COLUMNS:
+        update = merged['year'] >= from_year
+        merged.loc[update, column] = merged.loc[update, f"{column}_new"]
+    return merged[list(summary.columns)].sort_values(['year', key], kind='stable').reset_index(drop=True)
+
+
+class VintageStore:
+    """Year-partitioned ODS scores with incrementally maintained trend aggregates"""
+
+    def __init__(self, root=VINTAGE_DIR, window=ROLLING_WINDOW):
+        self.root = root
+        self.window = window
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, 'manifest.json')
+
+    def partition_path(self, year):
+        return os.path.join(self.root, f"year={int(year)}", 'scores.parquet')
+
+    def _summary_path(self, name):
+        return os.path.join(self.root, f"{name}.parquet")
+
+    @property
+    def manifest(self):
+        """Ingested years, reloaded when another process appended a vintage"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return {'years': {}}
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    @property
+    def years(self):
+        return sorted(int(year) for year in self.manifest['years'])
+
+    @property
+    def version(self):
+        """Cache key of the store contents: the content hash of every vintage"""
+        entries = sorted(self.manifest['years'].items())
+        return hashlib.sha256(json.dumps(entries).encode('utf-8')).hexdigest()[:16]
+
+    def ingest(self, year, model, source=None):
+        """Append one vintage; returns False when the same content is already stored for that year
+
+        Raises ValueError when the year already holds different scores:
+        vintages are never overwritten.
+        """
+        year = int(year)
+        content = model_hash(model)
+        with self._lock:
+            manifest = self.manifest
+            known = manifest['years'].get(str(year))
+            if known is not None:
+                if known['hash'] == content:
+                    return False
+                raise ValueError(f"A different vintage of {year} is already stored; vintages are append-only")
+
+            ods = model.sorted_ods
+            matrix = model.matrix[model.ods_order]
+            n_ods, n_municipalities = matrix.shape
+            # Municipality-major rows sorted by name, so the min/max statistics
+            # of each row group cover a narrow range of names; the names are
+            # dictionary-encoded in the same order
+            by_name = np.argsort(np.array(model.municipalities, dtype=object), kind='stable')
+            table = pa.table({
+                'municipality': pa.DictionaryArray.from_arrays(
+                    pa.array(np.repeat(np.arange(n_municipalities, dtype=np.int32), n_ods)),
+                    pa.array([model.municipalities[c] for c in by_name], type=pa.string())),
+                'ODS': pa.array(np.tile(ods.astype(np.int16), n_municipalities)),
+                'score': pa.array(matrix[:, by_name].T.ravel()),
+            })
+            _write_parquet(table, self.partition_path(year), row_group_size=PARTITION_ROW_GROUP_SIZE)
+
+            # Aggregates of the new vintage only, appended to the stored ones
+            stats = compute_stats(model).table
+            summary = pd.DataFrame({'year': year, 'municipality': list(stats.index),
+                                    **{name: stats[name].to_numpy(dtype=np.float64) for name in SUMMARY_STATS}})
+            counts = (~np.isnan(matrix)).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ods_means = np.where(np.isnan(matrix), 0.0, matrix).sum(axis=1) / counts
+            ods_summary = pd.DataFrame({'year': year, 'ODS': ods.astype(np.int64), 'mean': ods_means,
+                                        'count': counts.astype(np.float64)})
+            self._append_summary('summary', summary, 'municipality', year)
+            self._append_summary('ods_summary', ods_summary, 'ODS', year)
+
+            entries = dict(manifest['years'])
+            entries[str(year)] = {
+                'hash': content,
+                'source': source,
+                'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'ods': int(model.n_ods),
+                'municipalities': len(model.municipalities),
+            }
+            self._write_manifest({'years': entries, 'window': self.window})
+        return True
+
+    def ingest_workbook(self, year, path):
+        """Ingest the 'ODS Municipios' sheet of a workbook as the vintage of `year`"""
+        workbook = LazyWorkbook(path, snapshot_dir=os.path.join(self.root, '.snapshots'))
+        data = build_shared_data(workbook, workbook.sheet_version('ODS Municipios')[:16])
+        return self.ingest(year, data.model, source=os.path.basename(path))
+
+    def _append_summary(self, name, rows, key, year):
+        path = self._summary_path(name)
+        stored = pq.read_table(path).to_pandas() if os.path.exists(path) else None
+        summary = rows if stored is None else pd.concat([stored, rows], ignore_index=True)
+        summary = derive_trends(summary, key, year, self.window)
+        _write_parquet(pa.Table.from_pandas(summary, preserve_index=False), path)
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def scores(self, municipalities=None, years=None):
+        """Scores of some municipalities in some years, read from those partitions only
+
+        Returns a frame indexed by (year, ODS) with one column per municipality.
+        """
+        filters = None if municipalities is None else [('municipality', 'in', list(municipalities))]
+        frames = []
+        for year in (self.years if years is None else sorted(set(self.years) & {int(y) for y in years})):
+            frame = pq.read_table(self.partition_path(year), filters=filters, partitioning=None).to_pandas()
+            frame.insert(0, 'year', year)
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=['year', 'ODS']))
+        scores = pd.concat(frames, ignore_index=True)
+        scores['municipality'] = scores['municipality'].astype(str)
+        table = scores.pivot(index=['year', 'ODS'], columns='municipality', values='score')
+        if municipalities is not None:
+            table = table[[m for m in municipalities if m in table.columns]]
+        table.columns.name = None
+        return table
+
+    def _read_summary(self, name, key, keys=None, years=None):
+        path = self._summary_path(name)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['year', key, *SUMMARY_STATS, *DERIVED_COLUMNS])
+        filters = []
+        if keys is not None:
+            filters.append((key, 'in', list(keys)))
+        if years is not None:
+            filters.append(('year', 'in', [int(y) for y in years]))
+        return pq.read_table(path, filters=filters or None).to_pandas()
+
+    def summary(self, municipalities=None, years=None):
+        """Per-year aggregates of some municipalities, with delta, rolling mean and trend"""
+        return self._read_summary('summary', 'municipality', municipalities, years)
+
+    def ods_summary(self, ods=None, years=None):
+        """Per-year mean of every ODS over the municipalities, with delta, rolling mean and trend"""
+        return self._read_summary('ods_summary', 'ODS', None if ods is None else [int(o) for o in ods], years)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--store', default=VINTAGE_DIR, help="store directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help="append a workbook as the vintage of a year")
+    ingest.add_argument('year', type=int)
+    ingest.add_argument('workbook')
+    commands.add_parser('list', help="list the stored vintages")
+    args = parser.parse_args(argv)
+
+    store = VintageStore(args.store)
+    if args.command == 'ingest':
+        try:
+            added = store.ingest_workbook(args.year, args.workbook)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"{args.year}: {'ingerido' if added else 'já armazenado'}", file=sys.stderr)
+        return 0
+
+    for year in store.years:
+        entry = store.manifest['years'][str(year)]
+        print(f"{year}  {entry['ods']:>4} ODS  {entry['municipalities']:>5} municípios  "
+              f"{entry['source'] or '-'}  {entry['ingested_at']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())